@@ -34,6 +34,22 @@ def create_app(config_name='default'):
     from app.services.oauth_service import oauth_service
     oauth_service.init_app(app)
 
+    # Initialize unread notification counter
+    from app.services.notification_counter import unread_counter
+    unread_counter.init_app(app)
+
+    # Initialize notification push hub (SSE)
+    from app.services.notification_stream import notification_hub
+    notification_hub.init_app(app)
+
+    # Initialize comment thread cache
+    from app.services.comment_cache import comment_cache
+    comment_cache.init_app(app)
+
+    # Initialize @mention user directory
+    from app.services.user_directory import user_directory
+    user_directory.init_app(app)
+
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -184,17 +200,8 @@ def create_app(config_name='default'):
         response.headers['X-XSS-Protection'] = '1; mode=block'
         return response
 
-    # Process watch events after each request
-    @app.teardown_request
-    def process_watch_events(exception):
-        """在每个请求处理完成后处理watch事件"""
-        try:
-            from app.services.watch_service import process_pending_watch_events
-            notifications_count = process_pending_watch_events()
-            if notifications_count > 0:
-                print(f"Processed {notifications_count} watch notifications")
-        except Exception as e:
-            print(f"Error in teardown watch event processing: {e}")
+    # Watch events are written to the outbox table in the same transaction as
+    # the page change and delivered by `flask watch worker`
 
     # Register CLI commands
     from app.cli import register_commands
@@ -1,4 +1,20 @@
 """命令行工具模块"""
-from .oauth_cli import register_commands
+from .oauth_cli import register_commands as register_oauth_commands
+from .watch_cli import register_commands as register_watch_commands
+from .mail_cli import register_commands as register_mail_commands
+from .comment_cli import register_commands as register_comment_commands
+from .storage_cli import register_commands as register_storage_commands
+from .backup_cli import register_commands as register_backup_commands
 
-__all__ = ['register_commands']
\ No newline at end of file
+
+def register_commands(app):
+    """注册所有命令"""
+    register_oauth_commands(app)
+    register_watch_commands(app)
+    register_mail_commands(app)
+    register_comment_commands(app)
+    register_storage_commands(app)
+    register_backup_commands(app)
+
+
+__all__ = ['register_commands']
@@ -0,0 +1,62 @@
+"""数据库备份命令行工具"""
+import click
+from app.models.backup import DatabaseBackup
+from app.services.backup_service import BackupService
+
+
+@click.group()
+def backup():
+    """数据库备份"""
+    pass
+
+
+@backup.command()
+def create():
+    """在当前进程中执行一次数据库备份（可用于crontab），完成后按 BACKUP_KEEP 清理旧备份"""
+    backup_record, error = BackupService.create()
+    if backup_record is None:
+        raise click.ClickException(error)
+
+    backup_id = backup_record.id
+    if BackupService.claim(backup_id) is None:
+        click.echo(f'备份 {backup_id} 已由 flask backup worker 领取执行')
+        return
+    if not BackupService.run(backup_id):
+        backup_record = DatabaseBackup.query.get(backup_id)
+        raise click.ClickException(f'备份失败: {backup_record.error}')
+
+    backup_record = DatabaseBackup.query.get(backup_id)
+    click.echo(f'备份完成: {BackupService.file_path(backup_record)}（{backup_record.size_display}）')
+
+
+@backup.command()
+@click.option('--poll-interval', default=5.0, show_default=True, help='Seconds to sleep when no backup is pending')
+@click.option('--once', is_flag=True, help='Run the pending backups and exit')
+def worker(poll_interval, once):
+    """运行备份worker：执行管理后台创建的备份"""
+    if once:
+        processed = BackupService.run_worker(once=True)
+        click.echo(f'执行备份 {processed} 个')
+        return
+
+    click.echo('Backup worker 已启动')
+    try:
+        BackupService.run_worker(poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        click.echo('Backup worker 已停止')
+
+
+@backup.command('list')
+@click.option('--limit', default=20, show_default=True, help='Backups shown')
+def list_backups(limit):
+    """列出最近的备份"""
+    for backup_record in DatabaseBackup.query.order_by(DatabaseBackup.created_at.desc(),
+                                                       DatabaseBackup.id.desc()).limit(limit):
+        click.echo(f'{backup_record.id}\t{backup_record.created_at:%Y-%m-%d %H:%M:%S}\t'
+                   f'{backup_record.status}\t{backup_record.progress}%\t{backup_record.size_display or "-"}\t'
+                   f'{backup_record.filename or backup_record.error or ""}')
+
+
+def register_commands(app):
+    """注册备份命令"""
+    app.cli.add_command(backup, name='backup')
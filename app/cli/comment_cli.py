@@ -0,0 +1,22 @@
+"""评论命令行工具"""
+import click
+from app.services.comment_service import CommentService
+
+
+@click.group()
+def comments():
+    """评论维护"""
+    pass
+
+
+@comments.command('repair-counts')
+@click.option('--batch-size', default=1000, show_default=True, help='Pages/attachments updated per transaction')
+def repair_counts(batch_size):
+    """按评论表重新计算页面和附件的评论数和最后评论时间"""
+    updated = CommentService.repair_comment_stats(batch_size=batch_size)
+    click.echo(f'已重新计算 {updated} 个页面/附件的评论统计')
+
+
+def register_commands(app):
+    """注册评论命令"""
+    app.cli.add_command(comments, name='comments')
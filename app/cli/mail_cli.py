@@ -0,0 +1,47 @@
+"""邮件发件箱命令行工具"""
+import click
+from flask import current_app
+from app.services.mail_service import MailDeliveryWorker
+
+
+@click.group()
+def mail():
+    """邮件发送"""
+    pass
+
+
+@mail.command()
+@click.option('--batch-size', type=int, help='Emails claimed per batch [default: MAIL_OUTBOX_BATCH_SIZE]')
+@click.option('--lease-seconds', default=120, show_default=True, help='Lease duration for claimed emails')
+@click.option('--max-attempts', type=int, help='Attempts before an email is marked failed [default: MAIL_OUTBOX_MAX_ATTEMPTS]')
+@click.option('--poll-interval', default=5.0, show_default=True, help='Seconds to sleep when the outbox is empty')
+@click.option('--once', is_flag=True, help='Process a single batch and exit')
+def worker(batch_size, lease_seconds, max_attempts, poll_interval, once):
+    """运行邮件发件箱worker"""
+    config = current_app.config
+    mail_worker = MailDeliveryWorker(
+        batch_size=batch_size or config.get('MAIL_OUTBOX_BATCH_SIZE', 50),
+        lease_seconds=lease_seconds,
+        max_attempts=max_attempts or config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 6),
+        rate_limit=config.get('MAIL_RATE_LIMIT_PER_RECIPIENT', 20),
+        rate_window_seconds=config.get('MAIL_RATE_LIMIT_WINDOW', 3600)
+    )
+
+    if once:
+        try:
+            processed = mail_worker.run_once()
+        finally:
+            mail_worker.on_idle()
+        click.echo(f'处理邮件 {processed} 封')
+        return
+
+    click.echo(f'Mail worker {mail_worker.worker_id} 已启动')
+    try:
+        mail_worker.run(poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        click.echo('Mail worker 已停止')
+
+
+def register_commands(app):
+    """注册邮件命令"""
+    app.cli.add_command(mail, name='mail')
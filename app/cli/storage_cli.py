@@ -0,0 +1,151 @@
+"""存储命令行工具"""
+from types import SimpleNamespace
+
+import click
+from app.services.storage_service import get_storage_service
+from app.services.blob_service import BlobService
+
+
+@click.group()
+def storage():
+    """上传文件存储维护"""
+    pass
+
+
+@storage.command()
+@click.option('--batch-size', default=200, show_default=True, help='Attachments hashed per batch')
+def dedupe(batch_size):
+    """为已有附件计算内容哈希，相同内容的附件共用一个文件并删除多余副本"""
+    storage_service = get_storage_service()
+    processed, removed = BlobService.dedupe_existing(storage_service, batch_size=batch_size)
+    click.echo(f'已处理 {processed} 个附件，删除重复文件 {removed} 个')
+
+
+@storage.command()
+@click.option('--grace-seconds', default=3600, show_default=True,
+              help='Keep unreferenced files at least this long')
+@click.option('--batch-size', default=200, show_default=True, help='Blobs checked per batch')
+def gc(grace_seconds, batch_size):
+    """删除不再被任何附件/分享引用的去重文件"""
+    storage_service = get_storage_service()
+    removed = BlobService.collect_garbage(storage_service, grace_seconds=grace_seconds, batch_size=batch_size)
+    click.echo(f'已删除 {removed} 个未引用的文件')
+
+
+@storage.command('gc-uploads')
+@click.option('--older-than-hours', default=24, show_default=True,
+              help='Only remove orphans uploaded (or shares expired) before this many hours ago')
+@click.option('--batch-size', default=500, show_default=True, help='Records deleted per batch (max 1000)')
+@click.option('--dry-run', is_flag=True, help='Report what would be removed without deleting')
+def gc_uploads(older_than_hours, batch_size, dry_run):
+    """删除未关联页面的孤立附件、过期或达到下载上限的分享，以及它们的文件"""
+    from app.services.upload_gc import UploadGC
+
+    storage_service = get_storage_service()
+    report = UploadGC.collect(storage_service, older_than_hours=older_than_hours,
+                              batch_size=batch_size, dry_run=dry_run)
+    prefix = '[dry-run] 将' if dry_run else '已'
+    click.echo(f"{prefix}删除孤立附件 {report['attachments']} 个、失效分享 {report['shares']} 个，"
+               f"文件 {report['files']} 个，回收 {report['bytes'] / (1024 * 1024):.1f} MB")
+    if report['released_blobs']:
+        click.echo(f"释放去重文件引用 {report['released_blobs']} 个，由 flask storage gc 回收")
+
+
+@storage.command('abort-uploads')
+@click.option('--older-than-hours', default=24, show_default=True,
+              help='Only abort multipart uploads initiated before this many hours ago')
+def abort_uploads(older_than_hours):
+    """中止中断后遗留在S3上的未完成分片上传"""
+    backend = get_storage_service().backend
+    if not hasattr(backend, 'abort_stale_multipart_uploads'):
+        click.echo('当前存储后端不是S3，无需处理')
+        return
+    aborted = backend.abort_stale_multipart_uploads(older_than_seconds=older_than_hours * 3600)
+    click.echo(f'已中止 {aborted} 个未完成的分片上传')
+
+
+@storage.command()
+@click.option('--batch-size', default=500, show_default=True, help='Database rows rewritten per batch')
+@click.option('--dry-run', is_flag=True, help='Count legacy files without moving anything')
+def reshard(batch_size, dry_run):
+    """把本地存储中旧布局的文件移动到分散的子目录（<文件夹>/ab/cd/），并改写数据库中的路径"""
+    from app.services.storage_layout import StorageLayoutService
+
+    storage_service = get_storage_service()
+    backend = storage_service.backend
+    if not hasattr(backend, 'moved_path'):
+        click.echo('当前存储后端不是本地存储，无需迁移')
+        return
+    if backend.layout != 'sharded' and not dry_run:
+        click.echo('LOCAL_STORAGE_LAYOUT 不是 sharded，新上传的文件仍使用旧布局，已取消')
+        return
+
+    moved, total_bytes = StorageLayoutService.move_files(backend, dry_run=dry_run)
+    if dry_run:
+        click.echo(f'[dry-run] 需要迁移 {moved} 个文件（{total_bytes / (1024 * 1024):.1f} MB）')
+        return
+    click.echo(f'已移动 {moved} 个文件（{total_bytes / (1024 * 1024):.1f} MB）')
+
+    counts = StorageLayoutService.rewrite_references(storage_service, batch_size=batch_size)
+    click.echo(f"已改写 附件 {counts['attachments']} 个、分享 {counts['shares']} 个、头像 {counts['users']} 个、"
+               f"页面 {counts['pages']} 个、页面版本 {counts['versions']} 个")
+
+
+@storage.command('image-variants')
+@click.option('--rerender/--no-rerender', default=True, show_default=True,
+              help='Re-render page HTML so existing pages get srcset/lazy loading')
+@click.option('--batch-size', default=200, show_default=True, help='Rows loaded per batch')
+def image_variants(rerender, batch_size):
+    """为已上传的图片附件生成缩放后的衍生图并记录尺寸，然后重新渲染含图片的页面"""
+    from app import db
+    from app.models.wiki import Attachment, Page
+    from app.services.image_service import ImageDerivativeService
+
+    generated = 0
+    last_id = 0
+    while True:
+        attachments = Attachment.query.filter(
+            Attachment.id > last_id,
+            Attachment.mime_type.like('image/%')
+        ).order_by(Attachment.id).limit(batch_size).all()
+        if not attachments:
+            break
+        for attachment in attachments:
+            last_id = attachment.id
+            try:
+                generated += len(ImageDerivativeService.generate(attachment.file_path))
+            except Exception as e:
+                click.echo(f'跳过附件 {attachment.id} ({attachment.file_path}): {e}')
+        db.session.expunge_all()
+    click.echo(f'图片衍生图: {generated} 个')
+
+    if not rerender:
+        return
+
+    rendered = 0
+    last_id = 0
+    while True:
+        pages = Page.query.filter(
+            Page.id > last_id,
+            Page.content_html.like('%<img%')
+        ).order_by(Page.id).limit(batch_size).all()
+        if not pages:
+            break
+        for page in pages:
+            last_id = page.id
+            # 只重新生成content_html，不触发content的set事件（不产生关注通知），也保留updated_at
+            rendered_page = SimpleNamespace()
+            Page.on_changed_content(rendered_page, page.content or '', None, None)
+            Page.query.filter_by(id=page.id).update(
+                {'content_html': rendered_page.content_html, 'updated_at': Page.updated_at},
+                synchronize_session=False
+            )
+            rendered += 1
+        db.session.commit()
+        db.session.expunge_all()
+    click.echo(f'已重新渲染 {rendered} 个页面')
+
+
+def register_commands(app):
+    """注册存储命令"""
+    app.cli.add_command(storage, name='storage')
@@ -0,0 +1,68 @@
+"""Watch事件命令行工具"""
+import click
+from flask import current_app
+from app.services.watch_service import WatchService, WatchEventWorker
+
+
+@click.group()
+def watch():
+    """Watch事件投递"""
+    pass
+
+
+@watch.command()
+@click.option('--batch-size', default=50, show_default=True, help='Events claimed per batch')
+@click.option('--lease-seconds', default=60, show_default=True, help='Lease duration for claimed events')
+@click.option('--max-attempts', default=5, show_default=True, help='Attempts before an event is marked failed')
+@click.option('--poll-interval', default=2.0, show_default=True, help='Seconds to sleep when the outbox is empty')
+@click.option('--once', is_flag=True, help='Process a single batch and exit')
+def worker(batch_size, lease_seconds, max_attempts, poll_interval, once):
+    """运行Watch事件发件箱worker"""
+    event_worker = WatchEventWorker(
+        batch_size=batch_size,
+        lease_seconds=lease_seconds,
+        max_attempts=max_attempts
+    )
+
+    if once:
+        processed, notifications = event_worker.run_batch()
+        click.echo(f'处理事件 {processed} 个，创建通知 {notifications} 条')
+        return
+
+    click.echo(f'Watch worker {event_worker.worker_id} 已启动')
+    try:
+        event_worker.run(poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        click.echo('Watch worker 已停止')
+
+
+@watch.command()
+@click.option('--frequency', type=click.Choice(['hourly', 'daily']), required=True,
+              help='Digest frequency to send; schedule the command at the same interval')
+def digest(frequency):
+    """发送关注通知摘要邮件"""
+    queued = WatchService.send_digests(frequency)
+    click.echo(f'已加入发件箱 {queued} 封摘要邮件')
+
+
+@watch.command('reconcile-unread')
+def reconcile_unread():
+    """用数据库校正缓存的未读通知计数"""
+    from app.services.notification_counter import unread_counter
+    click.echo(f'已校正 {unread_counter.reconcile()} 个用户的未读计数')
+
+
+@watch.command()
+@click.option('--days', type=int, help='Keep notifications newer than this [default: NOTIFICATION_RETENTION_DAYS]')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction')
+def cleanup(days, batch_size):
+    """按保留期清理旧通知和已投递的事件"""
+    days = days or current_app.config.get('NOTIFICATION_RETENTION_DAYS', 90)
+    notifications = WatchService.cleanup_old_notifications(days_old=days, batch_size=batch_size)
+    events = WatchService.cleanup_processed_events(batch_size=batch_size)
+    click.echo(f'已清理通知 {notifications} 条，已投递事件 {events} 个')
+
+
+def register_commands(app):
+    """注册Watch命令"""
+    app.cli.add_command(watch, name='watch')
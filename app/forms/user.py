@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, EmailField, BooleanField
+from wtforms import StringField, EmailField, BooleanField, SelectField
 from wtforms.validators import DataRequired, Email, Length, Optional
 
 class ProfileForm(FlaskForm):
@@ -21,4 +21,8 @@ class NotificationSettingsForm(FlaskForm):
     watch_notifications = BooleanField('关注通知', default=True)
     mention_notifications = BooleanField('提及通知', default=True)
     comment_notifications = BooleanField('评论通知', default=True)
-    daily_digest = BooleanField('每日摘要', default=False)
\ No newline at end of file
+    digest_frequency = SelectField('关注通知邮件', choices=[
+        ('immediate', '实时发送'),
+        ('hourly', '每小时摘要'),
+        ('daily', '每日摘要'),
+    ], default='immediate')
\ No newline at end of file
@@ -1,17 +1,20 @@
 from .user import User, Role, Permission, UserSession
 from .wiki import Page, Category, Attachment, PageVersion
 from .search import SearchIndex
-from .watch import Watch, WatchNotification, WatchTargetType, WatchEventType
+from .watch import Watch, WatchSubscription, WatchNotification, WatchTargetType, WatchEventType, WatchEventOutbox
 from .comment import Comment, CommentMention, CommentTargetType
 from .organization import (
     Department, Project, Workspace, UserDepartment, UserProject, UserWorkspace,
     AccessLevel, OrganizationService
 )
 from .share import S3Share
+from .mail import EmailOutbox
+from .storage import StorageBlob, StoredImage
+from .backup import DatabaseBackup
 from .oauth import OAuthProvider, OAuthAccount, SSOSession
 
 __all__ = ['User', 'Role', 'Permission', 'UserSession', 'Page', 'Category',
-           'Attachment', 'PageVersion', 'SearchIndex', 'Watch', 'WatchNotification',
-           'WatchTargetType', 'WatchEventType', 'Comment', 'CommentMention', 'CommentTargetType',
+           'Attachment', 'PageVersion', 'SearchIndex', 'Watch', 'WatchSubscription', 'WatchNotification',
+           'WatchTargetType', 'WatchEventType', 'WatchEventOutbox', 'Comment', 'CommentMention', 'CommentTargetType',
            'Department', 'Project', 'Workspace', 'UserDepartment', 'UserProject', 'UserWorkspace',
-           'AccessLevel', 'OrganizationService', 'S3Share', 'OAuthProvider', 'OAuthAccount', 'SSOSession']
\ No newline at end of file
+           'AccessLevel', 'OrganizationService', 'S3Share', 'EmailOutbox', 'StorageBlob', 'StoredImage', 'DatabaseBackup', 'OAuthProvider', 'OAuthAccount', 'SSOSession']
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+数据库备份记录模型
+"""
+
+from datetime import datetime
+from app import db
+
+
+class DatabaseBackup(db.Model):
+    """数据库备份任务（由 `flask backup worker` 进程执行，进度和结果持久化，多进程部署下各进程都能查询）"""
+    __tablename__ = 'database_backups'
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # 状态：pending -> running -> completed / failed
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING, index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    error = db.Column(db.Text)
+
+    # 备份文件（BACKUP_FOLDER 下的文件名）
+    filename = db.Column(db.String(255))
+    file_size = db.Column(db.BigInteger)
+    dialect = db.Column(db.String(32))  # sqlite / postgresql
+
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    # 进度每次更新时刷新，长时间未更新的running任务视为已中断（进程退出）
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    creator = db.relationship('User', foreign_keys=[created_by])
+
+    def __repr__(self):
+        return f'<DatabaseBackup {self.id} {self.status} {self.progress}%>'
+
+    @property
+    def is_active(self):
+        return self.status in (self.STATUS_PENDING, self.STATUS_RUNNING)
+
+    @property
+    def size_display(self):
+        """文件大小（KB/MB/GB）"""
+        if self.file_size is None:
+            return None
+        size = float(self.file_size)
+        for unit in ('B', 'KB', 'MB'):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GB"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'size_display': self.size_display,
+            'dialect': self.dialect,
+            'creator': self.creator.username if self.creator else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
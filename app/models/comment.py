@@ -35,11 +35,16 @@ class Comment(db.Model):
     author = db.relationship('User', foreign_keys=[author_id], backref='comments')
     parent = db.relationship('Comment', remote_side=[id], backref='replies')
     mentions = db.relationship('CommentMention', backref='comment', lazy='dynamic', cascade='all, delete-orphan')
+    # 只读的列表形式，可以用selectinload批量预加载（dynamic关系不支持预加载）
+    mention_list = db.relationship('CommentMention', viewonly=True, order_by='CommentMention.id')
 
     __table_args__ = (
         db.Index('ix_comments_target', 'target_type', 'target_id'),
         db.Index('ix_comments_author', 'author_id'),
         db.Index('ix_comments_created', 'created_at'),
+        # 游标分页 (created_at, id)
+        db.Index('ix_comments_target_created', 'target_type', 'target_id', 'created_at', 'id'),
+        db.Index('ix_comments_author_created', 'author_id', 'created_at', 'id'),
     )
 
     def __repr__(self):
@@ -73,89 +78,69 @@ class Comment(db.Model):
 
     @staticmethod
     def on_changed_content(target, value, oldvalue, initiator):
-        """内容变更时处理HTML和@提及"""
+        """内容变更时生成HTML（@提及由sync_mentions在保存时处理）"""
         allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
                         'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
                         'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br',
                         'div', 'span', 'table', 'thead', 'tbody', 'tr', 'th', 'td']
         allowed_attrs = {'a': ['href', 'title'], 'abbr': ['title'], 'acronym': ['title']}
 
-        # 处理@提及
-        value = Comment.process_mentions(target, value)
-
         # 清理HTML
         from bleach import linkify, clean
         html = linkify(clean(value, tags=allowed_tags, attributes=allowed_attrs, strip=True))
         target.content_html = html
 
     @staticmethod
-    def process_mentions(comment, content):
-        """处理@提及并创建提及记录"""
+    def parse_mentions(content):
+        """
+        提取内容中@提及的用户名（去重，保持出现顺序）
+        :param content: 评论内容
+        :return: 用户名列表
+        """
         import re
-        from app.models.user import User
 
         # 匹配@username格式
-        mention_pattern = r'@(\w+)'
-        mentions = re.findall(mention_pattern, content)
-
-        for username in mentions:
-            # 查找用户
-            user = User.query.filter_by(username=username).first()
-            if user and user.id != comment.author_id:
-                # 检查是否已经提及过
-                existing_mention = CommentMention.query.filter_by(
-                    comment_id=comment.id,
-                    mentioned_user_id=user.id
-                ).first()
-
-                if not existing_mention:
-                    # 创建提及记录（只有在comment已经有ID时才创建）
-                    if comment.id:
-                        mention = CommentMention(
-                            comment_id=comment.id,
-                            mentioned_user_id=user.id,
-                            mentioned_username=username
-                        )
-                        db.session.add(mention)
-
-        return content
-
-    def create_mentions_after_save(self, content):
-        """在保存后创建提及记录"""
-        import re
+        return list(dict.fromkeys(re.findall(r'@(\w+)', content or '')))
+
+    def sync_mentions(self, content):
+        """
+        按内容同步提及记录（随当前会话一起提交）
+        所有用户名用一条IN查询解析，已有的提及用一条查询取出，新增的提及批量插入
+        :param content: 评论内容
+        :return: 新增的CommentMention列表
+        """
         from app.models.user import User
 
-        # 匹配@username格式
-        mention_pattern = r'@(\w+)'
-        mentions = re.findall(mention_pattern, content)
-
-        for username in mentions:
-            # 查找用户
-            user = User.query.filter_by(username=username).first()
-            if user and user.id != self.author_id:
-                # 检查是否已经提及过
-                existing_mention = CommentMention.query.filter_by(
-                    comment_id=self.id,
-                    mentioned_user_id=user.id
-                ).first()
-
-                if not existing_mention:
-                    # 创建提及记录
-                    mention = CommentMention(
-                        comment_id=self.id,
-                        mentioned_user_id=user.id,
-                        mentioned_username=username
-                    )
-                    db.session.add(mention)
-
-        db.session.commit()
+        usernames = Comment.parse_mentions(content)
+        users = User.query.filter(User.username.in_(usernames)).all() if usernames else []
+        wanted = {user.id: user.username for user in users if user.id != self.author_id}
+
+        existing = {
+            mention.mentioned_user_id: mention
+            for mention in CommentMention.query.filter_by(comment_id=self.id)
+        }
+        for user_id, mention in existing.items():
+            if user_id not in wanted:
+                db.session.delete(mention)
+
+        created = [
+            CommentMention(comment_id=self.id, mentioned_user_id=user_id, mentioned_username=username)
+            for user_id, username in wanted.items()
+            if user_id not in existing
+        ]
+        db.session.add_all(created)
+        return created
 
     def get_mentions(self):
         """获取所有被提及的用户"""
-        return [mention.mentioned_user for mention in self.mentions if mention.mentioned_user]
-
-    def to_dict(self, include_replies=False):
-        """转换为字典格式"""
+        return [mention.mentioned_user for mention in self.mention_list if mention.mentioned_user]
+
+    def to_dict(self, include_replies=False, avatars=None):
+        """
+        转换为字典格式
+        :param include_replies: 是否包含回复
+        :param avatars: {用户ID: 头像URL}，序列化一组评论时由AvatarService.resolve批量取出
+        """
         # 安全地获取时间戳
         created_at = self.get_safe_datetime('created_at')
         updated_at = self.get_safe_datetime('updated_at')
@@ -170,7 +155,8 @@ class Comment(db.Model):
                 'id': self.author.id,
                 'username': self.author.username,
                 'name': self.author.name,
-                'avatar': self.author.get_avatar(size=40) or '/static/img/default-avatar.png'
+                'avatar': (avatars or {}).get(self.author_id) or self.author.get_avatar(size=40)
+                          or '/static/img/default-avatar.png'
             },
             'parent_id': self.parent_id,
             'is_edited': self.is_edited,
@@ -181,12 +167,12 @@ class Comment(db.Model):
                     'id': mention.mentioned_user.id,
                     'username': mention.mentioned_user.username,
                     'name': mention.mentioned_user.name
-                } for mention in self.mentions if mention.mentioned_user
+                } for mention in self.mention_list if mention.mentioned_user
             ]
         }
 
         if include_replies:
-            data['replies'] = [reply.to_dict() for reply in self.replies if not reply.is_deleted]
+            data['replies'] = [reply.to_dict(avatars=avatars) for reply in self.replies if not reply.is_deleted]
 
         return data
 
@@ -214,6 +200,7 @@ class CommentMention(db.Model):
     __table_args__ = (
         db.Index('ix_comment_mentions_user', 'mentioned_user_id', 'is_read'),
         db.Index('ix_comment_mentions_comment', 'comment_id'),
+        db.Index('ix_comment_mentions_user_created', 'mentioned_user_id', 'created_at', 'id'),
     )
 
     def __repr__(self):
@@ -0,0 +1,60 @@
+"""
+邮件发件箱模型
+"""
+
+from datetime import datetime
+from app import db
+
+
+class EmailOutbox(db.Model):
+    """待发送邮件（由 `flask mail worker` 通过持久SMTP连接批量发送）"""
+    __tablename__ = 'email_outbox'
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # 邮件内容
+    recipient = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255))
+    subject = db.Column(db.String(500), nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+
+    # 来源（发送成功后回写来源记录的已发送标记），如 watch_notification / comment_mention
+    source_type = db.Column(db.String(32))
+    source_id = db.Column(db.Integer)
+
+    # 发送状态：pending -> sent / failed
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+
+    # 租约/退避：locked_until 之前不会被领取
+    locked_by = db.Column(db.String(64))
+    locked_until = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_lease', 'status', 'locked_until'),
+        db.Index('ix_email_outbox_recipient_sent', 'recipient', 'sent_at'),
+        db.UniqueConstraint('source_type', 'source_id', name='uq_email_outbox_source'),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} to {self.recipient} {self.status}>'
+
+    def to_message(self):
+        """转换为Flask-Mail消息"""
+        from flask_mail import Message
+        return Message(
+            subject=self.subject,
+            sender=self.sender,
+            recipients=[self.recipient],
+            body=self.body,
+            html=self.html
+        )
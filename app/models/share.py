@@ -19,7 +19,7 @@ class S3Share(db.Model):
 
     # 文件信息
     original_filename = db.Column(db.String(255), nullable=False)  # 原始文件名
-    file_path = db.Column(db.String(500), nullable=False)  # S3文件路径
+    file_path = db.Column(db.String(500), nullable=False, index=True)  # S3文件路径
     file_size = db.Column(db.Integer, nullable=False)  # 文件大小（字节）
     file_type = db.Column(db.String(100), nullable=False)  # 文件MIME类型
     file_extension = db.Column(db.String(10), nullable=False)  # 文件扩展名
@@ -27,12 +27,13 @@ class S3Share(db.Model):
     # S3 URL信息
     s3_url = db.Column(db.String(1000), nullable=False)  # S3原始URL
     public_url = db.Column(db.String(1000), nullable=True)  # 公开访问URL（如果有的话）
+    blob_id = db.Column(db.Integer, db.ForeignKey('storage_blobs.id'), nullable=True, index=True)  # 去重存储的文件
 
     # 分享设置
     is_public = db.Column(db.Boolean, default=True, nullable=False)  # 是否公开分享
-    expires_at = db.Column(db.DateTime, nullable=True)  # 过期时间
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # 过期时间
     download_count = db.Column(db.Integer, default=0, nullable=False)  # 下载次数
-    max_downloads = db.Column(db.Integer, nullable=True)  # 最大下载次数限制
+    max_downloads = db.Column(db.Integer, nullable=True, index=True)  # 最大下载次数限制
 
     # 用户信息
     uploader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -181,4 +182,14 @@ class S3Share(db.Model):
         }
 
 
-import random
\ No newline at end of file
+import random
+
+from sqlalchemy import event
+
+
+@event.listens_for(S3Share, 'after_delete')
+def on_share_deleted(mapper, connection, target):
+    """分享删除后释放对存储文件的引用（文件由 `flask storage gc` 回收）"""
+    if target.blob_id:
+        from app.models.storage import StorageBlob
+        StorageBlob.adjust_refs(target.blob_id, -1, connection=connection)
@@ -0,0 +1,71 @@
+"""
+内容寻址存储模型
+"""
+
+from datetime import datetime
+from app import db
+
+
+class StorageBlob(db.Model):
+    """按SHA-256去重的存储文件，ref_count为引用它的附件/分享等记录数"""
+    __tablename__ = 'storage_blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)  # 存储中的相对路径/对象键
+    file_size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100))
+
+    # 引用计数，降为0后由 `flask storage gc` 删除文件和记录
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_storage_blobs_unreferenced', 'ref_count', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f'<StorageBlob {self.sha256[:12]} refs={self.ref_count}>'
+
+    @staticmethod
+    def adjust_refs(blob_id, delta, connection=None):
+        """
+        原子地增减引用计数
+        :param blob_id: StorageBlob ID
+        :param delta: 增减量
+        :param connection: 在mapper事件中调用时传入当前连接
+        :return: 更新的行数（记录已被GC删除时为0）
+        """
+        stmt = StorageBlob.__table__.update().where(StorageBlob.id == blob_id).values(
+            ref_count=StorageBlob.ref_count + delta,
+            updated_at=datetime.utcnow()
+        )
+        if connection is not None:
+            return connection.execute(stmt).rowcount
+        return db.session.execute(stmt).rowcount
+
+
+class StoredImage(db.Model):
+    """
+    上传图片的原始尺寸和已生成的衍生图档位
+    在上传（或第一次生成衍生图）时记录，渲染页面时据此输出srcset，不需要读取图片文件
+    """
+    __tablename__ = 'stored_images'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(500), unique=True, nullable=False)  # 原图在存储中的相对路径/对象键
+    width = db.Column(db.Integer, nullable=False)  # 按EXIF方向摆正后的尺寸
+    height = db.Column(db.Integer, nullable=False)
+    variant_widths = db.Column(db.String(100), nullable=False, default='')  # 已生成的档位，如 "320,640"
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredImage {self.file_path} {self.width}x{self.height}>'
+
+    @property
+    def generated_widths(self):
+        return {int(width) for width in (self.variant_widths or '').split(',') if width}
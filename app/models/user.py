@@ -5,6 +5,7 @@ from itsdangerous import URLSafeTimedSerializer as Serializer
 from flask import current_app
 from app import db, login_manager
 import hashlib
+from sqlalchemy import event
 
 class Permission:
     FOLLOW = 0x01
@@ -102,6 +103,7 @@ class User(UserMixin, db.Model):
     last_seen = db.Column(db.DateTime(), default=datetime.utcnow)
     avatar_hash = db.Column(db.String(32))
     avatar = db.Column(db.String(500))  # 自定义头像URL
+    avatar_thumbs = db.Column(db.String(500))  # 上传头像的缩放图URL模板，{size}为尺寸（见AVATAR_SIZES）
     is_active = db.Column(db.Boolean, default=True)
     email_verified = db.Column(db.Boolean, default=False)
     failed_login_attempts = db.Column(db.Integer, default=0)
@@ -113,6 +115,10 @@ class User(UserMixin, db.Model):
     backup_codes = db.Column(db.Text)  # JSON string of backup codes
     two_factor_setup_date = db.Column(db.DateTime)
 
+    # 通知偏好（JSON），摘要频率单独存储以便摘要任务按频率筛选用户
+    notification_settings = db.Column(db.Text)
+    notification_digest = db.Column(db.String(16), default='immediate', index=True)
+
     # Leader relationships
     leader_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)  # 直属上级
     is_department_leader = db.Column(db.Boolean, default=False)  # 是否是部门领导
@@ -286,8 +292,11 @@ class User(UserMixin, db.Model):
         return hashlib.md5(self.email.lower().encode('utf-8')).hexdigest()
 
     def get_avatar(self, size=100, default='identicon', rating='g'):
-        """获取用户头像，优先使用自定义头像，否则使用Gravatar"""
+        """获取用户头像，优先使用自定义头像（有缩放图时用不小于size的最小尺寸），否则使用Gravatar"""
         if self.avatar and self.avatar.strip():
+            if self.avatar_thumbs:
+                thumb_size = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+                return self.avatar_thumbs.replace('{size}', str(thumb_size))
             return self.avatar.strip()
         # 如果没有自定义头像，使用Gravatar
         return self.gravatar(size=size, default=default, rating=rating)
@@ -437,37 +446,53 @@ class User(UserMixin, db.Model):
             'is_active': self.is_active
         }
 
+    DIGEST_IMMEDIATE = 'immediate'
+    DIGEST_HOURLY = 'hourly'
+    DIGEST_DAILY = 'daily'
+    DIGEST_FREQUENCIES = (DIGEST_IMMEDIATE, DIGEST_HOURLY, DIGEST_DAILY)
+
     def get_notification_settings(self):
         """获取用户的通知设置"""
         import json
-        if hasattr(self, 'notification_settings') and self.notification_settings:
-            try:
-                return json.loads(self.notification_settings)
-            except (json.JSONDecodeError, AttributeError):
-                pass
-
-        # 返回默认设置
-        return {
+        settings = {
             'email_notifications': True,
             'watch_notifications': True,
             'mention_notifications': True,
             'comment_notifications': True,
-            'daily_digest': False
         }
+        if self.notification_settings:
+            try:
+                settings.update(json.loads(self.notification_settings))
+            except (json.JSONDecodeError, TypeError):
+                pass
+
+        settings['digest_frequency'] = self.get_digest_frequency()
+        settings.pop('daily_digest', None)
+        return settings
 
     def set_notification_settings(self, settings):
         """设置用户的通知偏好"""
         import json
-        try:
-            # 如果数据库中没有这个字段，我们需要添加
-            if not hasattr(self, 'notification_settings'):
-                # 这里可以考虑使用数据库迁移来添加字段
-                # 为了简化，我们暂时跳过这个功能
-                return
-
-            self.notification_settings = json.dumps(settings)
-        except Exception as e:
-            print(f"Error setting notification preferences: {e}")
+        settings = dict(settings)
+
+        frequency = settings.pop('digest_frequency', None)
+        # 兼容旧的每日摘要开关
+        if frequency is None and settings.pop('daily_digest', False):
+            frequency = self.DIGEST_DAILY
+        settings.pop('daily_digest', None)
+        if frequency is not None:
+            if frequency not in self.DIGEST_FREQUENCIES:
+                raise ValueError(f'Invalid digest frequency: {frequency}')
+            self.notification_digest = frequency
+
+        self.notification_settings = json.dumps(settings)
+
+    def get_digest_frequency(self):
+        """
+        获取关注通知邮件的摘要频率
+        :return: immediate（逐条发送） / hourly / daily
+        """
+        return self.notification_digest or self.DIGEST_IMMEDIATE
 
     def should_receive_notification(self, notification_type):
         """检查用户是否应该接收特定类型的通知"""
@@ -836,6 +861,17 @@ login_manager.anonymous_user = AnonymousUser
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# 上传头像时生成的缩放尺寸
+AVATAR_SIZES = (40, 100, 200)
+
+
+@event.listens_for(User.avatar, 'set')
+def on_avatar_changed(target, value, oldvalue, initiator):
+    """头像换成其他URL（或清空）时，原来的缩放图不再适用"""
+    if value != oldvalue:
+        target.avatar_thumbs = None
+
+
 class UserSession(db.Model):
     __tablename__ = 'user_sessions'
     id = db.Column(db.Integer, primary_key=True)
@@ -28,15 +28,15 @@ class Watch(db.Model):
     target_type = db.Column(Enum(WatchTargetType), nullable=False)
     target_id = db.Column(db.Integer, nullable=False)  # 页面ID或分类ID
 
-    # 监听的事件类型（JSON数组存储）
-    watched_events = db.Column(db.Text, default='[]')  # JSON array of WatchEventType strings
-
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = db.relationship('User', backref='watches')
+    # 监听的事件类型（每个事件一行，见WatchSubscription）
+    subscriptions = db.relationship('WatchSubscription', backref='watch', lazy='selectin',
+                                    cascade='all, delete-orphan')
 
     # 复合索引，确保用户不会重复关注同一个目标
     __table_args__ = (
@@ -44,83 +44,125 @@ class Watch(db.Model):
         db.Index('ix_watches_target', 'target_type', 'target_id'),
     )
 
+    DEFAULT_EVENTS = {
+        WatchTargetType.PAGE: [WatchEventType.PAGE_UPDATED, WatchEventType.PAGE_DELETED,
+                               WatchEventType.ATTACHMENT_ADDED, WatchEventType.ATTACHMENT_REMOVED],
+        WatchTargetType.CATEGORY: [WatchEventType.PAGE_CREATED, WatchEventType.PAGE_UPDATED,
+                                   WatchEventType.PAGE_DELETED, WatchEventType.CATEGORY_UPDATED],
+    }
+
     def __init__(self, **kwargs):
+        watched_events = kwargs.pop('watched_events', None)
         super(Watch, self).__init__(**kwargs)
-        if not self.watched_events:
+        if watched_events is not None:
+            self.set_watched_events(watched_events)
+        elif not self.subscriptions:
             # 默认监听所有相关事件
-            if self.target_type == WatchTargetType.PAGE:
-                self.watched_events = '["page_updated", "page_deleted", "attachment_added", "attachment_removed"]'
-            elif self.target_type == WatchTargetType.CATEGORY:
-                self.watched_events = '["page_created", "page_updated", "page_deleted", "category_updated"]'
+            self.set_watched_events(self.DEFAULT_EVENTS.get(self.target_type, []))
 
     def __repr__(self):
         return f'<Watch {self.user.username} -> {self.target_type.value}:{self.target_id}>'
 
     def get_watched_events(self):
         """获取监听的事件类型列表"""
-        import json
-        return json.loads(self.watched_events) if self.watched_events else []
+        return [subscription.event_type.value for subscription in self.subscriptions]
 
     def set_watched_events(self, events):
         """设置监听的事件类型"""
-        import json
-        if isinstance(events, list):
-            self.watched_events = json.dumps([e.value if hasattr(e, 'value') else e for e in events])
-        else:
-            self.watched_events = json.dumps([])
+        if not isinstance(events, (list, tuple, set)):
+            events = []
+        wanted = set()
+        for event_type in events:
+            try:
+                wanted.add(event_type if isinstance(event_type, WatchEventType) else WatchEventType(event_type))
+            except ValueError:
+                continue
+
+        # 只增删有变化的事件，避免先插后删触发唯一约束
+        for subscription in list(self.subscriptions):
+            if subscription.event_type not in wanted:
+                self.subscriptions.remove(subscription)
+        existing = {subscription.event_type for subscription in self.subscriptions}
+        for event_type in sorted(wanted - existing, key=lambda e: e.value):
+            self.subscriptions.append(WatchSubscription(
+                user_id=self.user_id,
+                target_type=self.target_type,
+                target_id=self.target_id,
+                event_type=event_type
+            ))
 
     def is_watching_event(self, event_type):
         """检查是否在监听特定事件"""
-        watched_events = self.get_watched_events()
         event_value = event_type.value if hasattr(event_type, 'value') else event_type
-        return event_value in watched_events
+        return event_value in self.get_watched_events()
 
     @staticmethod
-    def find_watches_for_event(target_type, target_id, event_type):
-        """查找监听特定事件的所有watch记录"""
-        event_value = event_type.value if hasattr(event_type, 'value') else event_type
-        watches = Watch.query.filter_by(
-            target_type=target_type,
-            target_id=target_id,
-            is_active=True
-        ).all()
-
-        # 过滤出监听了此事件的watch
-        result = []
-        for watch in watches:
-            watched_events = watch.get_watched_events()
-            if event_value in watched_events:
-                result.append(watch)
+    def find_watches_for_event(target_type, target_id, event_type, category_id=None):
+        """
+        查找监听特定事件的所有watch记录（单次索引查询）
+        :param target_type: 目标类型
+        :param target_id: 目标ID
+        :param event_type: 事件类型
+        :param category_id: 同时匹配该分类及其所有父分类上的watch；
+                            可以是分类ID，也可以是返回分类ID的标量子查询
+        :return: Watch列表
+        """
+        from app.models.wiki import Category
 
-        return result
+        if not isinstance(event_type, WatchEventType):
+            event_type = WatchEventType(event_type)
+        if not isinstance(target_type, WatchTargetType):
+            target_type = WatchTargetType(target_type)
+
+        target_match = db.and_(
+            WatchSubscription.target_type == target_type,
+            WatchSubscription.target_id == target_id
+        )
+
+        if category_id is not None:
+            # 递归CTE展开分类及其父分类，和watch查找合并为一条SQL
+            ancestors = db.select(Category.id, Category.parent_id).where(
+                Category.id == category_id
+            ).cte('category_ancestors', recursive=True)
+            ancestors = ancestors.union_all(
+                db.select(Category.id, Category.parent_id).where(Category.id == ancestors.c.parent_id)
+            )
+            target_match = db.or_(target_match, db.and_(
+                WatchSubscription.target_type == WatchTargetType.CATEGORY,
+                WatchSubscription.target_id.in_(db.select(ancestors.c.id))
+            ))
+
+        return Watch.query.join(WatchSubscription, WatchSubscription.watch_id == Watch.id).filter(
+            WatchSubscription.event_type == event_type,
+            target_match,
+            Watch.is_active == True
+        ).all()
 
     @staticmethod
     def find_watches_for_category_event(category_id, event_type):
         """查找监听分类事件的所有watch记录（包括父分类的watch）"""
-        from app.models.wiki import Category
+        return Watch.find_watches_for_event(WatchTargetType.CATEGORY, category_id, event_type,
+                                            category_id=category_id)
 
-        # 获取分类及其所有父分类
-        category = Category.query.get(category_id)
-        if not category:
-            return []
-
-        target_ids = [category_id]
-        current = category
-        while current.parent:
-            target_ids.append(current.parent.id)
-            current = current.parent
-
-        # 查找这些分类的watch记录
-        watches = []
-        for target_id in target_ids:
-            category_watches = Watch.query.filter_by(
-                target_type=WatchTargetType.CATEGORY,
-                target_id=target_id,
-                is_active=True
-            ).all()
-            watches.extend([w for w in category_watches if w.is_watching_event(event_type)])
-
-        return watches
+class WatchSubscription(db.Model):
+    """Watch监听的单个事件，按 (目标, 事件) 建复合索引用于事件投递时查找关注者"""
+    __tablename__ = 'watch_subscriptions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    watch_id = db.Column(db.Integer, db.ForeignKey('watches.id', ondelete='CASCADE'), nullable=False)
+    # 以下字段与所属watch一致，冗余存储以便直接走索引
+    target_type = db.Column(Enum(WatchTargetType), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(Enum(WatchEventType), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_watch_subscriptions_lookup', 'target_type', 'target_id', 'event_type', 'user_id'),
+        db.UniqueConstraint('watch_id', 'event_type', name='uq_watch_subscriptions_watch_event'),
+    )
+
+    def __repr__(self):
+        return f'<WatchSubscription {self.target_type.value}:{self.target_id} {self.event_type.value}>'
 
 class WatchNotification(db.Model):
     """Watch通知记录"""
@@ -141,6 +183,9 @@ class WatchNotification(db.Model):
     message = db.Column(db.Text)  # 通知消息
     url = db.Column(db.String(500))  # 相关链接
 
+    # 幂等键（事件幂等键:用户ID），保证事件重复投递时不会重复生成通知
+    idempotency_key = db.Column(db.String(100), unique=True)
+
     # 状态和时间
     is_read = db.Column(db.Boolean, default=False)
     is_sent = db.Column(db.Boolean, default=False)  # 是否已发送邮件通知
@@ -154,6 +199,8 @@ class WatchNotification(db.Model):
 
     __table_args__ = (
         db.Index('ix_watch_notifications_user_unread', 'user_id', 'is_read'),
+        db.Index('ix_watch_notifications_user_unsent', 'user_id', 'is_sent'),
+        db.Index('ix_watch_notifications_user_created', 'user_id', 'created_at', 'id'),
         db.Index('ix_watch_notifications_created', 'created_at'),
     )
 
@@ -169,103 +216,113 @@ class WatchNotification(db.Model):
 
     def generate_title_and_message(self):
         """生成通知标题和消息"""
-        from app.models.wiki import Page, Category
+        rendered = WatchNotification.render_event(
+            self.event_type, self.target_type, self.target_id,
+            self.actor.username if self.actor else None
+        )
+        self.title = rendered['title']
+        self.message = rendered['message']
+        self.url = rendered['url']
+
+    @staticmethod
+    def render_event(event_type, target_type, target_id, actor_name=None):
+        """
+        渲染事件的通知标题、消息和链接
+        内容与接收者无关，同一事件的所有通知只需渲染一次
+        :return: {'title': str, 'message': str, 'url': str或None}
+        """
+        from app.models.wiki import Page, Category, Attachment
 
         # 获取目标对象
         target = None
-        if self.target_type == WatchTargetType.PAGE:
-            target = Page.query.get(self.target_id)
-        elif self.target_type == WatchTargetType.CATEGORY:
-            target = Category.query.get(self.target_id)
+        if event_type == WatchEventType.COMMENT_MENTION:
+            target = None  # 提及通知的target_id是评论ID，在下面单独处理
+        elif target_type == WatchTargetType.PAGE:
+            target = Page.query.get(target_id)
+        elif target_type == WatchTargetType.CATEGORY:
+            target = Category.query.get(target_id)
 
-        actor_name = self.actor.username if self.actor else 'Unknown'
+        actor_name = actor_name or 'Unknown'
+        title = message = url = None
 
         # 根据事件类型生成标题和消息
-        if self.event_type == WatchEventType.PAGE_CREATED:
-            self.title = f'New page created: {target.title if target else "Unknown"}'
-            self.message = f'{actor_name} created a new page "{target.title if target else "Unknown"}"'
-            self.url = f'/page/{target.slug}' if target else None
-
-        elif self.event_type == WatchEventType.PAGE_UPDATED:
-            self.title = f'Page updated: {target.title if target else "Unknown"}'
-            self.message = f'{actor_name} updated the page "{target.title if target else "Unknown"}"'
-            self.url = f'/page/{target.slug}' if target else None
-
-        elif self.event_type == WatchEventType.PAGE_DELETED:
-            self.title = f'Page deleted'
-            self.message = f'{actor_name} deleted a page'
-            self.url = None
-
-        elif self.event_type == WatchEventType.CATEGORY_CREATED:
-            self.title = f'New category created: {target.name if target else "Unknown"}'
-            self.message = f'{actor_name} created a new category "{target.name if target else "Unknown"}"'
-            self.url = f'/category/{target.id}' if target else None
-
-        elif self.event_type == WatchEventType.CATEGORY_UPDATED:
-            self.title = f'Category updated: {target.name if target else "Unknown"}'
-            self.message = f'{actor_name} updated the category "{target.name if target else "Unknown"}"'
-            self.url = f'/category/{target.id}' if target else None
-
-        elif self.event_type == WatchEventType.CATEGORY_DELETED:
-            self.title = f'Category deleted'
-            self.message = f'{actor_name} deleted a category'
-            self.url = None
-
-        elif self.event_type == WatchEventType.ATTACHMENT_ADDED:
-            self.title = f'Attachment added to: {target.title if target else "Unknown"}'
-            self.message = f'{actor_name} added an attachment to "{target.title if target else "Unknown"}"'
-            self.url = f'/page/{target.slug}' if target else None
-
-        elif self.event_type == WatchEventType.ATTACHMENT_REMOVED:
-            self.title = f'Attachment removed from: {target.title if target else "Unknown"}'
-            self.message = f'{actor_name} removed an attachment from "{target.title if target else "Unknown"}"'
-            self.url = f'/page/{target.slug}' if target else None
-
-        elif self.event_type == WatchEventType.COMMENT_ADDED:
-            # 获取评论内容
-            from app.models.comment import Comment
-            comment = Comment.query.get(self.target_id) if hasattr(self, 'comment_id') else None
-
-            if comment:
-                if comment.target_type.value == 'page':
-                    page_target = Page.query.get(comment.target_id)
-                    if page_target:
-                        self.title = f'New comment on: {page_target.title}'
-                        self.message = f'{actor_name} commented on "{page_target.title}": "{comment.content[:100]}{"..." if len(comment.content) > 100 else ""}"'
-                        self.url = f'/page/{page_target.slug}#comment-{comment.id}'
-                elif comment.target_type.value == 'attachment':
-                    attachment = Attachment.query.get(comment.target_id)
-                    if attachment and attachment.page:
-                        self.title = f'New comment on attachment in: {attachment.page.title}'
-                        self.message = f'{actor_name} commented on an attachment in "{attachment.page.title}": "{comment.content[:100]}{"..." if len(comment.content) > 100 else ""}"'
-                        self.url = f'/page/{attachment.page.slug}#comment-{comment.id}'
+        if event_type == WatchEventType.PAGE_CREATED:
+            title = f'New page created: {target.title if target else "Unknown"}'
+            message = f'{actor_name} created a new page "{target.title if target else "Unknown"}"'
+            url = f'/page/{target.slug}' if target else None
+
+        elif event_type == WatchEventType.PAGE_UPDATED:
+            title = f'Page updated: {target.title if target else "Unknown"}'
+            message = f'{actor_name} updated the page "{target.title if target else "Unknown"}"'
+            url = f'/page/{target.slug}' if target else None
+
+        elif event_type == WatchEventType.PAGE_DELETED:
+            title = f'Page deleted'
+            message = f'{actor_name} deleted a page'
+            url = None
+
+        elif event_type == WatchEventType.CATEGORY_CREATED:
+            title = f'New category created: {target.name if target else "Unknown"}'
+            message = f'{actor_name} created a new category "{target.name if target else "Unknown"}"'
+            url = f'/category/{target.id}' if target else None
+
+        elif event_type == WatchEventType.CATEGORY_UPDATED:
+            title = f'Category updated: {target.name if target else "Unknown"}'
+            message = f'{actor_name} updated the category "{target.name if target else "Unknown"}"'
+            url = f'/category/{target.id}' if target else None
+
+        elif event_type == WatchEventType.CATEGORY_DELETED:
+            title = f'Category deleted'
+            message = f'{actor_name} deleted a category'
+            url = None
+
+        elif event_type == WatchEventType.ATTACHMENT_ADDED:
+            title = f'Attachment added to: {target.title if target else "Unknown"}'
+            message = f'{actor_name} added an attachment to "{target.title if target else "Unknown"}"'
+            url = f'/page/{target.slug}' if target else None
+
+        elif event_type == WatchEventType.ATTACHMENT_REMOVED:
+            title = f'Attachment removed from: {target.title if target else "Unknown"}'
+            message = f'{actor_name} removed an attachment from "{target.title if target else "Unknown"}"'
+            url = f'/page/{target.slug}' if target else None
+
+        elif event_type == WatchEventType.COMMENT_ADDED:
+            # 评论事件的目标是评论所在页面
+            if target:
+                title = f'New comment on: {target.title}'
+                message = f'{actor_name} commented on "{target.title}"'
+                url = f'/page/{target.slug}#comments'
             else:
-                self.title = 'New comment'
-                self.message = f'{actor_name} added a new comment'
-                self.url = None
+                title = 'New comment'
+                message = f'{actor_name} added a new comment'
+                url = None
 
-        elif self.event_type == WatchEventType.COMMENT_MENTION:
+        elif event_type == WatchEventType.COMMENT_MENTION:
             # 获取提及的评论内容
             from app.models.comment import Comment
-            comment = Comment.query.get(self.target_id) if hasattr(self, 'comment_id') else None
+            comment = Comment.query.get(target_id)
 
             if comment:
+                excerpt = f'{comment.content[:100]}{"..." if len(comment.content) > 100 else ""}'
                 if comment.target_type.value == 'page':
                     page_target = Page.query.get(comment.target_id)
                     if page_target:
-                        self.title = f'You were mentioned in a comment on: {page_target.title}'
-                        self.message = f'{actor_name} mentioned you in a comment on "{page_target.title}": "{comment.content[:100]}{"..." if len(comment.content) > 100 else ""}"'
-                        self.url = f'/page/{page_target.slug}#comment-{comment.id}'
+                        title = f'You were mentioned in a comment on: {page_target.title}'
+                        message = f'{actor_name} mentioned you in a comment on "{page_target.title}": "{excerpt}"'
+                        url = f'/page/{page_target.slug}#comment-{comment.id}'
                 elif comment.target_type.value == 'attachment':
                     attachment = Attachment.query.get(comment.target_id)
                     if attachment and attachment.page:
-                        self.title = f'You were mentioned in a comment on: {attachment.page.title}'
-                        self.message = f'{actor_name} mentioned you in a comment on "{attachment.page.title}": "{comment.content[:100]}{"..." if len(comment.content) > 100 else ""}"'
-                        self.url = f'/page/{attachment.page.slug}#comment-{comment.id}'
-            else:
-                self.title = 'You were mentioned in a comment'
-                self.message = f'{actor_name} mentioned you in a comment'
-                self.url = None
+                        title = f'You were mentioned in a comment on: {attachment.page.title}'
+                        message = f'{actor_name} mentioned you in a comment on "{attachment.page.title}": "{excerpt}"'
+                        url = f'/page/{attachment.page.slug}#comment-{comment.id}'
+
+            if not title:
+                title = 'You were mentioned in a comment'
+                message = f'{actor_name} mentioned you in a comment'
+                url = None
+
+        return {'title': title, 'message': message, 'url': url}
 
     def to_dict(self):
         """转换为字典格式"""
@@ -280,4 +337,55 @@ class WatchNotification(db.Model):
             'is_read': self.is_read,
             'created_at': self.created_at.isoformat(),
             'actor': self.actor.username if self.actor else None,
-        }
\ No newline at end of file
+        }
+
+class WatchEventOutbox(db.Model):
+    """Watch事件发件箱（与页面变更写入同一事务，由 `flask watch worker` 异步投递）"""
+    __tablename__ = 'watch_event_outbox'
+
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+
+    # 事件信息
+    event_type = db.Column(db.Enum(WatchEventType), nullable=False)
+    target_type = db.Column(db.Enum(WatchTargetType), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    actor_id = db.Column(db.Integer)
+
+    # 投递状态：pending -> done / failed
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+
+    # 租约：locked_until 之前该事件归 locked_by 所有，过期后可被其他worker重新领取
+    locked_by = db.Column(db.String(64))
+    locked_until = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_watch_event_outbox_status_lease', 'status', 'locked_until'),
+    )
+
+    def __repr__(self):
+        return f'<WatchEventOutbox {self.id} {self.event_type.value} {self.status}>'
+
+    @staticmethod
+    def build_row(event_type, target_type, target_id, actor_id=None):
+        """构造发件箱行数据（供mapper事件中通过同一connection插入）"""
+        import uuid
+        return {
+            'idempotency_key': uuid.uuid4().hex,
+            'event_type': event_type,
+            'target_type': target_type,
+            'target_id': target_id,
+            'actor_id': actor_id,
+            'status': WatchEventOutbox.STATUS_PENDING,
+            'attempts': 0,
+            'created_at': datetime.utcnow(),
+        }
@@ -78,10 +78,16 @@ class Page(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
     last_editor_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     template = db.Column(db.String(64), default='default')
+
+    # 评论统计（由CommentService在评论新增/删除时维护，`flask comments repair-counts` 重新计算）
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = db.Column(db.DateTime)
   
     # Search indexes
     __table_args__ = (
         db.Index('ix_pages_search', 'title', 'summary'),
+        db.Index('ix_pages_comment_count', 'comment_count'),
+        db.Index('ix_pages_last_comment_at', 'last_comment_at'),
     )
 
     # Relationships
@@ -126,7 +132,8 @@ class Page(db.Model):
                         'img']  # Add img tag for image support
         allowed_attrs = {'a': ['href', 'title'], 'abbr': ['title'], 'acronym': ['title'],
                         'pre': ['class'], 'code': ['class'], 'div': ['class'],
-                        'img': ['src', 'alt', 'title', 'class']}  # Add class for styling
+                        'img': ['src', 'alt', 'title', 'class',
+                                'srcset', 'sizes', 'loading', 'decoding']}  # Add class for styling
 
         # Add responsive class to images and make them clickable
         import re
@@ -144,6 +151,10 @@ class Page(db.Model):
 
         html = re.sub(r'<img[^>]*>', add_img_class, html)
 
+        # 本站存储的图片使用按宽度缩放的衍生图（srcset），并延迟加载
+        from app.services.image_service import ImageDerivativeService
+        html = ImageDerivativeService.rewrite_html(html)
+
         # Clean HTML and make links clickable
         html = bleach.linkify(bleach.clean(html, tags=allowed_tags, attributes=allowed_attrs, strip=True))
         target.content_html = html
@@ -348,8 +359,22 @@ class Attachment(db.Model):
     description = db.Column(db.Text)
     is_public = db.Column(db.Boolean, default=True)
 
+    # 评论统计（由CommentService维护）
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = db.Column(db.DateTime)
+
+    # 内容寻址存储（STORAGE_DEDUP开启时），多个附件可以共用同一个文件
+    blob_id = db.Column(db.Integer, db.ForeignKey('storage_blobs.id'), index=True)
+
+    __table_args__ = (
+        # 孤立上传清理：page_id IS NULL AND uploaded_at < ?
+        db.Index('ix_attachments_page_uploaded', 'page_id', 'uploaded_at'),
+        db.Index('ix_attachments_file_path', 'file_path'),
+    )
+
     # Relationships
     uploader = db.relationship('User')
+    blob = db.relationship('StorageBlob')
 
     def __init__(self, **kwargs):
         super(Attachment, self).__init__(**kwargs)
@@ -398,8 +423,8 @@ class Attachment(db.Model):
         else:
             # S3存储，需要获取存储服务来生成URL
             try:
-                from app.services.storage_service import create_storage_service
-                storage_service = create_storage_service(current_app.config['STORAGE_CONFIG'])
+                from app.services.storage_service import get_storage_service
+                storage_service = get_storage_service()
                 return storage_service.get_file_url(self.file_path)
             except Exception as e:
                 # 如果获取存储服务失败，返回相对路径
@@ -459,21 +484,30 @@ def trigger_watch_event(event_type, target_type, target_id, actor_id=None):
         # 记录错误但不影响主流程
         print(f"Error triggering watch event: {e}")
 
+def queue_watch_event(connection, event_type, target_type, target_id, actor_id=None):
+    """
+    将watch事件写入发件箱
+    使用mapper事件提供的connection插入，与页面变更处于同一事务中：
+    事务回滚时事件一并丢弃，提交后由 `flask watch worker` 投递
+    """
+    from app.models.watch import WatchEventOutbox, WatchEventType, WatchTargetType
+
+    connection.execute(
+        WatchEventOutbox.__table__.insert().values(
+            **WatchEventOutbox.build_row(
+                WatchEventType(event_type),
+                WatchTargetType(target_type),
+                target_id,
+                actor_id
+            )
+        )
+    )
+
 @event.listens_for(Page, 'after_insert')
 def on_page_created(mapper, connection, target):
     """页面创建后触发事件"""
     try:
-        from flask import current_app
-        from app.models import WatchTargetType, WatchEventType
-        # 将事件信息存储在应用上下文中，稍后处理
-        if not hasattr(current_app, '_pending_watch_events'):
-            current_app._pending_watch_events = []
-        current_app._pending_watch_events.append({
-            'event_type': WatchEventType.PAGE_CREATED,
-            'target_type': WatchTargetType.PAGE,
-            'target_id': target.id,
-            'actor_id': target.author_id
-        })
+        queue_watch_event(connection, 'page_created', 'page', target.id, target.author_id)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
@@ -485,19 +519,8 @@ def on_page_updated(mapper, connection, target):
         # 清除标记，避免重复触发
         delattr(target, '_watch_content_changed')
 
-        # 使用异步方式触发事件，避免数据库会话冲突
         try:
-            from flask import current_app
-            from app.models import WatchTargetType, WatchEventType
-            # 将事件信息存储在应用上下文中，稍后处理
-            if not hasattr(current_app, '_pending_watch_events'):
-                current_app._pending_watch_events = []
-            current_app._pending_watch_events.append({
-                'event_type': WatchEventType.PAGE_UPDATED,
-                'target_type': WatchTargetType.PAGE,
-                'target_id': target.id,
-                'actor_id': target.last_editor_id
-            })
+            queue_watch_event(connection, 'page_updated', 'page', target.id, target.last_editor_id)
         except Exception as e:
             print(f"Warning: Failed to queue watch event: {e}")
 
@@ -505,16 +528,7 @@ def on_page_updated(mapper, connection, target):
 def on_page_deleted(mapper, connection, target):
     """页面删除前触发事件"""
     try:
-        from flask import current_app
-        # 将事件信息存储在应用上下文中，稍后处理
-        if not hasattr(current_app, '_pending_watch_events'):
-            current_app._pending_watch_events = []
-        current_app._pending_watch_events.append({
-            'event_type': 'page_deleted',
-            'target_type': 'page',
-            'target_id': target.id,
-            'actor_id': None
-        })
+        queue_watch_event(connection, 'page_deleted', 'page', target.id)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
@@ -522,16 +536,7 @@ def on_page_deleted(mapper, connection, target):
 def on_category_created(mapper, connection, target):
     """分类创建后触发事件"""
     try:
-        from flask import current_app
-        # 将事件信息存储在应用上下文中，稍后处理
-        if not hasattr(current_app, '_pending_watch_events'):
-            current_app._pending_watch_events = []
-        current_app._pending_watch_events.append({
-            'event_type': 'category_created',
-            'target_type': 'category',
-            'target_id': target.id,
-            'actor_id': target.created_by
-        })
+        queue_watch_event(connection, 'category_created', 'category', target.id, target.created_by)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
@@ -539,16 +544,7 @@ def on_category_created(mapper, connection, target):
 def on_category_updated(mapper, connection, target):
     """分类更新后触发事件"""
     try:
-        from flask import current_app
-        # 将事件信息存储在应用上下文中，稍后处理
-        if not hasattr(current_app, '_pending_watch_events'):
-            current_app._pending_watch_events = []
-        current_app._pending_watch_events.append({
-            'event_type': 'category_updated',
-            'target_type': 'category',
-            'target_id': target.id,
-            'actor_id': None
-        })
+        queue_watch_event(connection, 'category_updated', 'category', target.id)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
@@ -556,16 +552,7 @@ def on_category_updated(mapper, connection, target):
 def on_category_deleted(mapper, connection, target):
     """分类删除前触发事件"""
     try:
-        from flask import current_app
-        # 将事件信息存储在应用上下文中，稍后处理
-        if not hasattr(current_app, '_pending_watch_events'):
-            current_app._pending_watch_events = []
-        current_app._pending_watch_events.append({
-            'event_type': 'category_deleted',
-            'target_type': 'category',
-            'target_id': target.id,
-            'actor_id': None
-        })
+        queue_watch_event(connection, 'category_deleted', 'category', target.id)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
@@ -573,17 +560,8 @@ def on_category_deleted(mapper, connection, target):
 def on_attachment_added(mapper, connection, target):
     """附件添加后触发事件"""
     try:
-        from flask import current_app
         if target.page_id:
-            # 将事件信息存储在应用上下文中，稍后处理
-            if not hasattr(current_app, '_pending_watch_events'):
-                current_app._pending_watch_events = []
-            current_app._pending_watch_events.append({
-                'event_type': 'attachment_added',
-                'target_type': 'page',
-                'target_id': target.page_id,
-                'actor_id': target.uploaded_by
-            })
+            queue_watch_event(connection, 'attachment_added', 'page', target.page_id, target.uploaded_by)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
@@ -591,20 +569,18 @@ def on_attachment_added(mapper, connection, target):
 def on_attachment_removed(mapper, connection, target):
     """附件删除前触发事件"""
     try:
-        from flask import current_app
         if target.page_id:
-            # 将事件信息存储在应用上下文中，稍后处理
-            if not hasattr(current_app, '_pending_watch_events'):
-                current_app._pending_watch_events = []
-            current_app._pending_watch_events.append({
-                'event_type': 'attachment_removed',
-                'target_type': 'page',
-                'target_id': target.page_id,
-                'actor_id': target.uploaded_by
-            })
+            queue_watch_event(connection, 'attachment_removed', 'page', target.page_id, target.uploaded_by)
     except Exception as e:
         print(f"Warning: Failed to queue watch event: {e}")
 
+@event.listens_for(Attachment, 'after_delete')
+def on_attachment_deleted(mapper, connection, target):
+    """附件删除后释放对存储文件的引用（文件由 `flask storage gc` 回收）"""
+    if target.blob_id:
+        from app.models.storage import StorageBlob
+        StorageBlob.adjust_refs(target.blob_id, -1, connection=connection)
+
 # 页面内容变更监听器
 @event.listens_for(Page.content, 'set')
 def on_page_content_change_with_watch(target, value, oldvalue, initiator):
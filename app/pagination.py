@@ -0,0 +1,223 @@
+"""
+游标（keyset）分页
+按 (created_at, id) 元组定位下一页：
+    WHERE created_at < :created_at OR (created_at = :created_at AND id < :id)
+    ORDER BY created_at DESC, id DESC LIMIT :limit
+不需要COUNT(*)，也不需要扫描OFFSET之前的行，深页和首页一样快；游标对客户端是不透明的字符串
+"""
+
+from datetime import datetime
+from math import ceil
+import base64
+import json
+import threading
+import time
+from app import db
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+def encode_cursor(sort_value, row_id):
+    """
+    编码游标
+    :param sort_value: 排序列的值（datetime）
+    :param row_id: 行ID
+    :return: 不透明的游标字符串
+    """
+    payload = json.dumps([sort_value.isoformat() if sort_value else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解码游标
+    :param cursor: 游标字符串
+    :return: (排序列的值, 行ID)
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        sort_value, row_id = json.loads(payload)
+        return (datetime.fromisoformat(sort_value) if sort_value else None), int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}')
+
+
+def _keyset_limit(limit, max_limit=100):
+    """游标分页的每页数量（1到max_limit之间）"""
+    return max(1, min(limit or 20, max_limit))
+
+
+def keyset_query(query, model, limit=20, cursor=None, sort_column=None, descending=True, max_limit=100):
+    """
+    游标分页的查询：按游标过滤、排序，并多取一行用于判断是否还有下一页
+    返回的查询可以直接执行，也可以作为子查询与关联的行一起取出
+    :param query: 已过滤的查询（排序会被替换）
+    :param model: 模型类，需要有id列
+    :param limit: 每页数量
+    :param cursor: 上一页返回的next_cursor
+    :param sort_column: 排序列，默认为model.created_at
+    :param descending: 是否倒序（最新的在前）
+    :param max_limit: 每页数量上限
+    :return: (查询, 实际的每页数量)
+    """
+    sort_column = sort_column if sort_column is not None else model.created_at
+    limit = _keyset_limit(limit, max_limit)
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(db.or_(
+                sort_column < sort_value,
+                db.and_(sort_column == sort_value, model.id < row_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                sort_column > sort_value,
+                db.and_(sort_column == sort_value, model.id > row_id)
+            ))
+
+    if descending:
+        query = query.order_by(None).order_by(sort_column.desc(), model.id.desc())
+    else:
+        query = query.order_by(None).order_by(sort_column.asc(), model.id.asc())
+
+    # 多取一行判断是否还有下一页
+    return query.limit(limit + 1), limit
+
+
+def keyset_page(rows, limit, model, sort_column=None):
+    """
+    从keyset_query的结果（已排序，多取一行）中切出当前页
+    :return: (items, next_cursor)，没有下一页时next_cursor为None
+    """
+    sort_column = sort_column if sort_column is not None else model.created_at
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+    return items, next_cursor
+
+
+def keyset_paginate(query, model, limit=20, cursor=None, sort_column=None, descending=True, max_limit=100):
+    """
+    游标分页
+    :param query: 已过滤的查询（排序会被替换）
+    :param model: 模型类，需要有id列
+    :param limit: 每页数量
+    :param cursor: 上一页返回的next_cursor
+    :param sort_column: 排序列，默认为model.created_at
+    :param descending: 是否倒序（最新的在前）
+    :param max_limit: 每页数量上限
+    :return: (items, next_cursor)，没有下一页时next_cursor为None
+    """
+    page_query, limit = keyset_query(query, model, limit, cursor, sort_column, descending, max_limit)
+    return keyset_page(page_query.all(), limit, model, sort_column)
+
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def cached_count(query, cache_key, ttl=60, max_entries=10000):
+    """
+    带进程内缓存的COUNT(*)，总数只用于展示，允许短时间不精确
+    :param query: 查询
+    :param cache_key: 缓存键（调用方保证能唯一标识查询条件）
+    :param ttl: 缓存秒数
+    :return: 行数
+    """
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    total = query.order_by(None).count()
+
+    with _count_lock:
+        if len(_count_cache) >= max_entries:
+            _count_cache.clear()
+        _count_cache[cache_key] = (total, now + ttl)
+    return total
+
+
+def page_query(query, model, per_page=20, cursor=None, page=None, sort_column=None):
+    """
+    paginate的当前页查询（已排序），可以作为子查询与关联的行（如评论的回复）一起取出，
+    结果交给page_result切出当前页
+    :param query: 已过滤的查询
+    :param model: 模型类
+    :param per_page: 每页数量
+    :param cursor: 游标
+    :param page: 页码（旧接口）
+    :param sort_column: 排序列，默认为model.created_at
+    :return: 查询
+    """
+    if page is not None:
+        # 与Flask-SQLAlchemy的paginate(error_out=False)一致：非法的页码和每页数量使用默认值
+        page = max(page, 1)
+        per_page = per_page if per_page and per_page > 0 else 20
+        sort_column = sort_column if sort_column is not None else model.created_at
+        return query.order_by(None).order_by(sort_column.desc(), model.id.desc()) \
+            .offset((page - 1) * per_page).limit(per_page)
+
+    return keyset_query(query, model, per_page, cursor, sort_column=sort_column)[0]
+
+
+def page_result(rows, query, model, per_page=20, page=None, with_total=False, count_key=None,
+                sort_column=None):
+    """
+    由page_query的结果生成当前页和分页元数据
+    :param rows: page_query的结果（按page_query的顺序）
+    :param query: 传给page_query的查询（用于计算总数）
+    :return: (items, 分页元数据字典)
+    """
+    def count():
+        if count_key:
+            return cached_count(query, count_key)
+        return query.order_by(None).count()
+
+    if page is not None:
+        current_page = page
+        page = max(page, 1)
+        per_page = per_page if per_page and per_page > 0 else 20
+        total = count()
+        pages = ceil(total / per_page) if total else 0
+        return rows[:per_page], {
+            'total': total,
+            'pages': pages,
+            'current_page': current_page,
+            'has_next': page < pages,
+            'has_prev': page > 1
+        }
+
+    items, next_cursor = keyset_page(rows, _keyset_limit(per_page), model, sort_column)
+    meta = {
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None
+    }
+    if with_total:
+        meta['total'] = count()
+    return items, meta
+
+
+def paginate(query, model, per_page=20, cursor=None, page=None, with_total=False, count_key=None,
+             sort_column=None):
+    """
+    JSON接口通用分页
+    默认使用游标分页；传入page时使用旧的页码分页（兼容已有客户端），总数走缓存
+    :param query: 已过滤的查询
+    :param model: 模型类
+    :param per_page: 每页数量
+    :param cursor: 游标
+    :param page: 页码（旧接口）
+    :param with_total: 游标分页时是否返回总数
+    :param count_key: 总数缓存键，为None时不缓存
+    :param sort_column: 排序列，默认为model.created_at
+    :return: (items, 分页元数据字典)
+    """
+    rows = page_query(query, model, per_page, cursor, page, sort_column).all()
+    return page_result(rows, query, model, per_page, page, with_total, count_key, sort_column)
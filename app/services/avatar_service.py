@@ -0,0 +1,148 @@
+"""
+用户头像
+上传头像时裁成正方形并生成 40/100/200 三个尺寸，与原图存在一起；
+头像URL按 (用户ID, 尺寸) 缓存在进程内，序列化一组评论/用户时一次取出全部作者的头像
+"""
+
+from io import BytesIO
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import load_only
+
+from app.models.user import User, AVATAR_SIZES
+from app.services.storage_service import get_storage_service
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 未安装Pillow时只保存原图
+    Image = None
+
+DEFAULT_AVATAR = '/static/img/default-avatar.png'
+
+_cache = {}  # {用户ID: {尺寸: (URL, 过期时间)}}
+_cache_lock = threading.Lock()
+
+
+class AvatarService:
+    """头像服务"""
+
+    @staticmethod
+    def generate_sizes(file_path, storage_service=None):
+        """
+        为上传的头像生成固定尺寸的正方形缩放图
+        :param file_path: 原图相对路径
+        :param storage_service: 存储服务，默认应用的存储服务
+        :return: 缩放图URL模板（{size}为尺寸），无法生成时返回None
+        """
+        if Image is None:
+            return None
+
+        from app.services.image_service import ImageDerivativeService
+
+        storage_service = storage_service or get_storage_service()
+        variant_format = ImageDerivativeService.variant_format()
+
+        try:
+            stream = storage_service.open_file(file_path)
+            try:
+                with Image.open(stream) as image:
+                    image = ImageOps.exif_transpose(image)
+                    image = image.convert('RGBA' if variant_format == 'webp' else 'RGB')
+                    for size in AVATAR_SIZES:
+                        thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                        buffer = BytesIO()
+                        if variant_format == 'webp':
+                            thumb.save(buffer, format='WEBP', quality=85, method=4)
+                        else:
+                            thumb.save(buffer, format='JPEG', quality=85, optimize=True)
+                        buffer.seek(0)
+                        saved = storage_service.put_file(buffer, AvatarService.size_path(file_path, size),
+                                                         f'image/{variant_format}')
+                        if not saved.get('success'):
+                            print(f"Error saving avatar size {size} for {file_path}: {saved.get('message')}")
+                            return None
+            finally:
+                stream.close()
+        except Exception as e:
+            print(f"Error resizing avatar {file_path}: {e}")
+            return None
+
+        return storage_service.get_file_url(AvatarService.size_path(file_path, '{size}'))
+
+    @staticmethod
+    def size_path(file_path, size):
+        """缩放图的存储路径，如 avatars/a.png 的40尺寸为 avatars/a_40.webp"""
+        from app.services.image_service import ImageDerivativeService
+
+        extension = 'webp' if ImageDerivativeService.variant_format() == 'webp' else 'jpg'
+        return f"{os.path.splitext(file_path)[0]}_{size}.{extension}"
+
+    @staticmethod
+    def url(user, size=40):
+        """单个用户的头像URL"""
+        return AvatarService.resolve([user], size).get(user.id, DEFAULT_AVATAR)
+
+    @staticmethod
+    def resolve(users, size=40):
+        """
+        批量获取头像URL
+        :param users: User对象或用户ID的列表（可混合），缓存未命中的ID用一条查询取出
+        :param size: 尺寸
+        :return: {用户ID: 头像URL}
+        """
+        now = time.monotonic()
+        ttl = current_app.config.get('AVATAR_CACHE_TTL', 300)
+        result = {}
+        objects = {}
+        missing_ids = set()
+
+        with _cache_lock:
+            for user in users:
+                if user is None:
+                    continue
+                user_id = user if isinstance(user, int) else user.id
+                cached = _cache.get(user_id, {}).get(size)
+                if cached and cached[1] > now:
+                    result[user_id] = cached[0]
+                elif isinstance(user, int):
+                    missing_ids.add(user_id)
+                else:
+                    objects[user_id] = user
+
+        missing_ids -= set(objects)
+        if missing_ids:
+            loaded = User.query.options(
+                load_only(User.id, User.email, User.avatar, User.avatar_hash, User.avatar_thumbs)
+            ).filter(User.id.in_(missing_ids)).all()
+            objects.update((user.id, user) for user in loaded)
+
+        resolved = {user_id: user.get_avatar(size=size) or DEFAULT_AVATAR for user_id, user in objects.items()}
+        if resolved:
+            with _cache_lock:
+                if len(_cache) > 50000:
+                    _cache.clear()
+                for user_id, avatar_url in resolved.items():
+                    _cache.setdefault(user_id, {})[size] = (avatar_url, now + ttl)
+        result.update(resolved)
+        return result
+
+    @staticmethod
+    def invalidate(user_id):
+        """清除用户的头像缓存"""
+        with _cache_lock:
+            _cache.pop(user_id, None)
+
+
+_AVATAR_FIELDS = ('avatar', 'avatar_thumbs', 'avatar_hash', 'email')
+
+
+@event.listens_for(User, 'after_update')
+def _on_user_updated(mapper, connection, target):
+    # 只有影响头像URL的字段变化时才清除（每个请求都会更新last_seen）；其他进程的修改在TTL到期后生效
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _AVATAR_FIELDS):
+        AvatarService.invalidate(target.id)
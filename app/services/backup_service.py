@@ -0,0 +1,336 @@
+"""
+数据库备份
+管理后台只创建待执行的备份记录，由独立进程 `flask backup worker` 领取执行，
+不占用web进程（gevent worker中的长时间复制和压缩会阻塞同一进程的所有请求）。
+SQLite使用在线备份API（sqlite3.Connection.backup）
+每步复制 BACKUP_SQLITE_PAGES 页到临时文件，步骤之间其他连接仍可读写；
+PostgreSQL使用 pg_dump，逐块读取其输出。数据库文件逐块压缩写入 BACKUP_FOLDER 下的ZIP，
+备份的状态、进度和文件记录在 database_backups 表
+"""
+
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+import zipfile
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.models.backup import DatabaseBackup
+
+# 读取/压缩的块大小
+BACKUP_CHUNK_SIZE = 1024 * 1024
+# SQLite先复制再压缩，复制阶段占总进度的比例
+SQLITE_COPY_PROGRESS = 60
+
+_ACTIVE = (DatabaseBackup.STATUS_PENDING, DatabaseBackup.STATUS_RUNNING)
+
+
+def _now_text():
+    """与SQLAlchemy在SQLite中保存DateTime的格式一致"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class _Progress:
+    """把已处理的字节（页）数换算为 start-end 之间的百分比，只在百分比变化时写入"""
+
+    def __init__(self, write, start=0, end=100):
+        self.write = write
+        self.start = start
+        self.end = end
+        self.percent = None
+
+    def __call__(self, done, total):
+        percent = self.start + (self.end - self.start) * min(done, total) // max(total, 1)
+        if percent != self.percent:
+            self.percent = percent
+            self.write(percent)
+
+
+class BackupService:
+    """数据库备份服务"""
+
+    @staticmethod
+    def backup_folder():
+        """备份文件目录（默认 <instance>/backups，不在公开的上传目录中）"""
+        folder = current_app.config.get('BACKUP_FOLDER') or os.path.join(current_app.instance_path, 'backups')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def file_path(backup):
+        """备份ZIP的本地路径，未完成的备份返回None"""
+        if not backup.filename:
+            return None
+        return os.path.join(BackupService.backup_folder(), backup.filename)
+
+    @staticmethod
+    def create(user=None):
+        """
+        创建备份记录（pending），由 `flask backup worker` 执行；同一时间只允许一个备份
+        :return: (DatabaseBackup, None) 或 (None, 错误信息)
+        """
+        BackupService.fail_stale()
+        if DatabaseBackup.query.filter(DatabaseBackup.status.in_(_ACTIVE)).first():
+            return None, '已有备份正在进行，请等待完成'
+
+        backup = DatabaseBackup(
+            status=DatabaseBackup.STATUS_PENDING,
+            progress=0,
+            dialect=db.engine.dialect.name,
+            created_by=user.id if user else None
+        )
+        db.session.add(backup)
+        db.session.commit()
+        return backup, None
+
+    @staticmethod
+    def fail_stale():
+        """
+        超过 BACKUP_STALE_MINUTES 未更新的任务标记为失败：
+        running为执行的进程已退出，pending为没有运行备份worker
+        """
+        cutoff = datetime.utcnow() - timedelta(minutes=current_app.config.get('BACKUP_STALE_MINUTES', 30))
+        failed = 0
+        for status, error in ((DatabaseBackup.STATUS_RUNNING, '备份进程已中断'),
+                              (DatabaseBackup.STATUS_PENDING, '没有运行 flask backup worker，备份未执行')):
+            failed += DatabaseBackup.query.filter(
+                DatabaseBackup.status == status,
+                DatabaseBackup.updated_at < cutoff
+            ).update({'status': DatabaseBackup.STATUS_FAILED, 'error': error}, synchronize_session=False)
+        db.session.commit()
+        return failed
+
+    @staticmethod
+    def claim(backup_id=None):
+        """
+        领取待执行的备份（pending -> running，条件更新保证多个worker不会重复执行）
+        :param backup_id: 只领取指定的备份，默认领取最早的一个
+        :return: 备份ID，没有可领取的备份时返回None
+        """
+        if backup_id is not None:
+            pending_ids = [backup_id]
+        else:
+            pending_ids = [pending_id for (pending_id,) in db.session.query(DatabaseBackup.id).filter_by(
+                status=DatabaseBackup.STATUS_PENDING).order_by(DatabaseBackup.id)]
+        for backup_id in pending_ids:
+            claimed = DatabaseBackup.query.filter_by(
+                id=backup_id, status=DatabaseBackup.STATUS_PENDING
+            ).update({'status': DatabaseBackup.STATUS_RUNNING, 'started_at': datetime.utcnow()},
+                     synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return backup_id
+        db.session.commit()
+        return None
+
+    @staticmethod
+    def run_worker(poll_interval=5.0, once=False):
+        """
+        备份worker：循环领取并执行待执行的备份，直到被中断
+        :param poll_interval: 没有待执行的备份时的等待秒数
+        :param once: 只处理当前待执行的备份后返回
+        :return: 执行的备份数
+        """
+        processed = 0
+        while True:
+            backup_id = BackupService.claim()
+            if backup_id is not None:
+                BackupService.run(backup_id)
+                processed += 1
+                continue
+            if once:
+                return processed
+            db.session.remove()
+            time.sleep(poll_interval)
+
+    @staticmethod
+    def run(backup_id):
+        """
+        执行备份：写入 <BACKUP_FOLDER>/<文件名>.partial，完成后重命名
+        :param backup_id: 已由claim领取的DatabaseBackup ID
+        :return: 是否成功
+        """
+        backup = db.session.get(DatabaseBackup, backup_id)
+        timestamp = (backup.created_at or datetime.utcnow()).strftime('%Y%m%d_%H%M%S')
+        filename = f'enterprise_backup_{timestamp}_{backup_id}.zip'
+        folder = BackupService.backup_folder()
+        target_path = os.path.join(folder, filename)
+        partial_path = target_path + '.partial'
+
+        try:
+            dialect = db.engine.dialect.name
+            with zipfile.ZipFile(partial_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                if dialect == 'sqlite':
+                    BackupService._write_sqlite(archive, backup_id, folder)
+                elif dialect == 'postgresql':
+                    BackupService._write_postgresql(archive, backup_id)
+                else:
+                    raise RuntimeError(f'不支持备份 {dialect} 数据库')
+                archive.writestr('backup_info.txt', BackupService._info(backup_id, dialect))
+            os.replace(partial_path, target_path)
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            print(f"Error creating backup {backup_id}: {e}")
+            BackupService._update(backup_id, status=DatabaseBackup.STATUS_FAILED, error=str(e))
+            return False
+
+        BackupService._update(
+            backup_id,
+            status=DatabaseBackup.STATUS_COMPLETED,
+            progress=100,
+            filename=filename,
+            file_size=os.path.getsize(target_path),
+            completed_at=datetime.utcnow()
+        )
+        BackupService.prune()
+        return True
+
+    @staticmethod
+    def _update(backup_id, **values):
+        DatabaseBackup.query.filter_by(id=backup_id).update(values, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def _write_sqlite(archive, backup_id, folder):
+        """在线备份到临时文件，再逐块压缩写入ZIP"""
+        fd, copy_path = tempfile.mkstemp(prefix='.backup-', suffix='.db', dir=folder)
+        os.close(fd)
+        try:
+            with db.engine.connect() as connection:
+                source = connection.connection.driver_connection
+
+                def write_progress(percent):
+                    # 通过备份所用的连接写入：其他连接的写入会让在线备份从头开始，
+                    # 同一连接的修改则会同步到备份中
+                    try:
+                        source.execute(
+                            'UPDATE database_backups SET progress = ?, updated_at = ? WHERE id = ?',
+                            (percent, _now_text(), backup_id)
+                        )
+                        source.commit()
+                    except sqlite3.OperationalError:
+                        source.rollback()  # 数据库被其他写入锁定，跳过这次进度更新
+
+                progress = _Progress(write_progress, 0, SQLITE_COPY_PROGRESS)
+                target = sqlite3.connect(copy_path)
+                try:
+                    source.backup(
+                        target,
+                        pages=current_app.config.get('BACKUP_SQLITE_PAGES', 1024),
+                        progress=lambda status, remaining, total: progress(total - remaining, total),
+                        sleep=current_app.config.get('BACKUP_SQLITE_SLEEP', 0.05)
+                    )
+                finally:
+                    target.close()
+
+            database = db.engine.url.database
+            name = os.path.basename(database) if database and database != ':memory:' else 'database.db'
+            progress = _Progress(lambda percent: BackupService._update(backup_id, progress=percent),
+                                 SQLITE_COPY_PROGRESS, 99)
+            with open(copy_path, 'rb') as source_file:
+                BackupService._write_stream(archive, name, source_file, os.path.getsize(copy_path), progress)
+        finally:
+            os.remove(copy_path)
+
+    @staticmethod
+    def _write_postgresql(archive, backup_id):
+        """pg_dump（custom格式、不压缩，由ZIP压缩）的输出逐块写入ZIP，按数据库大小估算进度"""
+        url = db.engine.url
+        command = [current_app.config.get('BACKUP_PG_DUMP', 'pg_dump'),
+                   '--format=custom', '--compress=0', '--no-owner', '--no-password']
+        if url.host:
+            command += ['--host', url.host]
+        if url.port:
+            command += ['--port', str(url.port)]
+        if url.username:
+            command += ['--username', url.username]
+        command += ['--dbname', url.database]
+        # 密码通过环境变量传递，不出现在进程列表中
+        env = dict(os.environ)
+        if url.password:
+            env['PGPASSWORD'] = url.password
+
+        total = db.session.execute(text('SELECT pg_database_size(current_database())')).scalar() or 0
+        db.session.commit()
+        progress = _Progress(lambda percent: BackupService._update(backup_id, progress=percent), 0, 99)
+
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors, env=env)
+            try:
+                BackupService._write_stream(archive, f'{url.database}.dump', process.stdout, total, progress)
+            except BaseException:
+                process.kill()
+                raise
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+            if returncode != 0:
+                errors.seek(0)
+                message = errors.read().decode('utf-8', 'replace').strip()
+                raise RuntimeError(f'pg_dump 退出码 {returncode}: {message}')
+
+    @staticmethod
+    def _write_stream(archive, name, stream, total, progress):
+        info = zipfile.ZipInfo(name, datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        done = 0
+        with archive.open(info, 'w', force_zip64=True) as target:
+            while True:
+                chunk = stream.read(BACKUP_CHUNK_SIZE)
+                if not chunk:
+                    break
+                target.write(chunk)
+                done += len(chunk)
+                progress(done, total)
+
+    @staticmethod
+    def _info(backup_id, dialect):
+        """备份说明文件"""
+        from app.models import User, Page, Category
+
+        backup = db.session.get(DatabaseBackup, backup_id)
+        if dialect == 'sqlite':
+            restore = '停止应用后用压缩包中的数据库文件替换 SQLALCHEMY_DATABASE_URI 指向的文件'
+        else:
+            restore = 'pg_restore --clean --if-exists --no-owner --dbname <数据库> <备份文件>.dump'
+        return '\n'.join([
+            'Enterprise Wiki Backup Information',
+            f'Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+            f'Backup ID: {backup_id}',
+            f'Created by: {backup.creator.username if backup.creator else "System"}',
+            f'Database: {dialect}',
+            f'Restore: {restore}',
+            '',
+            'Statistics:',
+            f'- Users: {User.query.count()}',
+            f'- Pages: {Page.query.count()}',
+            f'- Categories: {Category.query.count()}',
+            ''
+        ])
+
+    @staticmethod
+    def prune(keep=None):
+        """
+        只保留最近 BACKUP_KEEP 个已完成的备份，删除更早的备份文件和记录
+        :return: 删除的备份数
+        """
+        if keep is None:
+            keep = current_app.config.get('BACKUP_KEEP', 10)
+        if not keep:
+            return 0
+        expired = DatabaseBackup.query.filter_by(status=DatabaseBackup.STATUS_COMPLETED)\
+            .order_by(DatabaseBackup.created_at.desc(), DatabaseBackup.id.desc()).offset(keep).all()
+        for backup in expired:
+            file_path = BackupService.file_path(backup)
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            db.session.delete(backup)
+        db.session.commit()
+        return len(expired)
@@ -0,0 +1,193 @@
+"""
+内容寻址（去重）存储
+开启STORAGE_DEDUP后，上传文件按SHA-256存为 blobs/<前两位>/<sha256>.<扩展名>，
+相同内容只写入（或PUT到S3）一次；storage_blobs表记录每个文件被多少附件/分享引用，
+引用数为0的文件由 `flask storage gc` 删除
+"""
+
+from datetime import datetime, timedelta
+import os
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.storage import StorageBlob, StoredImage
+from app.services.storage_service import hash_stream
+
+
+class BlobService:
+    """内容寻址存储服务"""
+
+    @staticmethod
+    def dedup_enabled():
+        return bool(current_app.config.get('STORAGE_DEDUP'))
+
+    @staticmethod
+    def blob_path(sha256, filename):
+        """按内容哈希生成存储路径，保留扩展名以便按类型提供文件"""
+        extension = os.path.splitext(secure_filename(filename))[1].lower()
+        return f"blobs/{sha256[:2]}/{sha256}{extension}"
+
+    @staticmethod
+    def store(storage_service, file_data, filename, content_type, folder=''):
+        """
+        保存上传文件
+        开启去重时内容已存在则跳过写入，只增加引用计数（随当前会话一起提交）；
+        未开启时与 storage_service.upload_file 相同
+        :param storage_service: StorageService
+        :param file_data: 文件数据流
+        :param filename: 原始文件名
+        :param content_type: MIME类型
+        :param folder: 未开启去重时使用的存储文件夹
+        :return: upload_file格式的结果，另含 blob_id 和 deduplicated
+        """
+        if not BlobService.dedup_enabled():
+            result = storage_service.upload_file(file_data, filename, content_type, folder)
+            result.setdefault('blob_id', None)
+            result['deduplicated'] = False
+            return result
+
+        file_data.seek(0)
+        file_size, sha256 = hash_stream(file_data)
+        safe_filename = secure_filename(filename)
+
+        blob = StorageBlob.query.filter_by(sha256=sha256).first()
+        # 记录可能恰好被GC删除，此时按新文件重新写入
+        deduplicated = blob is not None and StorageBlob.adjust_refs(blob.id, 1) == 1
+        if not deduplicated:
+            relative_path = BlobService.blob_path(sha256, filename)
+            result = storage_service.put_file(file_data, relative_path, content_type)
+            if not result.get('success'):
+                return result
+            blob = BlobService._register(sha256, relative_path, file_size, content_type)
+            StorageBlob.adjust_refs(blob.id, 1)
+
+        return {
+            'success': True,
+            'filename': os.path.basename(blob.file_path),
+            'original_filename': safe_filename,
+            'url': storage_service.get_file_url(blob.file_path),
+            'file_path': blob.file_path,
+            'relative_path': blob.file_path,
+            'file_size': blob.file_size,
+            'sha256': sha256,
+            'blob_id': blob.id,
+            'deduplicated': deduplicated
+        }
+
+    @staticmethod
+    def _register(sha256, file_path, file_size, content_type):
+        """登记新文件；并发上传相同内容时以先提交的记录为准"""
+        try:
+            with db.session.begin_nested():
+                blob = StorageBlob(sha256=sha256, file_path=file_path, file_size=file_size,
+                                   content_type=content_type, ref_count=0)
+                db.session.add(blob)
+            return blob
+        except IntegrityError:
+            return StorageBlob.query.filter_by(sha256=sha256).one()
+
+    @staticmethod
+    def release(blob_id):
+        """释放一个引用（随当前会话一起提交）"""
+        if blob_id:
+            StorageBlob.adjust_refs(blob_id, -1)
+
+    @staticmethod
+    def dedupe_existing(storage_service, batch_size=200):
+        """
+        为已有附件建立内容寻址记录：逐个计算已存文件的SHA-256，
+        内容相同的附件指向同一个文件，多余的副本在不再被引用后删除
+        :return: (处理的附件数, 删除的重复文件数)
+        """
+        from app.models.wiki import Attachment
+
+        processed = removed = 0
+        last_id = 0
+        while True:
+            attachments = Attachment.query.filter(
+                Attachment.id > last_id,
+                Attachment.blob_id.is_(None),
+                Attachment.file_path.isnot(None),
+                Attachment.file_path != ''
+            ).order_by(Attachment.id).limit(batch_size).all()
+            if not attachments:
+                break
+
+            for attachment in attachments:
+                last_id = attachment.id
+                try:
+                    stream = storage_service.open_file(attachment.file_path)
+                    try:
+                        file_size, sha256 = hash_stream(stream)
+                    finally:
+                        stream.close()
+                except Exception as e:
+                    print(f"Error hashing attachment {attachment.id} ({attachment.file_path}): {e}")
+                    continue
+
+                blob = StorageBlob.query.filter_by(sha256=sha256).first()
+                if blob is None:
+                    # 第一次见到的内容，原文件就地登记为blob
+                    blob = BlobService._register(sha256, attachment.file_path, file_size, attachment.mime_type)
+
+                old_path = attachment.file_path
+                attachment.blob_id = blob.id
+                attachment.file_path = blob.file_path
+                attachment.filename = os.path.basename(blob.file_path)
+                StorageBlob.adjust_refs(blob.id, 1)
+                db.session.commit()
+                processed += 1
+
+                # 重复的副本没有其他附件使用时删除
+                if old_path != blob.file_path and not Attachment.query.filter_by(file_path=old_path).first():
+                    if storage_service.delete_file(old_path):
+                        removed += 1
+
+        return processed, removed
+
+    @staticmethod
+    def collect_garbage(storage_service, grace_seconds=3600, batch_size=200):
+        """
+        删除不再被引用的文件和记录
+        :param grace_seconds: 引用数降为0后至少保留的秒数
+        :return: 删除的文件数
+        """
+        from app.services.upload_gc import UploadGC
+
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        removed = 0
+        last_id = 0
+        while True:
+            blobs = StorageBlob.query.filter(
+                StorageBlob.id > last_id,
+                StorageBlob.ref_count <= 0,
+                StorageBlob.updated_at < cutoff
+            ).order_by(StorageBlob.id).limit(batch_size).all()
+            if not blobs:
+                break
+
+            file_paths = []
+            for blob_id, file_path in [(blob.id, blob.file_path) for blob in blobs]:
+                last_id = blob_id
+                # 删除记录时再次确认没有新的引用
+                deleted = StorageBlob.query.filter(
+                    StorageBlob.id == blob_id,
+                    StorageBlob.ref_count <= 0
+                ).delete(synchronize_session=False)
+                if deleted:
+                    file_paths.append(file_path)
+            if file_paths:
+                StoredImage.query.filter(StoredImage.file_path.in_(file_paths)).delete(synchronize_session=False)
+            db.session.commit()
+
+            # 整批删除文件及其衍生图（S3每个请求最多1000个键）
+            removed += len(storage_service.delete_files(file_paths))
+            derived = [path for file_path in file_paths
+                       for path in UploadGC.derived_paths(file_path, is_avatar=True)]
+            if derived:
+                storage_service.delete_files(derived)
+
+        return removed
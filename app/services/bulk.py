@@ -0,0 +1,59 @@
+"""
+分批的集合式批量更新/删除
+每批先按主键取出至多batch_size个ID，再对这些ID执行一条UPDATE/DELETE并提交，
+避免把整张表的行加载到内存，也避免单个事务过大长时间锁表
+"""
+
+from app import db
+
+
+def _next_ids(model, criteria, batch_size):
+    return [row_id for (row_id,) in db.session.query(model.id).filter(*criteria).order_by(model.id).limit(batch_size)]
+
+
+def batched_update(model, criteria, values, batch_size=1000, on_batch=None):
+    """
+    分批更新满足条件的行
+    更新后的行必须不再满足criteria（例如 is_read == False -> True），否则会重复处理
+    :param model: 模型类
+    :param criteria: 过滤条件列表
+    :param values: 更新的列和值 {Model.column: value}
+    :param batch_size: 每批行数
+    :param on_batch: 每批提交前调用 on_batch(ids)
+    :return: 更新的总行数
+    """
+    total = 0
+    while True:
+        ids = _next_ids(model, criteria, batch_size)
+        if not ids:
+            break
+        if on_batch:
+            on_batch(ids)
+        total += db.session.query(model).filter(model.id.in_(ids), *criteria).update(values, synchronize_session=False)
+        db.session.commit()
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+def batched_delete(model, criteria, batch_size=1000, on_batch=None):
+    """
+    分批删除满足条件的行
+    :param model: 模型类
+    :param criteria: 过滤条件列表
+    :param batch_size: 每批行数
+    :param on_batch: 每批删除前调用 on_batch(ids)
+    :return: 删除的总行数
+    """
+    total = 0
+    while True:
+        ids = _next_ids(model, criteria, batch_size)
+        if not ids:
+            break
+        if on_batch:
+            on_batch(ids)
+        total += db.session.query(model).filter(model.id.in_(ids), *criteria).delete(synchronize_session=False)
+        db.session.commit()
+        if len(ids) < batch_size:
+            break
+    return total
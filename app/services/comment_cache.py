@@ -0,0 +1,130 @@
+"""
+评论线程缓存
+按 (目标, 分页参数) 缓存序列化后的评论线程；每个目标有一个版本号，
+目标下的评论新增/编辑/删除时版本号加一，旧版本的缓存自然失效（随TTL过期）
+"""
+
+from datetime import datetime, timedelta
+import json
+import threading
+
+
+class CommentThreadCache:
+    """
+    评论线程缓存
+    - redis: 多进程/多节点共享（默认），Redis不可用时不缓存
+    - memory: 进程内缓存，只适用于单进程部署或测试
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 300
+        self.max_entries = 10000
+        self.prefix = 'wiki:comments:'
+        self._redis = None
+        self._memory = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """初始化缓存"""
+        self.backend = app.config.get('COMMENT_CACHE_BACKEND', 'redis')
+        self.ttl = app.config.get('COMMENT_CACHE_TTL', 300)
+        self._memory = {}
+        self._versions = {}
+
+        if self.backend == 'redis':
+            try:
+                import redis
+                self._redis = redis.from_url(
+                    app.config.get('COMMENT_CACHE_REDIS_URL')
+                    or app.config.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379/0'),
+                    socket_timeout=1
+                )
+            except Exception as e:
+                app.logger.warning(f'Comment cache: Redis unavailable, caching disabled ({e})')
+                self._redis = None
+
+    @staticmethod
+    def _target(target_type, target_id):
+        return f'{getattr(target_type, "value", target_type)}:{target_id}'
+
+    def _version(self, target):
+        if self.backend == 'memory':
+            with self._lock:
+                return self._versions.get(target, 0)
+        return int(self._redis.get(f'{self.prefix}ver:{target}') or 0)
+
+    def get(self, target_type, target_id, params):
+        """
+        读取缓存的线程数据
+        :param target_type: 目标类型
+        :param target_id: 目标ID
+        :param params: 分页参数元组（游标/页码、每页数量等）
+        :return: 缓存的数据，未命中时返回None
+        """
+        if self.backend != 'memory' and self._redis is None:
+            return None
+
+        target = self._target(target_type, target_id)
+        try:
+            key = f'{self.prefix}{target}:{self._version(target)}:{json.dumps(params)}'
+            if self.backend == 'memory':
+                with self._lock:
+                    cached = self._memory.get(key)
+                    if cached and cached[1] > datetime.utcnow():
+                        return cached[0]
+                return None
+
+            cached = self._redis.get(key)
+            return json.loads(cached) if cached is not None else None
+        except Exception as e:
+            print(f"Error reading comment cache: {e}")
+            return None
+
+    def set(self, target_type, target_id, params, payload):
+        """写入线程数据缓存"""
+        if self.backend != 'memory' and self._redis is None:
+            return
+
+        target = self._target(target_type, target_id)
+        try:
+            key = f'{self.prefix}{target}:{self._version(target)}:{json.dumps(params)}'
+            if self.backend == 'memory':
+                with self._lock:
+                    if len(self._memory) >= self.max_entries:
+                        self._memory.clear()
+                    self._memory[key] = (payload, datetime.utcnow() + timedelta(seconds=self.ttl))
+                return
+
+            self._redis.set(key, json.dumps(payload), ex=self.ttl)
+        except Exception as e:
+            print(f"Error writing comment cache: {e}")
+
+    def invalidate(self, target_type, target_id):
+        """目标下的评论有变化时调用，使该目标的所有缓存页失效"""
+        target = self._target(target_type, target_id)
+        if self.backend == 'memory':
+            with self._lock:
+                self._versions[target] = self._versions.get(target, 0) + 1
+                stale = f'{self.prefix}{target}:'
+                for key in [key for key in self._memory if key.startswith(stale)]:
+                    del self._memory[key]
+            return
+
+        if self._redis is not None:
+            try:
+                # 版本号不能过期：过期后回到0会让旧版本号的缓存页重新生效；
+                # INCR保留已有的TTL，PERSIST去掉旧版本设置的过期时间
+                version_key = f'{self.prefix}ver:{target}'
+                pipe = self._redis.pipeline(transaction=False)
+                pipe.incr(version_key)
+                pipe.persist(version_key)
+                pipe.execute()
+            except Exception as e:
+                print(f"Error invalidating comment cache: {e}")
+
+
+comment_cache = CommentThreadCache()
@@ -3,6 +3,9 @@ from app import db
 from app.models import Comment, CommentMention, CommentTargetType, User
 from app.models.user import User
 from app.models.wiki import Page, Attachment
+from app.pagination import page_query, page_result, paginate
+from app.services.avatar_service import AvatarService
+from app.services.comment_cache import comment_cache
 from datetime import datetime
 import re
 
@@ -49,16 +52,18 @@ class CommentService:
             )
 
             db.session.add(comment)
-            db.session.commit()
-
-            # 在保存后创建提及记录
-            comment.create_mentions_after_save(content)
+            db.session.flush()
 
-            # 处理@提及通知
-            CommentService.process_mention_notifications(comment)
-
-            # 触发评论事件
+            # 提及记录、提及通知事件和评论事件与评论在同一事务中写入，
+            # 站内通知和邮件由 `flask watch worker` 异步投递
+            mentions = comment.sync_mentions(content)
+            if mentions:
+                CommentService.process_mention_notifications(comment)
             CommentService.trigger_comment_event(comment, 'created')
+            CommentService.update_comment_stats(target_type, target_id, 1, comment.created_at)
+            db.session.commit()
+
+            comment_cache.invalidate(comment.target_type, comment.target_id)
 
             return comment
 
@@ -96,21 +101,14 @@ class CommentService:
             comment.is_edited = True
             comment.updated_at = datetime.utcnow()
 
+            # 同步@提及：删除不再提及的记录，只为新提及的用户投递通知
+            mentions = comment.sync_mentions(content)
+            if mentions:
+                CommentService.process_mention_notifications(comment)
+            CommentService.trigger_comment_event(comment, 'updated')
             db.session.commit()
 
-            # 重新处理@提及
-            # 删除旧的提及记录
-            CommentMention.query.filter_by(comment_id=comment_id).delete()
-            db.session.commit()
-
-            # 创建新的提及记录
-            comment.create_mentions_after_save(content)
-
-            # 处理新的提及通知
-            CommentService.process_mention_notifications(comment)
-
-            # 触发评论事件
-            CommentService.trigger_comment_event(comment, 'updated')
+            comment_cache.invalidate(comment.target_type, comment.target_id)
 
             return comment
 
@@ -146,10 +144,12 @@ class CommentService:
             comment.is_deleted = True
             comment.updated_at = datetime.utcnow()
 
-            db.session.commit()
-
             # 触发评论事件
             CommentService.trigger_comment_event(comment, 'deleted')
+            CommentService.update_comment_stats(comment.target_type, comment.target_id, -1)
+            db.session.commit()
+
+            comment_cache.invalidate(comment.target_type, comment.target_id)
 
             return True
 
@@ -159,100 +159,197 @@ class CommentService:
             return False
 
     @staticmethod
-    def get_comments(target_type, target_id, include_replies=True, page=1, per_page=20):
+    def get_comments(target_type, target_id, include_replies=True, page=None, per_page=20,
+                     cursor=None, with_total=False):
         """
         获取目标的所有评论
         :param target_type: 目标类型
         :param target_id: 目标ID
         :param include_replies: 是否包含回复
-        :param page: 页码
+        :param page: 页码（旧的页码分页，为None时使用游标分页）
         :param per_page: 每页数量
+        :param cursor: 游标
+        :param with_total: 游标分页时是否返回总数
         :return: 分页评论列表
         """
+        params = [page, cursor, per_page, include_replies, with_total]
+        cached = comment_cache.get(target_type, target_id, params)
+        if cached is not None:
+            return cached
+
         query = Comment.query.filter_by(
             target_type=target_type,
             target_id=target_id,
             parent_id=None,  # 只获取顶级评论
             is_deleted=False
-        ).order_by(Comment.created_at.desc())
+        ).options(*CommentService._eager_options())
+
+        count_key = f'comments:{target_type.value}:{target_id}'
+        if include_replies:
+            # 当前页的顶级评论和它们的回复用一条查询取出：顶级评论页作为子查询
+            page_ids = page_query(query, Comment, per_page, cursor, page).with_entities(Comment.id).subquery()
+            rows = Comment.query.filter(db.or_(
+                Comment.id.in_(db.select(page_ids.c.id)),
+                db.and_(Comment.parent_id.in_(db.select(page_ids.c.id)), Comment.is_deleted == False)
+            )).options(*CommentService._eager_options()).order_by(Comment.created_at.asc(), Comment.id.asc()).all()
+
+            top_level = [comment for comment in rows if comment.parent_id is None]
+            top_level.reverse()  # 与page_query的顺序一致（最新的在前）
+            replies = [comment for comment in rows if comment.parent_id is not None]
+            items, meta = page_result(top_level, query, Comment, per_page, page, with_total, count_key)
+        else:
+            items, meta = paginate(
+                query, Comment, per_page=per_page, cursor=cursor, page=page, with_total=with_total,
+                count_key=count_key
+            )
+            replies = None
+
+        result = {'comments': CommentService.build_threads(items, replies), **meta}
+        comment_cache.set(target_type, target_id, params, result)
+        return result
+
+    @staticmethod
+    def _eager_options():
+        """预加载作者和@提及（含被提及用户），序列化时不再逐条查询"""
+        from sqlalchemy.orm import selectinload
 
-        pagination = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
+        return (
+            selectinload(Comment.author),
+            selectinload(Comment.mention_list).selectinload(CommentMention.mentioned_user),
         )
 
-        comments = []
-        for comment in pagination.items:
-            comment_dict = comment.to_dict()
-            if include_replies:
-                # 获取回复
-                replies = Comment.query.filter_by(
-                    parent_id=comment.id,
-                    is_deleted=False
-                ).order_by(Comment.created_at.asc()).all()
-                comment_dict['replies'] = [reply.to_dict() for reply in replies]
-            comments.append(comment_dict)
+    @staticmethod
+    def build_threads(top_level, replies=None):
+        """
+        序列化一页顶级评论，回复在内存中挂到各自的父评论下
+        :param top_level: 顶级评论列表
+        :param replies: 这些评论的回复（按时间正序），为None时不包含回复
+        :return: 评论字典列表
+        """
+        if not top_level:
+            return []
 
-        return {
-            'comments': comments,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'current_page': page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
+        if replies is not None:
+            # 多取的一条顶级评论（用于判断是否有下一页）的回复不在当前页
+            page_ids = {comment.id for comment in top_level}
+            replies = [reply for reply in replies if reply.parent_id in page_ids]
+
+        # 整页（含回复）的作者头像一次取出
+        avatars = AvatarService.resolve([comment.author for comment in list(top_level) + (replies or [])], size=40)
+
+        comments = [comment.to_dict(avatars=avatars) for comment in top_level]
+        if replies is None:
+            return comments
+
+        by_parent = {comment['id']: [] for comment in comments}
+        for reply in replies:
+            by_parent[reply.parent_id].append(reply.to_dict(avatars=avatars))
+        for comment in comments:
+            comment['replies'] = by_parent[comment['id']]
+        return comments
 
     @staticmethod
-    def get_user_comments(user_id, page=1, per_page=20):
+    def get_user_comments(user_id, page=None, per_page=20, cursor=None, with_total=False):
         """
         获取用户的所有评论
         :param user_id: 用户ID
-        :param page: 页码
+        :param page: 页码（旧的页码分页，为None时使用游标分页）
         :param per_page: 每页数量
+        :param cursor: 游标
+        :param with_total: 游标分页时是否返回总数
         :return: 分页评论列表
         """
-        try:
-            query = Comment.query.filter_by(
-                author_id=user_id,
-                is_deleted=False
-            ).order_by(Comment.created_at.desc())
-
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
-            )
+        query = Comment.query.filter_by(
+            author_id=user_id,
+            is_deleted=False
+        ).options(*CommentService._eager_options())
 
-            # 安全地转换评论为字典
-            comments = []
-            for comment in pagination.items:
-                try:
-                    comments.append(comment.to_dict())
-                except Exception as e:
-                    # 如果单个评论转换失败，记录错误并跳过
-                    print(f"Error converting comment {comment.id} to dict: {e}")
-                    continue
-
-            return {
-                'comments': comments,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'current_page': page,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+        items, meta = paginate(
+            query, Comment, per_page=per_page, cursor=cursor, page=page, with_total=with_total,
+            count_key=f'user_comments:{user_id}'
+        )
 
-        except Exception as e:
-            print(f"Error getting user comments: {e}")
-            return {
-                'comments': [],
-                'total': 0,
-                'pages': 0,
-                'current_page': page,
-                'has_next': False,
-                'has_prev': False
+        # 安全地转换评论为字典
+        avatars = AvatarService.resolve([comment.author for comment in items], size=40)
+        comments = []
+        for comment in items:
+            try:
+                comments.append(comment.to_dict(avatars=avatars))
+            except Exception as e:
+                # 如果单个评论转换失败，记录错误并跳过
+                print(f"Error converting comment {comment.id} to dict: {e}")
+                continue
+
+        return {'comments': comments, **meta}
+
+    @staticmethod
+    def _stats_model(target_type):
+        return Page if target_type == CommentTargetType.PAGE else Attachment
+
+    @staticmethod
+    def _last_comment_subquery(target_type, model):
+        return db.select(db.func.max(Comment.created_at)).where(
+            Comment.target_type == target_type,
+            Comment.target_id == model.id,
+            Comment.is_deleted == False
+        ).scalar_subquery()
+
+    @staticmethod
+    def update_comment_stats(target_type, target_id, delta, commented_at=None):
+        """
+        增减目标的评论数并更新最后评论时间（随当前会话一起提交）
+        使用原子的 comment_count = comment_count + delta，并发评论不会丢失计数
+        :param target_type: 目标类型
+        :param target_id: 目标ID
+        :param delta: 评论数增量
+        :param commented_at: 新评论的时间；删除评论时为None，按剩余评论重新计算
+        """
+        model = CommentService._stats_model(target_type)
+        values = {
+            model.comment_count: db.case((model.comment_count + delta < 0, 0), else_=model.comment_count + delta),
+            model.last_comment_at: commented_at if commented_at is not None
+            else CommentService._last_comment_subquery(target_type, model),
+        }
+        if model is Page:
+            # 评论不算页面修改，保持updated_at不变
+            values[Page.updated_at] = Page.updated_at
+        db.session.query(model).filter(model.id == target_id).update(values, synchronize_session=False)
+
+    @staticmethod
+    def repair_comment_stats(batch_size=1000):
+        """
+        按评论表重新计算所有页面和附件的评论数和最后评论时间
+        每批按ID范围执行一条带关联子查询的UPDATE
+        :param batch_size: 每批行数
+        :return: 更新的行数
+        """
+        total = 0
+        for target_type in (CommentTargetType.PAGE, CommentTargetType.ATTACHMENT):
+            model = CommentService._stats_model(target_type)
+            values = {
+                model.comment_count: db.select(db.func.count(Comment.id)).where(
+                    Comment.target_type == target_type,
+                    Comment.target_id == model.id,
+                    Comment.is_deleted == False
+                ).scalar_subquery(),
+                model.last_comment_at: CommentService._last_comment_subquery(target_type, model),
             }
+            if model is Page:
+                values[Page.updated_at] = Page.updated_at
+
+            last_id = 0
+            while True:
+                ids = [row_id for (row_id,) in db.session.query(model.id).filter(
+                    model.id > last_id
+                ).order_by(model.id).limit(batch_size)]
+                if not ids:
+                    break
+                total += db.session.query(model).filter(
+                    model.id.between(ids[0], ids[-1])
+                ).update(values, synchronize_session=False)
+                db.session.commit()
+                last_id = ids[-1]
+        return total
 
     @staticmethod
     def get_target(target_type, target_id):
@@ -265,184 +362,128 @@ class CommentService:
 
     @staticmethod
     def process_mention_notifications(comment):
-        """处理@提及通知"""
-        mentions = comment.mentions.all()
-        print(f"Processing {len(mentions)} mentions for comment {comment.id}")
-
-        for mention in mentions:
-            print(f"Processing mention: user {mention.mentioned_user_id} -> {mention.mentioned_username}")
-
-            # 创建watch通知
-            CommentService.create_mention_notification(comment, mention)
-
-            # 发送邮件通知
-            try:
-                CommentService.send_mention_email(comment, mention)
-                print(f"Email sent successfully to {mention.mentioned_user.username}")
-            except Exception as e:
-                print(f"Error sending email: {e}")
-                import traceback
-                traceback.print_exc()
-
-    @staticmethod
-    def create_mention_notification(comment, mention):
-        """创建@提及的站内通知"""
-        try:
-            from app.models import WatchNotification, WatchEventType, WatchTargetType
-            from app.services.watch_service import WatchService
-
-            # 转换CommentTargetType到WatchTargetType
-            target_type = None
-            if comment.target_type.value == 'page':
-                target_type = WatchTargetType.PAGE
-            elif comment.target_type.value == 'attachment':
-                target_type = WatchTargetType.PAGE  # 附件通知也归类为页面
-
-            # 创建watch通知
-            notification = WatchNotification(
-                user_id=mention.mentioned_user_id,
-                event_type=WatchEventType.COMMENT_MENTION,
-                target_type=target_type,
-                target_id=comment.id,
-                actor_id=comment.author_id
-            )
-
-            # 生成标题和消息
-            notification.generate_title_and_message()
-
-            db.session.add(notification)
-            db.session.commit()
-
-            # 发送邮件通知
-            WatchService.create_notification(
-                watch=None,  # 没有关联的watch记录
-                event_type=WatchEventType.COMMENT_MENTION,
-                target_type=target_type,
-                target_id=comment.id,
-                actor_id=comment.author_id
-            )
-
-        except Exception as e:
-            print(f"Error creating mention notification: {e}")
+        """
+        将@提及通知事件加入watch事件发件箱（随当前会话一起提交）
+        worker投递时为尚未通知过的被提及用户创建站内通知并写入邮件发件箱
+        """
+        from app.models import WatchEventType, WatchTargetType
+        from app.services.watch_service import enqueue_watch_event
+
+        # 提及通知的target_id是评论ID
+        return enqueue_watch_event(
+            event_type=WatchEventType.COMMENT_MENTION,
+            target_type=WatchTargetType.PAGE,
+            target_id=comment.id,
+            actor_id=comment.author_id
+        )
 
     @staticmethod
-    def send_mention_email(comment, mention):
-        """发送@提及的邮件通知"""
-        try:
-            from flask import current_app
-            from flask_mail import Message
-            from app import mail
-
-            user = mention.mentioned_user
-            if not user or not user.email:
-                return
+    def build_mention_email(comment, mention, target=None):
+        """
+        构建@提及邮件的发件箱行数据，发送成功后由worker回写 notification_sent
+        :param comment: 评论
+        :param mention: CommentMention
+        :param target: 评论所在的目标对象（批量构建时由调用方传入，避免重复查询）
+        :return: 发件箱行数据
+        """
+        from flask import current_app
+        from app.services.mail_service import MailService
 
-            # 获取目标信息
+        user = mention.mentioned_user
+        if target is None:
             target = CommentService.get_target(comment.target_type, comment.target_id)
-            target_name = target.title if hasattr(target, 'title') else f'{comment.target_type.value}:{comment.target_id}'
-
-            # 构建URL
-            site_url = current_app.config.get('SITE_URL', 'http://localhost:5001')
-            if comment.target_type == CommentTargetType.PAGE:
-                comment_url = f"{site_url}/page/{target.slug}"
-            else:
-                comment_url = f"{site_url}/"
-
-            # 发送邮件
-            email_html = f'''
-            <h2>Enterprise Wiki - You were mentioned</h2>
-            <p>Hi {user.name or user.username},</p>
-            <p><strong>{comment.author.name or comment.author.username}</strong> mentioned you in a comment on <strong>{target_name}</strong>.</p>
-
-            <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                <p style="margin: 0;"><em>{comment.content}</em></p>
-                <small style="color: #6c757d;">Posted on {comment.created_at.strftime('%Y-%m-%d %H:%M')}</small>
-            </div>
-
-            <p style="margin-top: 20px;">
-                <a href="{comment_url}" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px; display: inline-block;">
-                    View Comment
-                </a>
-            </p>
-
-            <p style="color: #6c757d; font-size: 14px;">
-                This email was sent because you were mentioned in a comment on Enterprise Wiki.
-            </p>
-            '''
-
-            email_text = f'''
-            Enterprise Wiki - You were mentioned
-
-            Hi {user.name or user.username},
+        target_name = target.title if hasattr(target, 'title') else f'{comment.target_type.value}:{comment.target_id}'
+
+        # 构建URL
+        site_url = current_app.config.get('SITE_URL', 'http://localhost:5001')
+        if comment.target_type == CommentTargetType.PAGE and target:
+            comment_url = f"{site_url}/page/{target.slug}"
+        else:
+            comment_url = f"{site_url}/"
+
+        # 邮件内容
+        email_html = f'''
+        <h2>Enterprise Wiki - You were mentioned</h2>
+        <p>Hi {user.name or user.username},</p>
+        <p><strong>{comment.author.name or comment.author.username}</strong> mentioned you in a comment on <strong>{target_name}</strong>.</p>
+
+        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
+            <p style="margin: 0;"><em>{comment.content}</em></p>
+            <small style="color: #6c757d;">Posted on {comment.created_at.strftime('%Y-%m-%d %H:%M')}</small>
+        </div>
+
+        <p style="margin-top: 20px;">
+            <a href="{comment_url}" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px; display: inline-block;">
+                View Comment
+            </a>
+        </p>
+
+        <p style="color: #6c757d; font-size: 14px;">
+            This email was sent because you were mentioned in a comment on Enterprise Wiki.
+        </p>
+        '''
 
-            {comment.author.name or comment.author.username} mentioned you in a comment on {target_name}.
+        email_text = f'''
+        Enterprise Wiki - You were mentioned
 
-            "{comment.content}"
+        Hi {user.name or user.username},
 
-            View the comment here: {comment_url}
+        {comment.author.name or comment.author.username} mentioned you in a comment on {target_name}.
 
-            This email was sent because you were mentioned in a comment on Enterprise Wiki.
-            '''
-
-            msg = Message(
-                subject=f'Enterprise Wiki: You were mentioned by {comment.author.name or comment.author.username}',
-                sender=current_app.config.get('MAIL_SENDER', 'noreply@enterprise-wiki.com'),
-                recipients=[user.email],
-                html=email_html,
-                body=email_text
-            )
+        "{comment.content}"
 
-            mail.send(msg)
+        View the comment here: {comment_url}
 
-            # 标记通知已发送
-            mention.notification_sent = True
-            db.session.commit()
+        This email was sent because you were mentioned in a comment on Enterprise Wiki.
+        '''
 
-        except Exception as e:
-            print(f"Error sending mention email: {e}")
+        return MailService.build_row(
+            recipient=user.email,
+            subject=f'Enterprise Wiki: You were mentioned by {comment.author.name or comment.author.username}',
+            html=email_html,
+            body=email_text,
+            source_type='comment_mention',
+            source_id=mention.id
+        )
 
     @staticmethod
     def trigger_comment_event(comment, action):
-        """触发评论事件"""
+        """触发评论事件（写入watch事件发件箱，随当前会话一起提交）"""
         try:
             from app.models import WatchEventType, WatchTargetType
-            from app.services.watch_service import WatchService
+            from app.services.watch_service import enqueue_watch_event
 
             if action == 'created':
-                # 触发新评论事件，通知关注目标页面的用户
-                WatchService.trigger_event(
-                    event_type=WatchEventType.COMMENT_ADDED,
-                    target_type=comment.target_type,
-                    target_id=comment.target_id,
-                    actor_id=comment.author_id
-                )
+                # 评论的watch目标是所在页面（附件评论归属附件所在页面）
+                page_id = comment.target_id
+                if comment.target_type == CommentTargetType.ATTACHMENT:
+                    attachment = Attachment.query.get(comment.target_id)
+                    page_id = attachment.page_id if attachment else None
+
+                if page_id:
+                    # 新评论事件写入发件箱，由watch worker通知关注目标页面的用户
+                    enqueue_watch_event(
+                        event_type=WatchEventType.COMMENT_ADDED,
+                        target_type=WatchTargetType.PAGE,
+                        target_id=page_id,
+                        actor_id=comment.author_id
+                    )
 
         except Exception as e:
             print(f"Error triggering comment event: {e}")
 
     @staticmethod
     def search_users(query, limit=10):
-        """搜索用户（用于@提及功能）"""
+        """
+        搜索用户（用于@提及功能）
+        按用户名、姓名、邮箱前缀或中文姓名拼音的前缀匹配，结果按最近活跃时间排序
+        :param query: 查询前缀，为空时返回最近活跃的用户
+        :param limit: 最多返回数量
+        :return: 用户字典列表
+        """
         try:
-            users = User.query.filter(
-                User.is_active == True,
-                db.or_(
-                    User.username.ilike(f'%{query}%'),
-                    User.name.ilike(f'%{query}%'),
-                    User.email.ilike(f'%{query}%')
-                )
-            ).limit(limit).all()
-
-            return [
-                {
-                    'id': user.id,
-                    'username': user.username,
-                    'name': user.name,
-                    'email': user.email,
-                    'avatar': user.avatar or '/static/img/default-avatar.png'
-                }
-                for user in users
-            ]
+            from app.services.user_directory import user_directory
+            return user_directory.search(query, limit)
         except Exception as e:
             print(f"Error searching users: {e}")
             return []
@@ -468,36 +509,56 @@ class CommentService:
             return False
 
     @staticmethod
-    def get_user_mentions(user_id, unread_only=False, page=1, per_page=20):
-        """获取用户的@提及"""
+    def mark_all_mentions_as_read(user_id, batch_size=1000):
+        """
+        标记用户所有提及为已读（分批集合式UPDATE，不加载提及行）
+        :param user_id: 用户ID
+        :param batch_size: 每批行数
+        :return: 标记为已读的数量
+        """
+        from app.services.bulk import batched_update
+
+        return batched_update(
+            CommentMention,
+            [CommentMention.mentioned_user_id == user_id, CommentMention.is_read == False],
+            {CommentMention.is_read: True, CommentMention.read_at: datetime.utcnow()},
+            batch_size=batch_size
+        )
+
+    @staticmethod
+    def get_user_mentions(user_id, unread_only=False, page=None, per_page=20, cursor=None, with_total=False):
+        """
+        获取用户的@提及
+        :param user_id: 用户ID
+        :param unread_only: 是否只获取未读提及
+        :param page: 页码（旧的页码分页，为None时使用游标分页）
+        :param per_page: 每页数量
+        :param cursor: 游标
+        :param with_total: 游标分页时是否返回总数
+        :return: 分页提及列表
+        """
         query = CommentMention.query.filter_by(mentioned_user_id=user_id)
 
         if unread_only:
             query = query.filter_by(is_read=False)
 
-        query = query.order_by(CommentMention.created_at.desc())
-
-        pagination = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
+        items, meta = paginate(
+            query, CommentMention, per_page=per_page, cursor=cursor, page=page, with_total=with_total,
+            count_key=f'mentions:{user_id}:{int(unread_only)}'
         )
 
+        avatars = AvatarService.resolve([mention.comment.author for mention in items], size=40)
         return {
             'mentions': [
                 {
                     'id': mention.id,
-                    'comment': mention.comment.to_dict(),
+                    'comment': mention.comment.to_dict(avatars=avatars),
                     'is_read': mention.is_read,
                     'created_at': mention.created_at.isoformat()
                 }
-                for mention in pagination.items if not mention.comment.is_deleted
+                for mention in items if not mention.comment.is_deleted
             ],
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'current_page': page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            **meta
         }
 
 # 便捷函数
@@ -0,0 +1,156 @@
+"""
+浏览器直传S3
+第一步服务器为指定的对象键、类型和大小签发预签名PUT请求和一个签名令牌，
+浏览器直接把文件PUT到S3；第二步浏览器带令牌调用完成接口，服务器HEAD确认对象后再创建记录。
+文件内容不经过应用进程，上传期间不占用工作进程
+"""
+
+from datetime import datetime
+import os
+import uuid
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer as Serializer, BadSignature, SignatureExpired
+from werkzeug.utils import secure_filename
+
+from app.services.storage_service import get_storage_service
+
+
+IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp', 'image/svg+xml']
+
+# 上传类型: 存储文件夹、大小上限（字节，None表示使用MAX_CONTENT_LENGTH）、允许的MIME类型（None表示不限）
+UPLOAD_KINDS = {
+    'attachment': {'folder': 'attachments', 'max_size': None, 'allowed_types': None},
+    'share': {'folder': 'shares', 'max_size': 100 * 1024 * 1024, 'allowed_types': None},
+    'image': {'folder': 'images', 'max_size': 10 * 1024 * 1024, 'allowed_types': IMAGE_TYPES},
+    'avatar': {'folder': 'avatars', 'max_size': 2 * 1024 * 1024,
+               'allowed_types': ['image/jpeg', 'image/jpg', 'image/png', 'image/gif']},
+}
+
+_SALT = 'direct-upload'
+
+
+class DirectUploadError(ValueError):
+    """直传申请或完成校验失败"""
+    pass
+
+
+class DirectUploadService:
+    """浏览器直传服务"""
+
+    @staticmethod
+    def enabled():
+        """只有S3存储支持直传，且可以用DIRECT_UPLOADS关闭"""
+        if not current_app.config.get('DIRECT_UPLOADS', True):
+            return False
+        storage_config = current_app.config.get('STORAGE_CONFIG') or {}
+        return storage_config.get('type', '').lower() == 's3'
+
+    @staticmethod
+    def max_size(kind):
+        max_size = UPLOAD_KINDS[kind]['max_size']
+        return max_size or current_app.config.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024
+
+    @staticmethod
+    def _serializer():
+        return Serializer(current_app.config['SECRET_KEY'])
+
+    @staticmethod
+    def issue(kind, filename, content_type, file_size, user_id, **extra):
+        """
+        签发直传请求
+        :param kind: 上传类型（UPLOAD_KINDS的键）
+        :param filename: 原始文件名
+        :param content_type: MIME类型
+        :param file_size: 文件大小（字节）
+        :param user_id: 申请上传的用户ID，完成时必须是同一用户
+        :param extra: 完成时需要的其他数据（如page_id），随令牌签名
+        :return: {'upload': {'url', 'method', 'headers'}, 'token', 'file_path', 'expires_in'}
+        """
+        if kind not in UPLOAD_KINDS:
+            raise DirectUploadError('不支持的上传类型')
+
+        safe_filename = secure_filename(filename or '')
+        if not safe_filename:
+            raise DirectUploadError('文件名为空')
+
+        content_type = content_type or 'application/octet-stream'
+        allowed_types = UPLOAD_KINDS[kind]['allowed_types']
+        if allowed_types is not None and content_type not in allowed_types:
+            raise DirectUploadError('不支持的文件类型')
+
+        try:
+            file_size = int(file_size)
+        except (TypeError, ValueError):
+            raise DirectUploadError('文件大小无效')
+        max_size = DirectUploadService.max_size(kind)
+        if file_size <= 0 or file_size > max_size:
+            raise DirectUploadError(f'文件大小超过{max_size // (1024 * 1024)}MB限制')
+
+        # 对象键带随机串，令牌不能被用来覆盖其他文件
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        object_key = f"{UPLOAD_KINDS[kind]['folder']}/{timestamp}_{uuid.uuid4().hex[:12]}_{safe_filename}"
+
+        expires_in = current_app.config.get('DIRECT_UPLOAD_EXPIRES', 900)
+        backend = get_storage_service().backend
+        upload = backend.generate_presigned_put(object_key, content_type, file_size, expires_in=expires_in)
+
+        token = DirectUploadService._serializer().dumps({
+            'kind': kind,
+            'key': object_key,
+            'filename': safe_filename,
+            'content_type': content_type,
+            'size': file_size,
+            'user_id': user_id,
+            'extra': extra
+        }, salt=_SALT)
+
+        return {
+            'upload': upload,
+            'token': token,
+            'file_path': object_key,
+            'expires_in': expires_in
+        }
+
+    @staticmethod
+    def finalize(token, kind, user_id):
+        """
+        校验令牌并确认对象已上传
+        大小或类型与申请不符的对象会被删除
+        :param token: issue返回的令牌
+        :param kind: 期望的上传类型
+        :param user_id: 当前用户ID
+        :return: (申请信息dict, upload_file格式的结果)
+        """
+        # 令牌在上传URL过期后再保留一段时间，留给大文件上传完成
+        max_age = current_app.config.get('DIRECT_UPLOAD_EXPIRES', 900) + 3600
+        try:
+            intent = DirectUploadService._serializer().loads(token or '', salt=_SALT, max_age=max_age)
+        except SignatureExpired:
+            raise DirectUploadError('上传已过期，请重新上传')
+        except BadSignature:
+            raise DirectUploadError('上传令牌无效')
+
+        if intent.get('kind') != kind or intent.get('user_id') != user_id:
+            raise DirectUploadError('上传令牌无效')
+
+        storage_service = get_storage_service()
+        head = storage_service.backend.head_file(intent['key'])
+        if head is None:
+            raise DirectUploadError('文件尚未上传完成')
+
+        if head['file_size'] != intent['size'] or (head['content_type'] or '') != intent['content_type']:
+            storage_service.delete_file(intent['key'])
+            raise DirectUploadError('上传的文件与申请不符')
+
+        return intent, {
+            'success': True,
+            'filename': os.path.basename(intent['key']),
+            'original_filename': intent['filename'],
+            'url': storage_service.get_file_url(intent['key']),
+            'file_path': intent['key'],
+            'relative_path': intent['key'],
+            'file_size': head['file_size'],
+            'blob_id': None,
+            'deduplicated': False
+        }
@@ -0,0 +1,314 @@
+"""
+页面导出（ZIP）
+边生成边输出ZIP：页面的HTML和Markdown源文件、附件逐块从存储读取后写入压缩流，
+不使用临时文件，内存占用与导出的总大小无关。
+S3存储的附件由有界线程池预先读取后面的几个文件（每个文件最多缓冲 EXPORT_PREFETCH_CHUNKS 块）
+"""
+
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from html import escape
+import io
+import posixpath
+import queue
+import re
+import threading
+import zipfile
+
+from flask import current_app, has_request_context, request
+
+from app import db
+from app.models.wiki import Attachment, Category, Page
+from app.services.storage_service import S3StorageBackend
+
+# 读取附件的块大小
+EXPORT_CHUNK_SIZE = 512 * 1024
+# 每个预读文件最多缓冲的块数
+EXPORT_PREFETCH_CHUNKS = 4
+# 每次从数据库加载的页面数
+PAGE_BATCH_SIZE = 50
+
+# ZIP中的一个文件：data为内容（bytes），或file_path为存储中的附件
+ExportEntry = namedtuple('ExportEntry', ['name', 'modified', 'data', 'file_path', 'file_size'])
+
+_UNSAFE_NAME = re.compile(r'[\x00-\x1f/\\:*?"<>|]+')
+_ROOT_RELATIVE = re.compile(r'(\s(?:src|href)=")/(?!/)')
+_END = object()
+
+
+def _safe_name(name, default='untitled'):
+    """ZIP内的文件/目录名：保留中文，去掉路径分隔符和Windows不允许的字符"""
+    name = _UNSAFE_NAME.sub('_', name or '').strip(' .')
+    return name[:120] or default
+
+
+def _zip_time(value):
+    """ZIP只支持1980年以后的时间"""
+    value = value or datetime.utcnow()
+    return max(value.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+class _ZipSink(io.RawIOBase):
+    """ZipFile的输出目标：收集写入的字节，由生成器取走（不可seek，ZipFile会使用数据描述符）"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _put(chunks, item, cancelled):
+    """放入队列；导出已取消（客户端断开）时放弃"""
+    while not cancelled.is_set():
+        try:
+            chunks.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _pump(storage_service, file_path, chunks, cancelled):
+    """线程池中执行：逐块读取存储中的文件放入有界队列，出错时放入异常"""
+    try:
+        stream = storage_service.open_file(file_path)
+        try:
+            while not cancelled.is_set():
+                chunk = stream.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if not _put(chunks, chunk, cancelled):
+                    return
+        finally:
+            stream.close()
+        _put(chunks, _END, cancelled)
+    except Exception as e:
+        _put(chunks, e, cancelled)
+
+
+def _drain(chunks):
+    while True:
+        item = chunks.get()
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def _read_chunks(storage_service, file_path):
+    stream = storage_service.open_file(file_path)
+    try:
+        while True:
+            chunk = stream.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        stream.close()
+
+
+class ExportService:
+    """页面导出服务"""
+
+    @staticmethod
+    def category_tree(category, user):
+        """
+        分类及其全部子分类（未登录用户只包含公开分类），每层一条查询
+        :return: [(分类ID, ZIP内的目录)]
+        """
+        include_private = getattr(user, 'is_authenticated', False)
+        tree = [(category.id, _safe_name(category.name))]
+        frontier = dict(tree)
+        while frontier:
+            query = Category.query.filter(Category.parent_id.in_(list(frontier)))
+            if not include_private:
+                query = query.filter(Category.is_public == True)
+            children = query.order_by(Category.sort_order, Category.name).all()
+            frontier = {child.id: f"{frontier[child.parent_id]}/{_safe_name(child.name)}" for child in children}
+            tree.extend(frontier.items())
+        return tree
+
+    @staticmethod
+    def category_entries(category, user):
+        """分类树下当前用户可以查看的已发布页面及其附件"""
+        directories = dict(ExportService.category_tree(category, user))
+        used_bases = set()
+        last_id = 0
+        while True:
+            pages = Page.query.filter(
+                Page.category_id.in_(list(directories)),
+                Page.is_published == True,
+                Page.id > last_id
+            ).order_by(Page.id).limit(PAGE_BATCH_SIZE).all()
+            if not pages:
+                return
+            last_id = pages[-1].id
+            visible = [page for page in pages if page.can_view(user)]
+            yield from ExportService._page_batch_entries(
+                visible, user, lambda page: directories[page.category_id], used_bases)
+
+    @staticmethod
+    def page_entries(page, user):
+        """单个页面及其附件"""
+        return ExportService._page_batch_entries([page], user, lambda page: '', set())
+
+    @staticmethod
+    def _page_batch_entries(pages, user, directory_of, used_bases):
+        if not pages:
+            return
+        attachments = {}
+        for attachment in Attachment.query.filter(
+                Attachment.page_id.in_([page.id for page in pages])).order_by(Attachment.id):
+            attachments.setdefault(attachment.page_id, []).append(attachment)
+
+        for page in pages:
+            base = posixpath.join(directory_of(page), _safe_name(page.title or page.slug))
+            if base in used_bases:
+                base = f"{base} ({page.id})"  # 同一分类下标题相同的页面
+            used_bases.add(base)
+            yield ExportEntry(f"{base}.html", page.updated_at, ExportService.render_html(page), None, None)
+            yield ExportEntry(f"{base}.md", page.updated_at, (page.content or '').encode('utf-8'), None, None)
+            for attachment in attachments.get(page.id, []):
+                if not attachment.file_path or not attachment.can_view(user):
+                    continue
+                name = _safe_name(attachment.original_filename or attachment.filename, f'attachment_{attachment.id}')
+                yield ExportEntry(f"{base}_attachments/{name}", attachment.uploaded_at, None,
+                                  attachment.file_path, attachment.file_size)
+
+        # 已导出的记录移出会话，导出大量页面时会话不会持续增长
+        for record in pages + [attachment for batch in attachments.values() for attachment in batch]:
+            if record in db.session:
+                db.session.expunge(record)
+
+    @staticmethod
+    def render_html(page):
+        """独立的HTML文件，站内链接和图片改为绝对地址"""
+        url_root = current_app.config.get('EXPORT_URL_ROOT') or (request.url_root if has_request_context() else '')
+        url_root = url_root.rstrip('/')
+        body = page.content_html or ''
+        if url_root:
+            body = _ROOT_RELATIVE.sub(lambda match: f'{match.group(1)}{url_root}/', body)
+        title = escape(page.title or '')
+        return (
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            f'<title>{title}</title>\n</head>\n<body>\n<h1>{title}</h1>\n{body}\n</body>\n</html>\n'
+        ).encode('utf-8')
+
+    @staticmethod
+    def stream_zip(entries, storage_service, workers=None):
+        """
+        生成ZIP的字节流
+        :param entries: ExportEntry的可迭代对象（可以是惰性的生成器）
+        :param storage_service: 读取附件的存储服务
+        :param workers: S3附件预读线程数，默认 EXPORT_S3_WORKERS；本地存储直接顺序读取
+        :return: bytes生成器
+        """
+        if workers is None:
+            workers = current_app.config.get('EXPORT_S3_WORKERS', 4)
+        if not isinstance(storage_service.backend, S3StorageBackend):
+            workers = 0
+
+        cancelled = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export') if workers else None
+        entries = iter(entries)
+        pending = deque()  # (entry, 预读队列或None)
+        in_flight = 0
+        used_names = set()
+        sink = _ZipSink()
+
+        def fill():
+            nonlocal in_flight
+            # 最多预读workers个文件，同时限制缓冲的条目数
+            while in_flight < max(workers, 1) and len(pending) < max(workers, 1) * 4:
+                entry = next(entries, None)
+                if entry is None:
+                    return
+                chunks = None
+                if entry.file_path and pool:
+                    chunks = queue.Queue(maxsize=EXPORT_PREFETCH_CHUNKS)
+                    pool.submit(_pump, storage_service, entry.file_path, chunks, cancelled)
+                    in_flight += 1
+                pending.append((entry, chunks))
+
+        try:
+            with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+                fill()
+                while pending:
+                    entry, chunks = pending.popleft()
+                    name = ExportService._unique_name(entry.name, used_names)
+                    info = zipfile.ZipInfo(name, _zip_time(entry.modified))
+                    info.compress_type = zipfile.ZIP_DEFLATED
+
+                    if entry.file_path is None:
+                        archive.writestr(info, entry.data)
+                    else:
+                        if chunks is not None:
+                            in_flight -= 1
+                        yield from ExportService._write_file(archive, info, entry, storage_service, chunks, sink,
+                                                             used_names)
+
+                    data = sink.take()
+                    if data:
+                        yield data
+                    fill()
+            yield sink.take()
+        finally:
+            cancelled.set()
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _write_file(archive, info, entry, storage_service, chunks, sink, used_names):
+        """
+        逐块写入一个附件并输出压缩后的数据
+        无法读取的附件不写入，改为写入 <文件名>.error.txt 说明；
+        已输出部分内容后读取失败时中止整个导出（ZIP不完整，下载失败），不生成内容被截断却看似完整的文件
+        """
+        source = _drain(chunks) if chunks is not None else _read_chunks(storage_service, entry.file_path)
+        try:
+            first = next(source, b'')
+        except Exception as e:
+            current_app.logger.warning(f'Export: skipped unreadable attachment {entry.file_path}: {e}')
+            error_info = zipfile.ZipInfo(ExportService._unique_name(f'{info.filename}.error.txt', used_names),
+                                         info.date_time)
+            error_info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(error_info, f'无法读取附件 {posixpath.basename(info.filename)}，未包含在导出中\n'.encode('utf-8'))
+            return
+
+        large = (entry.file_size or 0) > zipfile.ZIP64_LIMIT // 2
+        try:
+            with archive.open(info, 'w', force_zip64=large) as target:
+                target.write(first)
+                for chunk in source:
+                    target.write(chunk)
+                    data = sink.take()
+                    if data:
+                        yield data
+        except Exception as e:
+            current_app.logger.error(f'Export aborted: attachment {entry.file_path} failed after partial read: {e}')
+            raise
+
+    @staticmethod
+    def _unique_name(name, used_names):
+        """同名文件加序号"""
+        candidate = name
+        stem, extension = posixpath.splitext(name)
+        counter = 2
+        while candidate in used_names:
+            candidate = f"{stem} ({counter}){extension}"
+            counter += 1
+        used_names.add(candidate)
+        return candidate
@@ -0,0 +1,279 @@
+"""
+图片衍生图（缩略图/响应式尺寸）
+按固定的宽度档位把上传的图片缩放为WebP（Pillow不支持WebP时为JPEG），
+存到同一个存储后端的 variants/ 目录下，路径由原图路径和宽度决定；
+上传图片时预先生成，未生成的在第一次请求时生成。
+原图尺寸和已生成的档位记录在 stored_images 表（上传或第一次生成衍生图时写入）。
+页面渲染时为本站存储的图片输出 srcset 和 loading="lazy"，浏览器按显示宽度选择档位；
+渲染只查询 stored_images，不读取图片文件，没有尺寸记录的图片不输出srcset
+"""
+
+from io import BytesIO
+import os
+import re
+import threading
+from urllib.parse import quote
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # 未安装Pillow时不生成衍生图，页面仍使用原图
+    Image = None
+
+from app import db
+from app.models.storage import StoredImage
+from app.services.storage_service import get_storage_service
+
+
+# 可以缩放的格式；GIF可能是动图，SVG是矢量图，都直接使用原图
+RESIZABLE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp'}
+
+DEFAULT_WIDTHS = (320, 640, 1024, 1600)
+
+_IMG_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_SRC_ATTR = re.compile(r'\bsrc="([^"]+)"', re.IGNORECASE)
+
+# 本进程已确认存在的衍生图路径（避免每次请求都查询存储）
+_known_variants = set()
+_known_lock = threading.Lock()
+
+
+class ImageDerivativeService:
+    """图片衍生图服务"""
+
+    @staticmethod
+    def widths():
+        return tuple(current_app.config.get('IMAGE_VARIANT_WIDTHS') or DEFAULT_WIDTHS)
+
+    @staticmethod
+    def variant_format():
+        """优先WebP，Pillow编译时未带WebP支持则用JPEG"""
+        return 'webp' if features.check('webp') else 'jpeg'
+
+    @staticmethod
+    def is_resizable(file_path):
+        """能否生成衍生图"""
+        if Image is None or not file_path:
+            return False
+        return os.path.splitext(file_path)[1].lower() in RESIZABLE_EXTENSIONS
+
+    @staticmethod
+    def is_safe_path(file_path):
+        """只允许存储内的相对路径"""
+        return bool(file_path) and not file_path.startswith('/') and '..' not in file_path.split('/')
+
+    @staticmethod
+    def variant_path(file_path, width):
+        """
+        衍生图的存储路径
+        :param file_path: 原图相对路径，如 images/20250101_a.png
+        :param width: 宽度档位
+        :return: 如 variants/images/20250101_a/640w.webp
+        """
+        stem = os.path.splitext(file_path)[0]
+        extension = 'webp' if ImageDerivativeService.variant_format() == 'webp' else 'jpg'
+        return f"variants/{stem}/{width}w.{extension}"
+
+    @staticmethod
+    def generate(file_path, widths=None, storage_service=None):
+        """
+        生成衍生图（已存在的档位跳过，宽度不小于原图的档位不生成），并记录原图尺寸和已生成的档位
+        :param file_path: 原图相对路径
+        :param widths: 宽度档位，默认全部档位
+        :param storage_service: 存储服务，默认应用的存储服务
+        :return: {宽度: 衍生图路径}，只包含实际存在的档位
+        """
+        if not ImageDerivativeService.is_resizable(file_path):
+            return {}
+
+        storage_service = storage_service or get_storage_service()
+        widths = widths or ImageDerivativeService.widths()
+        variant_format = ImageDerivativeService.variant_format()
+        content_type = f'image/{variant_format}'
+
+        info = StoredImage.query.filter_by(file_path=file_path).first()
+        if info is not None:
+            recorded = info.generated_widths
+            widths = [width for width in widths if width < info.width]
+        else:
+            recorded = set()
+
+        pending = {}
+        for width in widths:
+            path = ImageDerivativeService.variant_path(file_path, width)
+            if width in recorded or path in _known_variants or storage_service.file_exists(path):
+                ImageDerivativeService._remember(path)
+            else:
+                pending[width] = path
+        result = {width: ImageDerivativeService.variant_path(file_path, width)
+                  for width in widths if width not in pending}
+        if not pending and info is not None:
+            if not set(result) <= recorded:
+                ImageDerivativeService._record(file_path, info.width, info.height, result)
+            return result
+
+        stream = storage_service.open_file(file_path)
+        try:
+            with Image.open(stream) as image:
+                original_width, original_height = ImageDerivativeService._oriented_size(image)
+                if not pending:
+                    # 衍生图都已存在（如本功能之前生成的），只补记尺寸，不解码图片
+                    ImageDerivativeService._record(file_path, original_width, original_height, result)
+                    return result
+
+                image = ImageOps.exif_transpose(image)  # 手机照片按EXIF方向摆正
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+                if variant_format == 'jpeg' and image.mode == 'RGBA':
+                    image = image.convert('RGB')
+
+                for width, path in sorted(pending.items()):
+                    if width >= image.width:
+                        continue
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+
+                    buffer = BytesIO()
+                    if variant_format == 'webp':
+                        resized.save(buffer, format='WEBP', quality=80, method=4)
+                    else:
+                        resized.save(buffer, format='JPEG', quality=82, optimize=True, progressive=True)
+                    buffer.seek(0)
+
+                    saved = storage_service.put_file(buffer, path, content_type)
+                    if saved.get('success'):
+                        ImageDerivativeService._remember(path)
+                        result[width] = path
+                    else:
+                        print(f"Error saving image variant {path}: {saved.get('message')}")
+        finally:
+            stream.close()
+
+        ImageDerivativeService._record(file_path, original_width, original_height, result)
+        return result
+
+    @staticmethod
+    def _oriented_size(image):
+        """按EXIF方向摆正后的尺寸（只读取文件头）"""
+        width, height = image.size
+        if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width  # EXIF标记为旋转90度的照片
+        return width, height
+
+    @staticmethod
+    def _record(file_path, width, height, generated):
+        """记录原图尺寸和已生成的档位（与已记录的档位合并），单独提交"""
+        try:
+            info = StoredImage.query.filter_by(file_path=file_path).first()
+            if info is None:
+                try:
+                    with db.session.begin_nested():
+                        info = StoredImage(file_path=file_path, width=width, height=height, variant_widths='')
+                        db.session.add(info)
+                except IntegrityError:
+                    # 并发生成同一张图片时以先提交的记录为准
+                    info = StoredImage.query.filter_by(file_path=file_path).one()
+            widths = info.generated_widths | set(generated)
+            info.variant_widths = ','.join(str(width) for width in sorted(widths))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recording image size for {file_path}: {e}")
+
+    @staticmethod
+    def _remember(path):
+        with _known_lock:
+            if len(_known_variants) > 100000:
+                _known_variants.clear()
+            _known_variants.add(path)
+
+    @staticmethod
+    def pregenerate(file_path):
+        """上传后预先生成衍生图（IMAGE_VARIANTS_ON_UPLOAD），失败只记录日志，不影响上传"""
+        if not current_app.config.get('IMAGE_VARIANTS_ON_UPLOAD', True) \
+                or not ImageDerivativeService.is_resizable(file_path):
+            return
+        try:
+            ImageDerivativeService.generate(file_path)
+        except Exception as e:
+            print(f"Error generating image variants for {file_path}: {e}")
+
+    @staticmethod
+    def variant_url(file_path, width, generated=()):
+        """
+        某个宽度档位的访问地址
+        已生成的（stored_images中记录的档位）直接返回存储URL，
+        否则返回按需生成的地址（/media/image/<宽度>/<原图路径>）
+        :param generated: 已生成的档位
+        """
+        path = ImageDerivativeService.variant_path(file_path, width)
+        if width in generated or path in _known_variants:
+            return get_storage_service().get_file_url(path)
+        # 渲染结果保存在数据库中，不依赖请求上下文（url_for在命令行中需要SERVER_NAME）
+        return f"/media/image/{width}/{quote(file_path)}"
+
+    @staticmethod
+    def _src_path(img_tag):
+        """<img>的src对应的本站存储中可缩放图片的路径，其他图片返回None"""
+        match = _SRC_ATTR.search(img_tag)
+        if not match or 'srcset=' in img_tag or Image is None:
+            return None
+        file_path = get_storage_service().backend.path_from_url(match.group(1))
+        if file_path and ImageDerivativeService.is_resizable(file_path) \
+                and ImageDerivativeService.is_safe_path(file_path):
+            return file_path
+        return None
+
+    @staticmethod
+    def responsive_img(img_tag, images=None):
+        """
+        为<img>标签加上srcset/sizes/loading，src不是本站存储的可缩放图片或没有尺寸记录时只加loading
+        srcset只包含比原图窄的档位，再加上原图本身，宽度描述与实际尺寸一致
+        :param img_tag: <img ...> 标签
+        :param images: {file_path: StoredImage}，由rewrite_html批量查询；为None时单独查询
+        :return: 改写后的标签
+        """
+        attributes = ' loading="lazy" decoding="async"' if 'loading=' not in img_tag else ''
+
+        file_path = ImageDerivativeService._src_path(img_tag)
+        info = None
+        if file_path:
+            if images is None:
+                images = ImageDerivativeService._stored_images([file_path])
+            info = images.get(file_path)
+
+        original_width = info.width if info else None
+        widths = [width for width in ImageDerivativeService.widths() if original_width and width < original_width]
+        if widths:
+            match = _SRC_ATTR.search(img_tag)
+            generated = info.generated_widths
+            candidates = [f'{ImageDerivativeService.variant_url(file_path, width, generated)} {width}w'
+                          for width in widths]
+            candidates.append(f'{match.group(1)} {original_width}w')
+            sizes = current_app.config.get('IMAGE_VARIANT_SIZES') or \
+                f'(max-width: {min(original_width, 1024)}px) 100vw, {min(original_width, 1024)}px'
+            attributes += f' srcset="{", ".join(candidates)}" sizes="{sizes}"'
+
+        if not attributes:
+            return img_tag
+        end = -2 if img_tag.endswith('/>') else -1
+        return img_tag[:end].rstrip() + attributes + img_tag[end:]
+
+    @staticmethod
+    def _stored_images(file_paths):
+        """一次查询多张图片的尺寸记录"""
+        if not file_paths:
+            return {}
+        # 在页面内容的set事件中调用，不能触发正在修改的页面的autoflush
+        with db.session.no_autoflush:
+            return {info.file_path: info for info in
+                    StoredImage.query.filter(StoredImage.file_path.in_(list(file_paths)))}
+
+    @staticmethod
+    def rewrite_html(html):
+        """改写HTML中的全部<img>标签（所有图片的尺寸用一条查询取出）"""
+        file_paths = {ImageDerivativeService._src_path(tag) for tag in _IMG_TAG.findall(html)}
+        images = ImageDerivativeService._stored_images(file_paths - {None})
+        return _IMG_TAG.sub(lambda match: ImageDerivativeService.responsive_img(match.group(0), images), html)
@@ -0,0 +1,176 @@
+"""
+邮件发件箱服务
+业务代码只负责把邮件写入发件箱，由 `flask mail worker` 统一发送
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db, mail
+from app.models.mail import EmailOutbox
+from app.services.outbox import OutboxWorker
+
+
+class MailService:
+    """邮件发件箱服务类"""
+
+    @staticmethod
+    def build_row(recipient, subject, body=None, html=None, sender=None, source_type=None, source_id=None):
+        """
+        构造发件箱行数据
+        :param recipient: 收件人邮箱
+        :param subject: 邮件主题
+        :param body: 纯文本内容
+        :param html: HTML内容
+        :param sender: 发件人，默认为MAIL_SENDER
+        :param source_type: 来源类型（watch_notification / comment_mention）
+        :param source_id: 来源记录ID
+        :return: dict
+        """
+        return {
+            'recipient': recipient,
+            'sender': sender or current_app.config.get('MAIL_SENDER', 'noreply@enterprise-wiki.com'),
+            'subject': subject,
+            'body': body,
+            'html': html,
+            'source_type': source_type,
+            'source_id': source_id,
+            'status': EmailOutbox.STATUS_PENDING,
+            'attempts': 0,
+            'created_at': datetime.utcnow(),
+        }
+
+    @staticmethod
+    def enqueue(recipient, subject, body=None, html=None, sender=None, source_type=None, source_id=None):
+        """
+        将一封邮件加入发件箱（随当前会话一起提交）
+        :return: EmailOutbox对象
+        """
+        message = EmailOutbox(**MailService.build_row(
+            recipient, subject, body, html, sender, source_type, source_id
+        ))
+        db.session.add(message)
+        return message
+
+    @staticmethod
+    def enqueue_many(rows):
+        """
+        批量加入发件箱（随当前会话一起提交）
+        :param rows: build_row 生成的行数据列表
+        :return: 加入的邮件数量
+        """
+        if rows:
+            db.session.execute(EmailOutbox.__table__.insert(), rows)
+        return len(rows)
+
+
+def _mark_sources_sent(source_type, source_ids):
+    """发送成功后回写来源记录的已发送标记"""
+    from app.models.watch import WatchNotification
+    from app.models.comment import CommentMention
+
+    source_flags = {
+        'watch_notification': (WatchNotification, WatchNotification.is_sent),
+        'comment_mention': (CommentMention, CommentMention.notification_sent),
+    }
+    if source_type not in source_flags or not source_ids:
+        return
+
+    model, flag = source_flags[source_type]
+    model.query.filter(model.id.in_(source_ids)).update({flag: True}, synchronize_session=False)
+
+
+class MailDeliveryWorker(OutboxWorker):
+    """
+    邮件发件箱worker
+    保持一个持久的SMTP连接批量发送，空闲或连接出错时关闭并在下一批重连；
+    失败按指数退避重试，并对每个收件人做发送频率限制
+    """
+
+    model = EmailOutbox
+
+    def __init__(self, rate_limit=20, rate_window_seconds=3600, **kwargs):
+        kwargs.setdefault('backoff_seconds', 30)
+        super().__init__(**kwargs)
+        self.rate_limit = rate_limit
+        self.rate_window_seconds = rate_window_seconds
+        self._connection = None
+
+    def _get_connection(self):
+        if self._connection is None:
+            connection = mail.connect()
+            connection.__enter__()
+            self._connection = connection
+        return self._connection
+
+    def _close_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.__exit__(None, None, None)
+            except Exception:
+                pass
+            self._connection = None
+
+    def on_idle(self):
+        # SMTP服务器会断开长时间空闲的连接，空闲时主动关闭
+        self._close_connection()
+
+    def _recent_counts(self, recipients):
+        """统计各收件人在限流窗口内已发送的邮件数"""
+        if not self.rate_limit or not recipients:
+            return defaultdict(int)
+
+        window_start = datetime.utcnow() - timedelta(seconds=self.rate_window_seconds)
+        rows = db.session.query(EmailOutbox.recipient, db.func.count(EmailOutbox.id)).filter(
+            EmailOutbox.recipient.in_(recipients),
+            EmailOutbox.status == EmailOutbox.STATUS_SENT,
+            EmailOutbox.sent_at >= window_start
+        ).group_by(EmailOutbox.recipient).all()
+        return defaultdict(int, rows)
+
+    def run_once(self):
+        """
+        领取并发送一批邮件
+        :return: 处理的邮件数
+        """
+        messages = self.claim_batch()
+        if not messages:
+            return 0
+
+        recent_counts = self._recent_counts({message.recipient for message in messages})
+        sent_sources = defaultdict(list)
+
+        for message in messages:
+            # 超过收件人频率限制的邮件推迟到下一个窗口，不计入重试次数
+            if self.rate_limit and recent_counts[message.recipient] >= self.rate_limit:
+                self.release(message, self.rate_window_seconds)
+                continue
+
+            try:
+                self._get_connection().send(message.to_message())
+            except Exception as e:
+                # 连接可能已不可用，下一封邮件重新建立连接
+                self._close_connection()
+                self.retry_later(message, e)
+                print(f"Error sending email {message.id} to {message.recipient} (attempt {message.attempts}): {e}")
+                continue
+
+            message.status = EmailOutbox.STATUS_SENT
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            self.release(message)
+            recent_counts[message.recipient] += 1
+            if message.source_type and message.source_id:
+                sent_sources[message.source_type].append(message.source_id)
+
+        for source_type, source_ids in sent_sources.items():
+            _mark_sources_sent(source_type, source_ids)
+
+        db.session.commit()
+        return len(messages)
+
+    def run(self, poll_interval=2.0):
+        try:
+            super().run(poll_interval)
+        finally:
+            self._close_connection()
@@ -0,0 +1,197 @@
+"""
+未读通知计数器
+按用户缓存未读通知数，通知投递时增加、标记已读时减少，
+未读数接口命中缓存时不访问数据库；缓存带TTL，过期后按数据库重新计数（定期对账）
+"""
+
+from datetime import datetime, timedelta
+import threading
+
+
+# 仅在key存在时增减，避免在未缓存的用户上从0开始计数
+_ADJUST_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    local value = redis.call('incrby', KEYS[1], ARGV[1])
+    if value < 0 then
+        redis.call('set', KEYS[1], 0, 'KEEPTTL')
+        return 0
+    end
+    return value
+end
+return nil
+"""
+
+
+class UnreadCounter:
+    """
+    未读通知计数器
+    - redis: 多进程/多节点共享（默认），Redis不可用时回退为直接查询数据库
+    - memory: 进程内计数，只适用于单进程部署或测试
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 300
+        self.prefix = 'wiki:unread:'
+        self._redis = None
+        self._adjust = None
+        self._memory = {}
+        self._lock = threading.Lock()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """初始化计数器"""
+        self.backend = app.config.get('NOTIFICATION_COUNTER_BACKEND', 'redis')
+        self.ttl = app.config.get('NOTIFICATION_COUNTER_TTL', 300)
+        self._memory = {}
+
+        if self.backend == 'redis':
+            try:
+                import redis
+                self._redis = redis.from_url(
+                    app.config.get('NOTIFICATION_COUNTER_REDIS_URL')
+                    or app.config.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379/0'),
+                    socket_timeout=1
+                )
+                self._adjust = self._redis.register_script(_ADJUST_SCRIPT)
+            except Exception as e:
+                app.logger.warning(f'Unread counter: Redis unavailable, counting from database ({e})')
+                self._redis = None
+
+    def _key(self, user_id):
+        return f'{self.prefix}{user_id}'
+
+    @staticmethod
+    def _count_from_db(user_id):
+        from app.models.watch import WatchNotification
+        return WatchNotification.query.filter_by(user_id=user_id, is_read=False).count()
+
+    def get(self, user_id):
+        """
+        获取用户未读通知数
+        :param user_id: 用户ID
+        :return: 未读数
+        """
+        if self.backend == 'memory':
+            with self._lock:
+                cached = self._memory.get(user_id)
+                if cached and cached[1] > datetime.utcnow():
+                    return cached[0]
+            count = self._count_from_db(user_id)
+            self.set(user_id, count)
+            return count
+
+        if self._redis is not None:
+            try:
+                cached = self._redis.get(self._key(user_id))
+                if cached is not None:
+                    return int(cached)
+                count = self._count_from_db(user_id)
+                self._redis.set(self._key(user_id), count, ex=self.ttl, nx=True)
+                return count
+            except Exception as e:
+                print(f"Error reading unread counter: {e}")
+
+        return self._count_from_db(user_id)
+
+    def set(self, user_id, count):
+        """设置用户未读数（重新计数或全部已读后调用）"""
+        if self.backend == 'memory':
+            with self._lock:
+                self._memory[user_id] = (count, datetime.utcnow() + timedelta(seconds=self.ttl))
+            return
+
+        if self._redis is not None:
+            try:
+                self._redis.set(self._key(user_id), count, ex=self.ttl)
+            except Exception as e:
+                print(f"Error setting unread counter: {e}")
+
+    def adjust_many(self, deltas):
+        """
+        批量增减未读数，未缓存的用户跳过（下次读取时按数据库计数）
+        :param deltas: {user_id: 增减量}
+        """
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        if self.backend == 'memory':
+            with self._lock:
+                for user_id, delta in deltas.items():
+                    cached = self._memory.get(user_id)
+                    if cached:
+                        self._memory[user_id] = (max(cached[0] + delta, 0), cached[1])
+            return
+
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for user_id, delta in deltas.items():
+                    self._adjust(keys=[self._key(user_id)], args=[delta], client=pipe)
+                pipe.execute()
+            except Exception as e:
+                # 计数可能暂时偏差，删除缓存让下次读取重新计数
+                print(f"Error adjusting unread counters: {e}")
+                self.invalidate(*deltas)
+
+    def incr(self, user_id, amount=1):
+        """增加用户未读数"""
+        self.adjust_many({user_id: amount})
+
+    def decr(self, user_id, amount=1):
+        """减少用户未读数"""
+        self.adjust_many({user_id: -amount})
+
+    def invalidate(self, *user_ids):
+        """删除用户的缓存计数，下次读取时重新计数"""
+        if not user_ids:
+            return
+
+        if self.backend == 'memory':
+            with self._lock:
+                for user_id in user_ids:
+                    self._memory.pop(user_id, None)
+            return
+
+        if self._redis is not None:
+            try:
+                self._redis.delete(*[self._key(user_id) for user_id in user_ids])
+            except Exception as e:
+                print(f"Error invalidating unread counters: {e}")
+
+    def reconcile(self, batch_size=500):
+        """
+        用数据库中的实际未读数校正所有已缓存的计数
+        :return: 校正的用户数
+        """
+        from app import db
+        from app.models.watch import WatchNotification
+
+        if self.backend == 'memory':
+            with self._lock:
+                user_ids = list(self._memory)
+        elif self._redis is not None:
+            user_ids = [
+                int(key.decode().rsplit(':', 1)[1])
+                for key in self._redis.scan_iter(match=f'{self.prefix}*', count=1000)
+            ]
+        else:
+            return 0
+
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            counts = dict(db.session.query(
+                WatchNotification.user_id, db.func.count(WatchNotification.id)
+            ).filter(
+                WatchNotification.user_id.in_(chunk),
+                WatchNotification.is_read == False
+            ).group_by(WatchNotification.user_id).all())
+            for user_id in chunk:
+                self.set(user_id, counts.get(user_id, 0))
+
+        return len(user_ids)
+
+
+unread_counter = UnreadCounter()
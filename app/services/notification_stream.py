@@ -0,0 +1,127 @@
+"""
+通知推送中心
+为SSE连接提供按用户的订阅队列：
+- redis: 通过Redis pub/sub在所有进程/节点间广播（watch worker中产生的通知也能推送到web进程）
+- memory: 仅在当前进程内分发，适用于单进程部署或测试
+消息只携带用户ID和类型，SSE连接收到后从数据库读取新通知，断线重连时同样按Last-Event-ID补发
+"""
+
+from collections import defaultdict
+import json
+import queue
+import threading
+import time
+
+
+class NotificationHub:
+    """通知推送中心"""
+
+    KIND_NOTIFICATION = 'notification'
+    KIND_UNREAD = 'unread'
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.channel = 'wiki:notifications'
+        self._redis = None
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._logger = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """初始化推送中心"""
+        self.backend = app.config.get('NOTIFICATION_STREAM_BACKEND', 'redis')
+        self._logger = app.logger
+        if self.backend == 'redis':
+            try:
+                import redis
+                self._redis = redis.from_url(
+                    app.config.get('NOTIFICATION_COUNTER_REDIS_URL')
+                    or app.config.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379/0')
+                )
+            except Exception as e:
+                app.logger.warning(f'Notification stream: Redis unavailable, using in-process delivery ({e})')
+                self._redis = None
+
+    def publish(self, user_ids, kind=KIND_NOTIFICATION):
+        """
+        通知订阅了这些用户的连接
+        :param user_ids: 用户ID列表
+        :param kind: notification（有新通知）/ unread（未读数变化）
+        """
+        user_ids = sorted({int(user_id) for user_id in user_ids})
+        if not user_ids:
+            return
+
+        message = {'user_ids': user_ids, 'kind': kind}
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.channel, json.dumps(message))
+                return
+            except Exception as e:
+                print(f"Error publishing notification event: {e}")
+        self._dispatch(message)
+
+    def subscribe(self, user_id):
+        """
+        订阅用户的推送
+        :param user_id: 用户ID
+        :return: queue.Queue，收到的元素为消息类型
+        """
+        subscription = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        """取消订阅"""
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[user_id]
+
+    def _dispatch(self, message):
+        kind = message.get('kind', self.KIND_NOTIFICATION)
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in message.get('user_ids', [])
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+        for subscription in targets:
+            try:
+                subscription.put_nowait(kind)
+            except queue.Full:
+                # 连接处理不过来时丢弃，下一条消息到达时会一并补发
+                pass
+
+    def _ensure_listener(self):
+        if self._redis is None or (self._listener and self._listener.is_alive()):
+            return
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='notification-hub', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        """每个进程一个Redis订阅，分发给本进程内的SSE连接"""
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._dispatch(json.loads(message['data']))
+            except Exception as e:
+                if self._logger:
+                    self._logger.warning(f'Notification stream: Redis subscription lost ({e}), retrying')
+                time.sleep(1)
+
+
+notification_hub = NotificationHub()
@@ -0,0 +1,114 @@
+"""
+发件箱worker基础设施
+发件箱表需要包含 status / attempts / last_error / locked_by / locked_until 列，
+以及 STATUS_PENDING / STATUS_FAILED 常量
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from app import db
+import os
+import socket
+import time
+import uuid
+
+
+class OutboxWorker(ABC):
+    """
+    发件箱worker基类
+    批量领取待处理行，投递语义为至少一次：
+    - PostgreSQL 使用 SELECT ... FOR UPDATE SKIP LOCKED 领取
+    - SQLite 等不支持SKIP LOCKED的数据库使用带条件UPDATE抢占租约
+    worker崩溃后租约过期，行会被其他worker重新领取；失败的行按指数退避重新排队
+    """
+
+    model = None
+
+    def __init__(self, worker_id=None, batch_size=50, lease_seconds=60, max_attempts=5,
+                 backoff_seconds=10, max_backoff_seconds=3600):
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def _claimable_filter(self, now):
+        model = self.model
+        return db.and_(
+            model.status == model.STATUS_PENDING,
+            db.or_(model.locked_until.is_(None), model.locked_until < now)
+        )
+
+    def claim_batch(self):
+        """
+        领取一批待处理行
+        :return: 发件箱行列表
+        """
+        model = self.model
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.lease_seconds)
+        query = model.query.filter(self._claimable_filter(now)).order_by(model.id).limit(self.batch_size)
+
+        if db.engine.dialect.name == 'postgresql':
+            rows = query.with_for_update(skip_locked=True).all()
+            for row in rows:
+                row.locked_by = self.worker_id
+                row.locked_until = lease_until
+            db.session.commit()
+            return rows
+
+        # 每次领取使用唯一的租约令牌，只有条件UPDATE成功的行才归本次领取所有
+        lease_token = f'{self.worker_id}:{uuid.uuid4().hex[:8]}'
+        candidate_ids = [row_id for (row_id,) in query.with_entities(model.id)]
+        if not candidate_ids:
+            db.session.rollback()
+            return []
+
+        model.query.filter(
+            model.id.in_(candidate_ids),
+            self._claimable_filter(now)
+        ).update({
+            model.locked_by: lease_token,
+            model.locked_until: lease_until
+        }, synchronize_session=False)
+        db.session.commit()
+
+        return model.query.filter_by(locked_by=lease_token).order_by(model.id).all()
+
+    def release(self, row, delay_seconds=None):
+        """释放租约；指定delay_seconds时在此之前不会被重新领取"""
+        row.locked_by = None
+        row.locked_until = datetime.utcnow() + timedelta(seconds=delay_seconds) if delay_seconds else None
+
+    def retry_later(self, row, error):
+        """记录失败，按指数退避重新排队，超过最大次数标记为failed"""
+        row.attempts = (row.attempts or 0) + 1
+        row.last_error = str(error)
+        if row.attempts >= self.max_attempts:
+            row.status = self.model.STATUS_FAILED
+            self.release(row)
+        else:
+            # 通过租约时间实现退避：在此之前不会被重新领取
+            delay = min(self.backoff_seconds * 2 ** (row.attempts - 1), self.max_backoff_seconds)
+            self.release(row, delay)
+
+    @abstractmethod
+    def run_once(self):
+        """
+        领取并处理一批行
+        :return: 处理的行数
+        """
+        pass
+
+    def on_idle(self):
+        """发件箱为空时调用，子类可释放空闲资源"""
+        pass
+
+    def run(self, poll_interval=2.0):
+        """持续运行，直到被中断"""
+        while True:
+            processed = self.run_once()
+            if not processed:
+                self.on_idle()
+                time.sleep(poll_interval)
@@ -0,0 +1,201 @@
+"""
+本地存储目录布局迁移
+旧布局把文件直接放在 <文件夹>/ 下，单个目录可能有几十万个文件；
+`flask storage reshard` 把这些文件移动到 <文件夹>/ab/cd/（见 shard_path），头像缩放图随原图移动，
+再分批改写数据库中引用它们的路径和URL。迁移过程中旧路径仍可以通过 LocalStorageBackend 解析。
+响应式衍生图（variants/）不移动：已渲染页面中的srcset仍然有效，新路径的衍生图按需重新生成
+"""
+
+import os
+import re
+
+from app import db
+from app.models.share import S3Share
+from app.models.user import User, AVATAR_SIZES
+from app.models.wiki import Attachment, Page, PageVersion
+from app.services.storage_service import shard_path, unshard_path
+
+# 不迁移的顶层目录：去重文件本身已分散存放，衍生图按原图路径存放、不随原图移动
+SKIP_FOLDERS = ('blobs', 'variants')
+
+# 头像缩放图（<原图>_<尺寸>.<扩展名>）随原图移动
+_AVATAR_SIZE_FILE = re.compile(r'^(?P<stem>.+)_(%s)\.(webp|jpg)$' % '|'.join(str(size) for size in AVATAR_SIZES))
+
+
+class StorageLayoutService:
+    """本地存储布局迁移"""
+
+    @staticmethod
+    def legacy_files(backend):
+        """
+        上传目录中仍是旧布局的文件（相对路径），头像缩放图和写入中的临时文件除外
+        """
+        from app.services.image_service import ImageDerivativeService
+
+        upload_folder = backend.upload_folder
+        for directory, subdirectories, filenames in os.walk(upload_folder):
+            relative_directory = os.path.relpath(directory, upload_folder).replace(os.sep, '/')
+            if relative_directory == '.':
+                relative_directory = ''
+                subdirectories[:] = [name for name in subdirectories if name not in SKIP_FOLDERS]
+
+            image_stems = {os.path.splitext(name)[0] for name in filenames
+                           if ImageDerivativeService.is_resizable(name)}
+            for name in filenames:
+                if name.startswith('.upload-'):
+                    continue
+                match = _AVATAR_SIZE_FILE.match(name)
+                if match and match.group('stem') in image_stems:
+                    continue
+                relative_path = f"{relative_directory}/{name}" if relative_directory else name
+                if unshard_path(relative_path) is None:
+                    yield relative_path
+
+    @staticmethod
+    def move_files(backend, batch_size=1000, dry_run=False):
+        """
+        把旧布局的文件（及其头像缩放图）移动到分散布局
+        :return: (移动的文件数, 字节数)
+        """
+        from app.services.avatar_service import AvatarService
+        from app.services.image_service import ImageDerivativeService
+
+        moved = total_bytes = 0
+        for relative_path in StorageLayoutService.legacy_files(backend):
+            source = os.path.join(backend.upload_folder, relative_path)
+            new_path = shard_path(relative_path)
+            total_bytes += os.path.getsize(source)
+            moved += 1
+            if dry_run:
+                continue
+
+            pairs = [(relative_path, new_path)]
+            if ImageDerivativeService.is_resizable(relative_path):
+                pairs.extend((AvatarService.size_path(relative_path, size), AvatarService.size_path(new_path, size))
+                             for size in AVATAR_SIZES)
+            for old, new in pairs:
+                old_local = os.path.join(backend.upload_folder, old)
+                if not os.path.exists(old_local):
+                    continue
+                new_local = os.path.join(backend.upload_folder, new)
+                os.makedirs(os.path.dirname(new_local), exist_ok=True)
+                os.replace(old_local, new_local)  # 同一文件系统内的原子重命名
+
+            if moved % batch_size == 0:
+                print(f"Moved {moved} files")
+        return moved, total_bytes
+
+    @staticmethod
+    def rewrite_references(storage_service, batch_size=500):
+        """
+        改写数据库中指向已迁移文件的路径和URL
+        :return: {'attachments', 'shares', 'users', 'pages', 'versions'} 各自改写的行数
+        """
+        backend = storage_service.backend
+        counts = {}
+
+        counts['attachments'] = StorageLayoutService._rewrite_paths(
+            backend, Attachment, batch_size, lambda row, new_path: {'file_path': new_path})
+
+        def share_values(share, new_path):
+            return {
+                'file_path': new_path,
+                's3_url': StorageLayoutService._moved_url(backend, share.s3_url),
+                'public_url': StorageLayoutService._moved_url(backend, share.public_url),
+                'updated_at': S3Share.updated_at
+            }
+        counts['shares'] = StorageLayoutService._rewrite_paths(backend, S3Share, batch_size, share_values)
+
+        counts['users'] = StorageLayoutService._rewrite_avatars(backend, batch_size)
+        counts['pages'] = StorageLayoutService._rewrite_html(backend, Page, batch_size)
+        counts['versions'] = StorageLayoutService._rewrite_html(backend, PageVersion, batch_size)
+        return counts
+
+    @staticmethod
+    def _rewrite_paths(backend, model, batch_size, values):
+        """按ID分批检查file_path，已迁移的改为新路径（Core UPDATE，不触发模型事件）"""
+        rewritten = 0
+        last_id = 0
+        while True:
+            rows = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                if row.blob_id or not row.file_path:
+                    continue
+                new_path = backend.moved_path(row.file_path)
+                if new_path:
+                    model.query.filter_by(id=row.id).update(values(row, new_path), synchronize_session=False)
+                    rewritten += 1
+            db.session.commit()
+            db.session.expunge_all()
+        return rewritten
+
+    @staticmethod
+    def _moved_url(backend, url):
+        """旧布局文件的URL改为新位置的URL，其他URL原样返回"""
+        path = backend.path_from_url(url or '')
+        new_path = backend.moved_path(path) if path else None
+        return f"{backend.base_url.rstrip('/')}/{new_path}" if new_path else url
+
+    @staticmethod
+    def _rewrite_avatars(backend, batch_size):
+        from app.services.avatar_service import AvatarService
+
+        rewritten = 0
+        last_id = 0
+        while True:
+            users = User.query.filter(
+                User.id > last_id, User.avatar.isnot(None)
+            ).order_by(User.id).limit(batch_size).all()
+            if not users:
+                break
+            last_id = users[-1].id
+            for user in users:
+                avatar = StorageLayoutService._moved_url(backend, user.avatar.strip())
+                if avatar == user.avatar.strip():
+                    continue
+                thumbs = user.avatar_thumbs
+                if thumbs:
+                    new_path = backend.path_from_url(avatar)
+                    thumbs = f"{backend.base_url.rstrip('/')}/{AvatarService.size_path(new_path, '{size}')}"
+                User.query.filter_by(id=user.id).update(
+                    {'avatar': avatar, 'avatar_thumbs': thumbs}, synchronize_session=False)
+                AvatarService.invalidate(user.id)
+                rewritten += 1
+            db.session.commit()
+            db.session.expunge_all()
+        return rewritten
+
+    @staticmethod
+    def _rewrite_html(backend, model, batch_size):
+        """改写页面（或页面版本）内容中引用上传文件的URL，保留updated_at"""
+        prefix = backend.base_url.rstrip('/') + '/'
+        url_pattern = re.compile(re.escape(prefix) + r'[^\s"\'<>()]+')
+
+        def replace(text):
+            if not text:
+                return text
+            return url_pattern.sub(lambda match: StorageLayoutService._moved_url(backend, match.group(0)), text)
+
+        rewritten = 0
+        last_id = 0
+        while True:
+            rows = db.session.query(model.id, model.content, model.content_html).filter(
+                model.id > last_id,
+                db.or_(model.content.contains(prefix), model.content_html.contains(prefix))
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row_id, content, content_html in rows:
+                values = {'content': replace(content), 'content_html': replace(content_html)}
+                if values['content'] == content and values['content_html'] == content_html:
+                    continue
+                if hasattr(model, 'updated_at'):
+                    values['updated_at'] = model.updated_at
+                model.query.filter_by(id=row_id).update(values, synchronize_session=False)
+                rewritten += 1
+            db.session.commit()
+        return rewritten
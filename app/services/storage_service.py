@@ -4,19 +4,133 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, BinaryIO
+from typing import Optional, Dict, Any, BinaryIO, Callable, Iterable, List
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import hashlib
 import os
+import posixpath
+import tempfile
+import threading
+from urllib.parse import quote
 import uuid
 
 
+# 上传流式拷贝的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 上传进度回调，参数为本次新传输的字节数（与boto3的Callback一致）
+ProgressCallback = Callable[[int], None]
+
+# S3 DeleteObjects 每个请求的键数上限
+DELETE_OBJECTS_MAX_KEYS = 1000
+
+# 本地存储的目录布局：sharded 按文件名哈希分为两级子目录，flat 直接放在文件夹下（旧布局）
+LOCAL_LAYOUTS = ('sharded', 'flat')
+
+
+def shard_path(relative_path: str) -> str:
+    """
+    分散存放的路径：在文件名前插入由文件名MD5决定的两级目录
+    attachments/20240101_120000_a.pdf -> attachments/3f/9c/20240101_120000_a.pdf
+    每级256个目录，百万个文件时每个目录约15个文件
+    """
+    directory, name = posixpath.split(relative_path)
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return posixpath.join(directory, digest[:2], digest[2:4], name)
+
+
+def unshard_path(relative_path: str) -> Optional[str]:
+    """shard_path的逆运算，路径不是分散布局时返回None"""
+    parts = relative_path.split('/')
+    if len(parts) < 3:
+        return None
+    digest = hashlib.md5(parts[-1].encode('utf-8')).hexdigest()
+    if parts[-3] != digest[:2] or parts[-2] != digest[2:4]:
+        return None
+    return '/'.join(parts[:-3] + parts[-1:])
+
+
+def copy_stream(source: BinaryIO, destination: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                progress_callback: Optional[ProgressCallback] = None):
+    """
+    分块拷贝文件流，同时计算大小和SHA-256
+    使用可复用的缓冲区（readinto），内存占用与文件大小无关
+
+    Args:
+        source: 源文件流
+        destination: 目标文件
+        chunk_size: 块大小
+        progress_callback: 每写完一块调用一次，参数为该块的字节数
+
+    Returns:
+        (file_size, sha256十六进制摘要)
+    """
+    digest = hashlib.sha256()
+    file_size = 0
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    readinto = getattr(source, 'readinto', None)
+
+    while True:
+        if readinto is not None:
+            read = readinto(buffer)
+            chunk = view[:read] if read else None
+        else:
+            chunk = source.read(chunk_size)
+            read = len(chunk) if chunk else 0
+        if not read:
+            break
+        digest.update(chunk)
+        destination.write(chunk)
+        file_size += read
+        if progress_callback:
+            progress_callback(read)
+
+    return file_size, digest.hexdigest()
+
+
+def content_disposition(filename: str, as_attachment: bool = True) -> str:
+    """
+    生成Content-Disposition头，非ASCII文件名（如中文）按RFC 5987编码
+
+    Args:
+        filename: 下载文件名
+        as_attachment: True为下载，False为在浏览器中打开
+
+    Returns:
+        str: 头部的值
+    """
+    disposition = 'attachment' if as_attachment else 'inline'
+    fallback = secure_filename(filename) or 'download'
+    if fallback == filename:
+        return f'{disposition}; filename="{filename}"'
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+class _NullWriter:
+    def write(self, chunk):
+        return len(chunk)
+
+
+def hash_stream(source: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    分块计算文件流的大小和SHA-256，不写入任何地方
+
+    Returns:
+        (file_size, sha256十六进制摘要)
+    """
+    return copy_stream(source, _NullWriter(), chunk_size)
+
+
 class StorageBackend(ABC):
     """存储后端抽象基类"""
 
     @abstractmethod
     def upload_file(self, file_data: BinaryIO, filename: str,
-                   content_type: str, folder: str = "") -> Dict[str, Any]:
+                   content_type: str, folder: str = "",
+                   progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """
         上传文件
 
@@ -25,6 +139,7 @@ class StorageBackend(ABC):
             filename: 文件名
             content_type: MIME类型
             folder: 存储文件夹
+            progress_callback: 上传进度回调，参数为新传输的字节数
 
         Returns:
             Dict包含文件信息: {
@@ -33,6 +148,7 @@ class StorageBackend(ABC):
                 'url': str,
                 'file_path': str,
                 'file_size': int,
+                'sha256': str (本地存储),
                 'message': str (可选)
             }
         """
@@ -64,56 +180,138 @@ class StorageBackend(ABC):
         """
         pass
 
+    @abstractmethod
+    def put_file(self, file_data: BinaryIO, relative_path: str, content_type: str,
+                 progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        按指定的相对路径（对象键）保存文件，已存在时覆盖
+
+        Args:
+            file_data: 文件数据流
+            relative_path: 相对路径/对象键
+            content_type: MIME类型
+            progress_callback: 上传进度回调，参数为新传输的字节数
+
+        Returns:
+            Dict，格式同upload_file
+        """
+        pass
+
+    def delete_files(self, file_paths: Iterable[str]) -> List[str]:
+        """
+        批量删除文件（默认逐个删除）
+
+        Args:
+            file_paths: 文件路径列表
+
+        Returns:
+            实际删除的文件路径列表
+        """
+        return [file_path for file_path in file_paths if self.delete_file(file_path)]
+
+    @abstractmethod
+    def file_exists(self, file_path: str) -> bool:
+        """
+        文件是否存在
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            bool: 是否存在
+        """
+        pass
+
+    def path_from_url(self, url: str) -> Optional[str]:
+        """
+        由get_file_url生成的URL反查文件路径
+
+        Returns:
+            相对路径/对象键，URL不属于本存储时返回None
+        """
+        return None
+
+    @abstractmethod
+    def open_file(self, file_path: str) -> BinaryIO:
+        """
+        以二进制流打开已存储的文件（调用方负责关闭）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            可read的文件流
+        """
+        pass
+
 
 class LocalStorageBackend(StorageBackend):
     """本地存储后端"""
 
-    def __init__(self, upload_folder: str, base_url: str = None):
+    def __init__(self, upload_folder: str, base_url: str = None, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 layout: str = 'sharded'):
         self.upload_folder = upload_folder
         self.base_url = base_url or "/static/uploads"
+        self.chunk_size = chunk_size
+        # 新上传文件的目录布局，旧布局的文件由 `flask storage reshard` 迁移
+        self.layout = layout if layout in LOCAL_LAYOUTS else 'sharded'
 
     def upload_file(self, file_data: BinaryIO, filename: str,
-                   content_type: str, folder: str = "") -> Dict[str, Any]:
-        try:
-            # 安全文件名处理
-            safe_filename = secure_filename(filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            unique_filename = f"{timestamp}_{safe_filename}"
+                   content_type: str, folder: str = "",
+                   progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        # 安全文件名处理
+        safe_filename = secure_filename(filename)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_filename = f"{timestamp}_{safe_filename}"
+
+        # 生成相对路径
+        if folder:
+            relative_path = f"{folder}/{unique_filename}"
+        else:
+            relative_path = unique_filename
+        if self.layout == 'sharded':
+            relative_path = shard_path(relative_path)
 
-            # 构建存储路径
-            if folder:
-                upload_path = os.path.join(self.upload_folder, folder, unique_filename)
-            else:
-                upload_path = os.path.join(self.upload_folder, unique_filename)
+        result = self.put_file(file_data, relative_path, content_type, progress_callback)
+        if result['success']:
+            result['original_filename'] = safe_filename
+        return result
+
+    def put_file(self, file_data: BinaryIO, relative_path: str, content_type: str,
+                 progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        try:
+            upload_path = os.path.join(self.upload_folder, relative_path)
 
             # 确保目录存在
             os.makedirs(os.path.dirname(upload_path), exist_ok=True)
 
-            # 保存文件
+            # 分块写入同目录的临时文件，完成后原子重命名，
+            # 不会留下写了一半的文件，也不会把整个上传读入内存
             file_data.seek(0)  # 重置文件指针
-            with open(upload_path, 'wb') as f:
-                f.write(file_data.read())
-
-            # 获取文件大小
-            file_size = os.path.getsize(upload_path)
-
-            # 生成相对路径
-            if folder:
-                relative_path = f"{folder}/{unique_filename}"
-            else:
-                relative_path = unique_filename
+            fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=os.path.dirname(upload_path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    file_size, sha256 = copy_stream(file_data, f, self.chunk_size, progress_callback)
+                os.chmod(temp_path, 0o644)  # mkstemp创建的文件只有属主可读
+                os.replace(temp_path, upload_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
 
             # 生成URL
             url = f"{self.base_url}/{relative_path}".replace("//", "/")
+            filename = os.path.basename(relative_path)
 
             return {
                 'success': True,
-                'filename': unique_filename,
-                'original_filename': safe_filename,
+                'filename': filename,
+                'original_filename': filename,
                 'url': url,
                 'file_path': upload_path,
                 'relative_path': relative_path,
-                'file_size': file_size
+                'file_size': file_size,
+                'sha256': sha256
             }
 
         except Exception as e:
@@ -122,8 +320,56 @@ class LocalStorageBackend(StorageBackend):
                 'message': f"本地存储失败: {str(e)}"
             }
 
+    def _resolve_path(self, file_path: str) -> str:
+        """
+        相对路径（数据库中保存的）转换为磁盘路径，绝对路径或带上传目录前缀的路径保持不变；
+        旧布局的路径在文件已迁移到分散布局时指向新位置
+        """
+        if os.path.isabs(file_path) or file_path.startswith(self.upload_folder):
+            return file_path
+        local_path = os.path.join(self.upload_folder, file_path)
+        if not os.path.exists(local_path):
+            moved_path = os.path.join(self.upload_folder, shard_path(file_path))
+            if os.path.exists(moved_path):
+                return moved_path
+        return local_path
+
+    def moved_path(self, relative_path: str) -> Optional[str]:
+        """旧布局的文件已迁移时返回新的相对路径，否则返回None"""
+        if unshard_path(relative_path) is not None \
+                or os.path.exists(os.path.join(self.upload_folder, relative_path)):
+            return None
+        sharded = shard_path(relative_path)
+        if os.path.exists(os.path.join(self.upload_folder, sharded)):
+            return sharded
+        return None
+
+    def open_file(self, file_path: str) -> BinaryIO:
+        return open(self._resolve_path(file_path), 'rb')
+
+    def file_exists(self, file_path: str) -> bool:
+        return os.path.exists(self._resolve_path(file_path))
+
+    def path_from_url(self, url: str) -> Optional[str]:
+        prefix = self.base_url.rstrip('/') + '/'
+        if url.startswith(prefix):
+            return url[len(prefix):]
+        return None
+
+    def get_local_path(self, file_path: str) -> str:
+        """文件在磁盘上的绝对路径"""
+        return os.path.abspath(self._resolve_path(file_path))
+
+    def get_relative_path(self, file_path: str) -> Optional[str]:
+        """文件相对上传目录的路径，不在上传目录内时返回None"""
+        relative_path = os.path.relpath(self.get_local_path(file_path), os.path.abspath(self.upload_folder))
+        if relative_path.startswith('..'):
+            return None
+        return relative_path.replace(os.sep, '/')
+
     def delete_file(self, file_path: str) -> bool:
         try:
+            file_path = self._resolve_path(file_path)
             if os.path.exists(file_path):
                 os.remove(file_path)
                 return True
@@ -135,21 +381,38 @@ class LocalStorageBackend(StorageBackend):
         # 本地存储需要将绝对路径转换为相对路径
         if file_path.startswith(self.upload_folder):
             relative_path = file_path[len(self.upload_folder):].lstrip('/')
-            return f"{self.base_url}/{relative_path}".replace("//", "/")
-        return file_path
+        elif os.path.isabs(file_path) or '://' in file_path:
+            return file_path
+        else:
+            # 相对上传目录的路径（put_file保存的路径）
+            relative_path = file_path
+        # 数据库中仍是旧布局路径、文件已迁移时返回新位置的URL
+        if '{' not in relative_path:
+            relative_path = self.moved_path(relative_path) or relative_path
+        return f"{self.base_url}/{relative_path}".replace("//", "/")
 
 
 class S3StorageBackend(StorageBackend):
     """S3兼容存储后端（支持AWS S3、Cloudflare R2、MinIO）"""
 
     def __init__(self, endpoint_url: str, access_key: str, secret_key: str,
-                 bucket_name: str, region: str = None, cdn_url: str = None):
+                 bucket_name: str, region: str = None, cdn_url: str = None,
+                 max_pool_connections: int = 50, multipart_threshold: int = 8 * 1024 * 1024,
+                 multipart_chunksize: int = 8 * 1024 * 1024, max_concurrency: int = 10):
         self.endpoint_url = endpoint_url
         self.access_key = access_key
         self.secret_key = secret_key
         self.bucket_name = bucket_name
         self.region = region
         self.cdn_url = cdn_url
+        self.max_pool_connections = max_pool_connections
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        # 每个并发分片占用一个连接，不能超过连接池大小
+        self.max_concurrency = max(1, min(max_concurrency, max_pool_connections))
+        self._client = None
+        self._transfer_config = None
+        self._client_lock = threading.Lock()
 
         # 延迟导入boto3，只有在使用S3时才需要
         try:
@@ -158,20 +421,55 @@ class S3StorageBackend(StorageBackend):
 
             self.boto3 = boto3
             self.ClientError = ClientError
-
-            # 创建S3客户端
-            self.s3_client = boto3.client(
-                's3',
-                endpoint_url=endpoint_url,
-                aws_access_key_id=access_key,
-                aws_secret_access_key=secret_key,
-                region_name=region
-            )
         except ImportError:
             raise ImportError("请安装boto3库以支持S3存储: pip install boto3")
 
+    @property
+    def s3_client(self):
+        """
+        S3客户端，第一次使用时创建（生成URL不需要客户端）
+        boto3客户端是线程安全的，同一个后端实例的所有线程共用一个客户端和连接池
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from botocore.config import Config as BotoConfig
+
+                    self._client = self.boto3.client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        region_name=self.region,
+                        config=BotoConfig(
+                            signature_version='s3v4',  # 预签名URL需要签入Content-Length等请求头
+                            max_pool_connections=self.max_pool_connections,
+                            retries={'max_attempts': 3, 'mode': 'standard'},
+                            tcp_keepalive=True
+                        )
+                    )
+        return self._client
+
+    @property
+    def transfer_config(self):
+        """
+        分片上传设置：超过阈值的文件按固定大小分片，由多个线程并发上传
+        上传失败或被中断时s3transfer会中止（AbortMultipartUpload）已创建的分片上传
+        """
+        if self._transfer_config is None:
+            from boto3.s3.transfer import TransferConfig
+
+            self._transfer_config = TransferConfig(
+                multipart_threshold=self.multipart_threshold,
+                multipart_chunksize=self.multipart_chunksize,
+                max_concurrency=self.max_concurrency,
+                use_threads=self.max_concurrency > 1
+            )
+        return self._transfer_config
+
     def upload_file(self, file_data: BinaryIO, filename: str,
-                   content_type: str, folder: str = "") -> Dict[str, Any]:
+                   content_type: str, folder: str = "",
+                   progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         try:
             # 安全文件名处理
             safe_filename = secure_filename(filename)
@@ -184,6 +482,22 @@ class S3StorageBackend(StorageBackend):
             else:
                 object_key = unique_filename
 
+            result = self.put_file(file_data, object_key, content_type, progress_callback)
+            if result['success']:
+                result['original_filename'] = safe_filename
+            return result
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f"S3存储失败: {str(e)}"
+            }
+
+    def put_file(self, file_data: BinaryIO, relative_path: str, content_type: str,
+                 progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        try:
+            object_key = relative_path
+
             # 获取文件大小
             file_data.seek(0, 2)  # 移动到文件末尾
             file_size = file_data.tell()
@@ -202,32 +516,18 @@ class S3StorageBackend(StorageBackend):
                 file_data,
                 self.bucket_name,
                 object_key,
-                ExtraArgs=upload_args
+                ExtraArgs=upload_args,
+                Callback=progress_callback,
+                Config=self.transfer_config
             )
 
-            # 生成文件URL
-            if self.cdn_url:
-                url = f"{self.cdn_url.rstrip('/')}/{object_key}"
-            else:
-                # 根据不同的S3服务生成URL
-                if 'cloudflare' in self.endpoint_url.lower():
-                    url = f"{self.endpoint_url}/{self.bucket_name}/{object_key}"
-                elif 'minio' in self.endpoint_url.lower():
-                    url = f"{self.endpoint_url}/{self.bucket_name}/{object_key}"
-                else:
-                    # AWS S3
-                    if self.region and self.region != 'us-east-1':
-                        url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{object_key}"
-                    else:
-                        url = f"https://{self.bucket_name}.s3.amazonaws.com/{object_key}"
-
-            # 文件大小已在上传前获取
+            filename = object_key.rsplit('/', 1)[-1]
 
             return {
                 'success': True,
-                'filename': unique_filename,
-                'original_filename': safe_filename,
-                'url': url,
+                'filename': filename,
+                'original_filename': filename,
+                'url': self.get_file_url(object_key),
                 'file_path': object_key,
                 'relative_path': object_key,
                 'file_size': file_size
@@ -239,6 +539,118 @@ class S3StorageBackend(StorageBackend):
                 'message': f"S3存储失败: {str(e)}"
             }
 
+    def generate_presigned_put(self, object_key: str, content_type: str, content_length: int,
+                               expires_in: int = 900) -> Dict[str, Any]:
+        """
+        生成浏览器直传用的预签名PUT请求
+        Content-Type和Content-Length签入签名，上传的内容类型和大小必须与申请时一致
+
+        Args:
+            object_key: 对象键
+            content_type: MIME类型
+            content_length: 文件大小（字节）
+            expires_in: 有效期（秒）
+
+        Returns:
+            Dict: {'url': str, 'method': 'PUT', 'headers': 浏览器需要带上的请求头}
+        """
+        params = {
+            'Bucket': self.bucket_name,
+            'Key': object_key,
+            'ContentType': content_type,
+            'ContentLength': content_length
+        }
+        headers = {'Content-Type': content_type}
+
+        # Cloudflare R2不支持ACL参数
+        if 'cloudflare' not in self.endpoint_url.lower():
+            params['ACL'] = 'public-read'
+            headers['x-amz-acl'] = 'public-read'
+
+        url = self.s3_client.generate_presigned_url(
+            'put_object', Params=params, ExpiresIn=expires_in, HttpMethod='PUT'
+        )
+        return {'url': url, 'method': 'PUT', 'headers': headers}
+
+    def generate_presigned_get(self, file_path: str, expires_in: int = 300,
+                               download_name: str = None, content_type: str = None) -> str:
+        """
+        生成短期有效的预签名下载地址（私有存储桶也可以下载）
+
+        Args:
+            file_path: 对象键
+            expires_in: 有效期（秒）
+            download_name: 指定时以附件形式下载并使用该文件名
+            content_type: 覆盖响应的Content-Type
+
+        Returns:
+            str: 预签名URL
+        """
+        params = {'Bucket': self.bucket_name, 'Key': file_path}
+        if download_name:
+            params['ResponseContentDisposition'] = content_disposition(download_name, as_attachment=True)
+        if content_type:
+            params['ResponseContentType'] = content_type
+        return self.s3_client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+
+    def head_file(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        查询已上传对象的元数据
+
+        Returns:
+            Dict: {'file_size', 'content_type', 'etag'}，对象不存在时返回None
+        """
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_path)
+        except self.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {
+            'file_size': response['ContentLength'],
+            'content_type': response.get('ContentType'),
+            'etag': response.get('ETag', '').strip('"')
+        }
+
+    def abort_stale_multipart_uploads(self, older_than_seconds: int = 86400) -> int:
+        """
+        中止早于指定时间发起、仍未完成的分片上传
+        进程被强制结束时s3transfer来不及中止分片上传，已上传的分片会一直占用（并计费）存储空间
+
+        Args:
+            older_than_seconds: 只处理发起时间早于该秒数之前的上传，避免中止正在进行的上传
+
+        Returns:
+            int: 中止的上传数量
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+        aborted = 0
+        paginator = self.s3_client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'] >= cutoff:
+                    continue
+                try:
+                    self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=upload['Key'], UploadId=upload['UploadId']
+                    )
+                    aborted += 1
+                except self.ClientError as e:
+                    print(f"Error aborting multipart upload {upload['Key']}: {e}")
+        return aborted
+
+    def file_exists(self, file_path: str) -> bool:
+        return self.head_file(file_path) is not None
+
+    def path_from_url(self, url: str) -> Optional[str]:
+        prefix = self.get_file_url('')
+        if url.startswith(prefix) and len(url) > len(prefix):
+            return url[len(prefix):]
+        return None
+
+    def open_file(self, file_path: str) -> BinaryIO:
+        return self.s3_client.get_object(Bucket=self.bucket_name, Key=file_path)['Body']
+
     def delete_file(self, file_path: str) -> bool:
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=file_path)
@@ -246,6 +658,27 @@ class S3StorageBackend(StorageBackend):
         except Exception:
             return False
 
+    def delete_files(self, file_paths: Iterable[str]) -> List[str]:
+        """用DeleteObjects批量删除，每个请求最多1000个键"""
+        file_paths = list(dict.fromkeys(file_paths))
+        deleted = []
+        for start in range(0, len(file_paths), DELETE_OBJECTS_MAX_KEYS):
+            batch = file_paths[start:start + DELETE_OBJECTS_MAX_KEYS]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+            except self.ClientError as e:
+                print(f"Error deleting {len(batch)} objects: {e}")
+                continue
+            # Quiet模式只返回失败的键（不存在的键也算删除成功）
+            failed = {error['Key'] for error in response.get('Errors', [])}
+            for error in response.get('Errors', [])[:5]:
+                print(f"Error deleting object {error['Key']}: {error.get('Code')} {error.get('Message')}")
+            deleted.extend(key for key in batch if key not in failed)
+        return deleted
+
     def get_file_url(self, file_path: str) -> str:
         if self.cdn_url:
             return f"{self.cdn_url.rstrip('/')}/{file_path}"
@@ -264,21 +697,45 @@ class S3StorageBackend(StorageBackend):
 class StorageService:
     """存储服务统一接口"""
 
-    def __init__(self, backend: StorageBackend):
+    def __init__(self, backend: StorageBackend, url_cache_size: int = 10000):
         self.backend = backend
+        if isinstance(backend, S3StorageBackend):
+            # S3的URL只由file_path和后端配置决定，按file_path缓存（lru_cache是线程安全的）
+            self._file_url = lru_cache(maxsize=url_cache_size)(backend.get_file_url)
+        else:
+            # 本地存储的旧布局路径要检查文件是否已被 `flask storage reshard` 移动，不能缓存
+            self._file_url = backend.get_file_url
 
     def upload_file(self, file_data: BinaryIO, filename: str,
-                   content_type: str, folder: str = "") -> Dict[str, Any]:
+                   content_type: str, folder: str = "",
+                   progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """上传文件"""
-        return self.backend.upload_file(file_data, filename, content_type, folder)
+        return self.backend.upload_file(file_data, filename, content_type, folder, progress_callback)
 
     def delete_file(self, file_path: str) -> bool:
         """删除文件"""
         return self.backend.delete_file(file_path)
 
+    def delete_files(self, file_paths: Iterable[str]) -> List[str]:
+        """批量删除文件，返回实际删除的路径"""
+        return self.backend.delete_files(file_paths)
+
     def get_file_url(self, file_path: str) -> str:
         """获取文件URL"""
-        return self.backend.get_file_url(file_path)
+        return self._file_url(file_path)
+
+    def put_file(self, file_data: BinaryIO, relative_path: str, content_type: str,
+                 progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """按指定路径保存文件"""
+        return self.backend.put_file(file_data, relative_path, content_type, progress_callback)
+
+    def file_exists(self, file_path: str) -> bool:
+        """文件是否存在"""
+        return self.backend.file_exists(file_path)
+
+    def open_file(self, file_path: str) -> BinaryIO:
+        """打开已存储的文件"""
+        return self.backend.open_file(file_path)
 
 
 def create_storage_service(storage_config: Dict[str, Any]) -> StorageService:
@@ -296,7 +753,8 @@ def create_storage_service(storage_config: Dict[str, Any]) -> StorageService:
     if storage_type == 'local':
         return StorageService(LocalStorageBackend(
             upload_folder=storage_config.get('upload_folder', 'app/static/uploads'),
-            base_url=storage_config.get('base_url')
+            base_url=storage_config.get('base_url'),
+            layout=storage_config.get('layout', 'sharded')
         ))
     elif storage_type == 's3':
         return StorageService(S3StorageBackend(
@@ -305,7 +763,38 @@ def create_storage_service(storage_config: Dict[str, Any]) -> StorageService:
             secret_key=storage_config['secret_key'],
             bucket_name=storage_config['bucket_name'],
             region=storage_config.get('region'),
-            cdn_url=storage_config.get('cdn_url')
+            cdn_url=storage_config.get('cdn_url'),
+            max_pool_connections=storage_config.get('max_pool_connections', 50),
+            multipart_threshold=storage_config.get('multipart_threshold', 8 * 1024 * 1024),
+            multipart_chunksize=storage_config.get('multipart_chunksize', 8 * 1024 * 1024),
+            max_concurrency=storage_config.get('max_concurrency', 10)
         ))
     else:
-        raise ValueError(f"不支持的存储类型: {storage_type}")
\ No newline at end of file
+        raise ValueError(f"不支持的存储类型: {storage_type}")
+
+
+_service_lock = threading.Lock()
+
+
+def get_storage_service(app=None) -> StorageService:
+    """
+    获取应用级的存储服务（每个应用一个实例，第一次使用时按STORAGE_CONFIG创建）
+
+    Args:
+        app: Flask应用，默认为current_app
+
+    Returns:
+        StorageService: 存储服务实例
+    """
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+
+    service = app.extensions.get('storage_service')
+    if service is None:
+        with _service_lock:
+            service = app.extensions.get('storage_service')
+            if service is None:
+                service = create_storage_service(app.config['STORAGE_CONFIG'])
+                app.extensions['storage_service'] = service
+    return service
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+孤立上传清理
+编辑器上传的附件在保存页面时才关联到页面（page_id），放弃编辑会留下 page_id 为空的附件；
+过期或达到下载次数上限的分享也不再能访问。`flask storage gc-uploads` 定期删除这些记录，
+并批量删除存储中的文件（S3每个DeleteObjects请求最多1000个键）及其衍生图
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from app import db
+from app.models.share import S3Share
+from app.models.storage import StoredImage
+from app.models.user import User, AVATAR_SIZES
+from app.models.wiki import Attachment
+from app.services.storage_service import DELETE_OBJECTS_MAX_KEYS
+
+# 头像附件的描述（见 user.upload_avatar_file），当前仍被用户使用的头像不是孤立附件
+AVATAR_DESCRIPTION_PREFIX = 'Avatar for '
+
+
+class UploadGC:
+    """孤立上传清理"""
+
+    @staticmethod
+    def orphan_attachments_query(cutoff):
+        """未关联页面、早于cutoff上传且没有评论的附件（使用 ix_attachments_page_uploaded）"""
+        return Attachment.query.filter(
+            Attachment.page_id.is_(None),
+            Attachment.uploaded_at < cutoff,
+            Attachment.comment_count == 0
+        )
+
+    @staticmethod
+    def stale_shares_query(cutoff):
+        """早于cutoff过期的分享，以及达到下载次数上限且cutoff之后没有更新的分享"""
+        return S3Share.query.filter(or_(
+            S3Share.expires_at < cutoff,
+            db.and_(
+                S3Share.max_downloads.isnot(None),
+                S3Share.download_count >= S3Share.max_downloads,
+                S3Share.updated_at < cutoff
+            )
+        ))
+
+    @staticmethod
+    def derived_paths(file_path, is_avatar=False):
+        """文件的衍生图路径（响应式图片档位、头像尺寸），随原文件一起删除"""
+        from app.services.avatar_service import AvatarService
+        from app.services.image_service import ImageDerivativeService
+
+        if not ImageDerivativeService.is_resizable(file_path):
+            return []
+        paths = [ImageDerivativeService.variant_path(file_path, width) for width in ImageDerivativeService.widths()]
+        if is_avatar:
+            paths.extend(AvatarService.size_path(file_path, size) for size in AVATAR_SIZES)
+        return paths
+
+    @staticmethod
+    def _avatar_paths(storage_service):
+        """用户当前使用的头像文件路径"""
+        paths = set()
+        for (avatar,) in db.session.query(User.avatar).filter(User.avatar.isnot(None), User.avatar != ''):
+            path = storage_service.backend.path_from_url(avatar.strip())
+            if path:
+                paths.add(path)
+        return paths
+
+    @staticmethod
+    def _shared_paths(paths, attachment_ids=(), share_ids=()):
+        """仍被其他附件/分享引用的文件路径（使用file_path索引）"""
+        if not paths:
+            return set()
+        shared = {path for (path,) in db.session.query(Attachment.file_path).filter(
+            Attachment.file_path.in_(paths), Attachment.id.notin_(list(attachment_ids) or [0]))}
+        shared.update(path for (path,) in db.session.query(S3Share.file_path).filter(
+            S3Share.file_path.in_(paths), S3Share.id.notin_(list(share_ids) or [0])))
+        return shared
+
+    @staticmethod
+    def collect(storage_service, older_than_hours=24, batch_size=500, dry_run=False):
+        """
+        删除孤立附件和失效分享
+        去重存储的文件（blob_id）只释放引用，由 `flask storage gc` 在引用数为0后删除
+        :param storage_service: 存储服务
+        :param older_than_hours: 只处理早于该小时数上传（或过期）的记录
+        :param batch_size: 每批处理的记录数（不超过1000）
+        :param dry_run: 只统计，不删除
+        :return: {'attachments', 'shares', 'files', 'bytes', 'released_blobs'}
+        """
+        batch_size = min(batch_size, DELETE_OBJECTS_MAX_KEYS)
+        cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+        report = {'attachments': 0, 'shares': 0, 'files': 0, 'bytes': 0, 'released_blobs': 0}
+        avatar_paths = UploadGC._avatar_paths(storage_service)
+
+        last_id = 0
+        while True:
+            attachments = UploadGC.orphan_attachments_query(cutoff).filter(
+                Attachment.id > last_id
+            ).order_by(Attachment.id).limit(batch_size).all()
+            if not attachments:
+                break
+            last_id = attachments[-1].id
+            attachments = [attachment for attachment in attachments if attachment.file_path not in avatar_paths]
+            UploadGC._delete_batch(storage_service, attachments, report, 'attachments', dry_run)
+
+        last_id = 0
+        while True:
+            shares = UploadGC.stale_shares_query(cutoff).filter(
+                S3Share.id > last_id
+            ).order_by(S3Share.id).limit(batch_size).all()
+            if not shares:
+                break
+            last_id = shares[-1].id
+            UploadGC._delete_batch(storage_service, shares, report, 'shares', dry_run)
+
+        return report
+
+    @staticmethod
+    def _delete_batch(storage_service, records, report, kind, dry_run):
+        """删除一批记录（先提交数据库，再删除文件），并累计到report"""
+        if not records:
+            return
+
+        is_attachment = kind == 'attachments'
+        ids = [record.id for record in records]
+        files = {}  # {原文件路径: (大小, 是否头像)}
+        for record in records:
+            if record.blob_id:
+                report['released_blobs'] += 1
+            elif record.file_path:
+                is_avatar = is_attachment and (record.description or '').startswith(AVATAR_DESCRIPTION_PREFIX)
+                files[record.file_path] = (record.file_size or 0, is_avatar)
+
+        shared = UploadGC._shared_paths(
+            list(files),
+            attachment_ids=ids if is_attachment else (),
+            share_ids=() if is_attachment else ids
+        )
+        for path in shared:
+            files.pop(path, None)
+
+        report[kind] += len(records)
+        if dry_run:
+            report['files'] += len(files)
+            report['bytes'] += sum(size for size, _ in files.values())
+            db.session.expunge_all()
+            return
+
+        try:
+            for record in records:
+                db.session.delete(record)
+            if files:
+                StoredImage.query.filter(StoredImage.file_path.in_(list(files))).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            report[kind] -= len(records)
+            print(f"Error deleting {kind} {ids[0]}-{ids[-1]}: {e}")
+            return
+
+        deleted = set(storage_service.delete_files(list(files)))
+        report['files'] += len(deleted)
+        report['bytes'] += sum(size for path, (size, _) in files.items() if path in deleted)
+
+        derived = [derived_path for path, (_, is_avatar) in files.items()
+                   for derived_path in UploadGC.derived_paths(path, is_avatar)]
+        if derived:
+            storage_service.delete_files(derived)
+        db.session.expunge_all()
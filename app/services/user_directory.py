@@ -0,0 +1,205 @@
+"""
+用户目录（@提及自动补全）
+在内存中维护活跃用户的用户名、姓名、邮箱前缀和中文姓名拼音的有序索引，
+按前缀二分查找，结果按最近活跃时间排序，头像URL在建索引时预先计算；
+本进程内用户的新增/修改在提交后增量更新，其他进程的修改在TTL到期重建时生效
+"""
+
+from bisect import bisect_left, insort
+from datetime import datetime
+import heapq
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装pypinyin时不索引拼音
+    lazy_pinyin = None
+
+
+def _has_chinese(text):
+    return any('一' <= char <= '鿿' for char in text)
+
+
+def _search_keys(username, name, email):
+    """生成用户的全部前缀检索键（小写）"""
+    keys = set()
+    if username:
+        keys.add(username.lower())
+    if email:
+        keys.add(email.split('@', 1)[0].lower())
+    if name:
+        name = name.strip().lower()
+        keys.add(name)
+        keys.update(part for part in name.split() if part)
+        if lazy_pinyin and _has_chinese(name):
+            syllables = [s for s in lazy_pinyin(name) if s.strip()]
+            keys.add(''.join(syllables))
+            keys.add(''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).replace(' ', ''))
+    keys.discard('')
+    return keys
+
+
+class UserDirectory:
+    """活跃用户的前缀索引"""
+
+    def __init__(self, app=None):
+        self.ttl = 600
+        self._entries = {}
+        self._index = []  # [(检索键, 用户ID)]，按检索键排序
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """初始化用户目录"""
+        self.ttl = app.config.get('USER_DIRECTORY_TTL', 600)
+        with self._lock:
+            self._entries = {}
+            self._index = []
+            self._loaded_at = None
+
+    @staticmethod
+    def _snapshot(user):
+        return {
+            'id': user.id,
+            'username': user.username,
+            'name': user.name,
+            'email': user.email,
+            'is_active': user.is_active is not False,
+            'last_seen': user.last_seen or datetime.min,
+            'avatar': user.get_avatar(size=40) if user.avatar or user.avatar_hash or user.email else None,
+        }
+
+    def _add(self, entry):
+        if not entry['is_active']:
+            return
+        entry['keys'] = _search_keys(entry['username'], entry['name'], entry['email'])
+        entry['avatar'] = entry['avatar'] or '/static/img/default-avatar.png'
+        self._entries[entry['id']] = entry
+        for key in entry['keys']:
+            insort(self._index, (key, entry['id']))
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if not entry:
+            return
+        for key in entry['keys']:
+            position = bisect_left(self._index, (key, user_id))
+            if position < len(self._index) and self._index[position] == (key, user_id):
+                del self._index[position]
+
+    def rebuild(self):
+        """从数据库重建整个索引"""
+        users = User.query.filter(User.is_active == True).all()
+        entries = [self._snapshot(user) for user in users]
+        with self._lock:
+            self._entries = {}
+            self._index = []
+            for entry in entries:
+                entry['keys'] = _search_keys(entry['username'], entry['name'], entry['email'])
+                entry['avatar'] = entry['avatar'] or '/static/img/default-avatar.png'
+                self._entries[entry['id']] = entry
+                self._index.extend((key, entry['id']) for key in entry['keys'])
+            self._index.sort()
+            self._loaded_at = time.monotonic()
+
+    def apply(self, snapshots):
+        """
+        增量更新用户（提交后调用）
+        :param snapshots: {user_id: 快照或None（已删除）}
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for user_id, snapshot in snapshots.items():
+                current = self._entries.get(user_id)
+                if snapshot and snapshot['is_active'] and current and current['keys'] == _search_keys(
+                        snapshot['username'], snapshot['name'], snapshot['email']):
+                    # 只有活跃时间/头像变化（如每次请求的ping），不需要改动索引
+                    current.update(last_seen=snapshot['last_seen'],
+                                   avatar=snapshot['avatar'] or '/static/img/default-avatar.png')
+                    continue
+                self._remove(user_id)
+                if snapshot:
+                    self._add(dict(snapshot))
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.rebuild()
+
+    def search(self, query, limit=10):
+        """
+        按前缀查找用户
+        :param query: 查询前缀，为空时返回最近活跃的用户
+        :param limit: 最多返回数量
+        :return: 用户字典列表，按最近活跃时间倒序
+        """
+        self._ensure_loaded()
+        prefix = (query or '').strip().lower()
+
+        with self._lock:
+            if not prefix:
+                candidates = self._entries.values()
+            else:
+                user_ids = set()
+                position = bisect_left(self._index, (prefix,))
+                while position < len(self._index) and self._index[position][0].startswith(prefix):
+                    user_ids.add(self._index[position][1])
+                    position += 1
+                candidates = [self._entries[user_id] for user_id in user_ids]
+
+            top = heapq.nlargest(limit, candidates, key=lambda entry: (entry['last_seen'], entry['id']))
+
+        return [
+            {
+                'id': entry['id'],
+                'username': entry['username'],
+                'name': entry['name'] or entry['username'],
+                'email': entry['email'],
+                'avatar': entry['avatar']
+            }
+            for entry in top
+        ]
+
+
+user_directory = UserDirectory()
+
+
+# 用户变更先记录在会话上，提交成功后再更新索引，回滚时丢弃
+_PENDING_KEY = 'user_directory_pending'
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def _on_user_changed(mapper, connection, target):
+    from sqlalchemy.orm import object_session
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, {})[target.id] = UserDirectory._snapshot(target)
+
+
+@event.listens_for(User, 'after_delete')
+def _on_user_deleted(mapper, connection, target):
+    from sqlalchemy.orm import object_session
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, {})[target.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        user_directory.apply(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
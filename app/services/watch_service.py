@@ -1,11 +1,23 @@
 from flask_login import current_user
 from app import db
-from app.models import Watch, WatchNotification, WatchTargetType, WatchEventType
+from app.models import Watch, WatchNotification, WatchTargetType, WatchEventType, WatchEventOutbox
 from app.models.user import User
 from app.models.wiki import Page, Category, Attachment
+from app.services.outbox import OutboxWorker
+from app.services.bulk import batched_update, batched_delete
+from app.pagination import paginate
+from app.services.notification_counter import unread_counter
+from app.services.notification_stream import notification_hub
 from datetime import datetime, timedelta
 import json
 
+
+def _chunks(items, size=500):
+    """按固定大小切分列表，避免IN子句参数过多"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 class WatchService:
     """Watch功能服务类"""
 
@@ -149,7 +161,71 @@ class WatchService:
         if unread_only:
             query = query.filter_by(is_read=False)
 
-        return query.order_by(WatchNotification.created_at.desc()).limit(limit).all()
+        return query.order_by(WatchNotification.created_at.desc(), WatchNotification.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def get_notifications_page(user_id, unread_only=False, limit=50, cursor=None, with_total=False):
+        """
+        游标分页获取用户的通知
+        :param user_id: 用户ID
+        :param unread_only: 是否只获取未读通知
+        :param limit: 每页数量
+        :param cursor: 上一页返回的next_cursor
+        :param with_total: 是否返回总数
+        :return: (WatchNotification列表, 分页元数据)
+        """
+        query = WatchNotification.query.filter_by(user_id=user_id)
+
+        if unread_only:
+            query = query.filter_by(is_read=False)
+
+        return paginate(
+            query, WatchNotification, per_page=limit, cursor=cursor, with_total=with_total,
+            count_key=f'notifications:{user_id}:{int(unread_only)}'
+        )
+
+    @staticmethod
+    def get_grouped_notifications(user_id, unread_only=False, limit=50):
+        """
+        按目标分组获取用户的通知，同一页面/分类的多条通知合并为一组
+        :param user_id: 用户ID
+        :param unread_only: 是否只获取未读通知
+        :param limit: 分组数量限制
+        :return: 分组字典列表，按最新通知时间倒序
+        """
+        query = db.session.query(
+            WatchNotification.target_type,
+            WatchNotification.target_id,
+            db.func.count(WatchNotification.id),
+            db.func.sum(db.case((WatchNotification.is_read == False, 1), else_=0)),
+            db.func.max(WatchNotification.id)
+        ).filter(WatchNotification.user_id == user_id)
+
+        if unread_only:
+            query = query.filter(WatchNotification.is_read == False)
+
+        groups = query.group_by(
+            WatchNotification.target_type, WatchNotification.target_id
+        ).order_by(db.func.max(WatchNotification.id).desc()).limit(limit).all()
+
+        # 每组的最新一条通知一次查询取回
+        latest_ids = [latest_id for (_, _, _, _, latest_id) in groups]
+        latest = {
+            notification.id: notification
+            for notification in WatchNotification.query.filter(WatchNotification.id.in_(latest_ids))
+        } if latest_ids else {}
+
+        return [
+            {
+                'target_type': target_type.value,
+                'target_id': target_id,
+                'count': count,
+                'unread_count': int(unread_count or 0),
+                'latest': latest[latest_id].to_dict(),
+            }
+            for (target_type, target_id, count, unread_count, latest_id) in groups
+            if latest_id in latest
+        ]
 
     @staticmethod
     def mark_notification_read(notification_id, user_id):
@@ -166,8 +242,12 @@ class WatchService:
             ).first()
 
             if notification:
+                was_unread = not notification.is_read
                 notification.mark_as_read()
                 db.session.commit()
+                if was_unread:
+                    unread_counter.decr(user_id)
+                    notification_hub.publish([user_id], notification_hub.KIND_UNREAD)
                 return True
             return False
 
@@ -177,24 +257,23 @@ class WatchService:
             return False
 
     @staticmethod
-    def mark_all_notifications_read(user_id):
+    def mark_all_notifications_read(user_id, batch_size=1000):
         """
-        标记用户所有通知为已读
+        标记用户所有通知为已读（分批集合式UPDATE，不加载通知行）
         :param user_id: 用户ID
+        :param batch_size: 每批行数
         :return: int - 标记为已读的通知数量
         """
         try:
-            unread_notifications = WatchNotification.query.filter_by(
-                user_id=user_id,
-                is_read=False
-            ).all()
-
-            count = 0
-            for notification in unread_notifications:
-                notification.mark_as_read()
-                count += 1
+            count = batched_update(
+                WatchNotification,
+                [WatchNotification.user_id == user_id, WatchNotification.is_read == False],
+                {WatchNotification.is_read: True, WatchNotification.read_at: datetime.utcnow()},
+                batch_size=batch_size
+            )
 
-            db.session.commit()
+            unread_counter.set(user_id, 0)
+            notification_hub.publish([user_id], notification_hub.KIND_UNREAD)
             return count
 
         except Exception as e:
@@ -203,7 +282,8 @@ class WatchService:
             return 0
 
     @staticmethod
-    def create_notification(watch, event_type, target_type, target_id, actor_id=None, extra_data=None):
+    def create_notification(watch, event_type, target_type, target_id, actor_id=None, extra_data=None,
+                            idempotency_key=None):
         """
         创建通知
         :param watch: Watch对象
@@ -212,6 +292,7 @@ class WatchService:
         :param target_id: 目标ID
         :param actor_id: 触发事件的用户ID
         :param extra_data: 额外数据
+        :param idempotency_key: 通知幂等键，重复投递同一事件时避免重复创建
         :return: WatchNotification对象或None
         """
         try:
@@ -221,26 +302,21 @@ class WatchService:
                 event_type=event_type,
                 target_type=target_type,
                 target_id=target_id,
-                actor_id=actor_id
+                actor_id=actor_id,
+                idempotency_key=idempotency_key
             )
 
             # 生成标题和消息
             notification.generate_title_and_message()
 
             db.session.add(notification)
-            db.session.commit()
+            db.session.flush()
 
-            # 获取用户信息并异步发送邮件通知
-            try:
-                from threading import Thread
-                user = notification.user
-                if user and user.email:
-                    # 启动后台线程发送邮件，避免阻塞
-                    Thread(target=WatchService._send_watch_notification_email,
-                          args=(notification.id, user.id)).start()
-            except Exception as e:
-                print(f"Error starting watch notification email: {e}")
-                # 不影响通知创建，只记录错误
+            # 邮件与通知在同一事务中写入发件箱
+            WatchService.enqueue_notification_emails([notification.id])
+            db.session.commit()
+            unread_counter.incr(notification.user_id)
+            notification_hub.publish([notification.user_id])
 
             return notification
 
@@ -250,175 +326,479 @@ class WatchService:
             return None
 
     @staticmethod
-    def _send_watch_notification_email(notification_id, user_id):
+    def enqueue_notification_emails(notification_ids):
         """
-        异步发送watch通知邮件的内部方法
-        :param notification_id: 通知ID
-        :param user_id: 用户ID
+        将一批通知的邮件写入发件箱（随当前会话一起提交），由 `flask mail worker` 发送
+        :param notification_ids: 通知ID列表
+        :return: 加入发件箱的邮件数量
         """
-        try:
-            from app import mail, create_app
-            from flask_mail import Message
-            from app.models import WatchNotification, User
-
-            # 创建新的应用上下文（因为这是在后台线程中运行）
-            app = create_app()
-            with app.app_context():
-                # 重新获取通知和用户信息
-                notification = WatchNotification.query.get(notification_id)
-                user = User.query.get(user_id)
-
-                if not notification or not user or not user.email:
-                    return
-
-                # 检查邮件是否已发送
-                if notification.is_sent:
-                    return
-
-                # 创建邮件内容
-                site_url = app.config.get('SITE_URL', 'http://localhost:5001')
-
-                # URL部分（如果存在）
-                url_section = ''
-                if notification.url:
-                    url_section = f'''
-                    <p style="margin-top: 15px;">
-                        <a href="{site_url}{notification.url}"
-                           style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px; display: inline-block;">
-                            查看详情
-                        </a>
-                    </p>
-                    '''
-
-                url_section_text = ''
-                if notification.url:
-                    url_section_text = f'查看详情: {site_url}{notification.url}'
-
-                email_html = f'''
-                <h2>Enterprise Wiki 通知</h2>
-                <p>你好 {user.name or user.username},</p>
-
-                <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3 style="color: #495057; margin-top: 0;">{notification.title}</h3>
-                    <p style="color: #6c757d; line-height: 1.5;">{notification.message}</p>
-                    {url_section}
-                </div>
-
-                <p style="color: #6c757d; font-size: 14px;">
-                    此邮件由 Enterprise Wiki 系统自动发送。<br>
-                    如不想接收此类通知，请访问<a href="{site_url}/profile">个人设置</a>管理通知偏好。
-                </p>
-                '''
-
-                email_text = f'''
-                Enterprise Wiki 通知
-
-                你好 {user.name or user.username},
-
-                {notification.title}
-                {notification.message}
-
-                {url_section_text}
-
-                此邮件由 Enterprise Wiki 系统自动发送。
-                如不想接收此类通知，请访问 {site_url}/profile 管理通知偏好。
-                '''
-
-                msg = Message(
-                    subject=f'Enterprise Wiki: {notification.title}',
-                    sender=app.config.get('MAIL_SENDER', 'noreply@enterprise-wiki.com'),
-                    recipients=[user.email],
-                    html=email_html,
-                    body=email_text
-                )
+        from sqlalchemy.orm import joinedload
+        from app.services.mail_service import MailService
+
+        rows = []
+        for chunk in _chunks(list(notification_ids)):
+            notifications = WatchNotification.query.options(joinedload(WatchNotification.user)).filter(
+                WatchNotification.id.in_(chunk),
+                WatchNotification.is_sent == False
+            ).all()
+            for notification in notifications:
+                user = notification.user
+                if not user or not user.email or not user.should_receive_notification('watch'):
+                    continue
+                # 选择摘要的用户由 `flask watch digest` 合并发送
+                if user.get_digest_frequency() != User.DIGEST_IMMEDIATE:
+                    continue
+                rows.append(WatchService._build_watch_notification_email(notification, user))
 
-                mail.send(msg)
+        return MailService.enqueue_many(rows)
 
-                # 标记邮件已发送
-                notification.is_sent = True
-                db.session.commit()
+    @staticmethod
+    def _build_watch_notification_email(notification, user):
+        """构建watch通知邮件的发件箱行数据"""
+        from flask import current_app
+        from app.services.mail_service import MailService
+
+        site_url = current_app.config.get('SITE_URL', 'http://localhost:5001')
+
+        # URL部分（如果存在）
+        url_section = ''
+        if notification.url:
+            url_section = f'''
+            <p style="margin-top: 15px;">
+                <a href="{site_url}{notification.url}"
+                   style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px; display: inline-block;">
+                    查看详情
+                </a>
+            </p>
+            '''
+
+        url_section_text = ''
+        if notification.url:
+            url_section_text = f'查看详情: {site_url}{notification.url}'
+
+        email_html = f'''
+        <h2>Enterprise Wiki 通知</h2>
+        <p>你好 {user.name or user.username},</p>
+
+        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
+            <h3 style="color: #495057; margin-top: 0;">{notification.title}</h3>
+            <p style="color: #6c757d; line-height: 1.5;">{notification.message}</p>
+            {url_section}
+        </div>
+
+        <p style="color: #6c757d; font-size: 14px;">
+            此邮件由 Enterprise Wiki 系统自动发送。<br>
+            如不想接收此类通知，请访问<a href="{site_url}/profile">个人设置</a>管理通知偏好。
+        </p>
+        '''
+
+        email_text = f'''
+        Enterprise Wiki 通知
+
+        你好 {user.name or user.username},
+
+        {notification.title}
+        {notification.message}
+
+        {url_section_text}
+
+        此邮件由 Enterprise Wiki 系统自动发送。
+        如不想接收此类通知，请访问 {site_url}/profile 管理通知偏好。
+        '''
+
+        return MailService.build_row(
+            recipient=user.email,
+            subject=f'Enterprise Wiki: {notification.title}',
+            html=email_html,
+            body=email_text,
+            source_type='watch_notification',
+            source_id=notification.id
+        )
 
-        except Exception as e:
-            print(f"Error sending watch notification email (notification_id={notification_id}): {e}")
-            # 不影响主流程，只记录错误
+    @staticmethod
+    def send_digests(frequency, batch_size=200):
+        """
+        为选择摘要的用户合并发送通知邮件：每个用户每个周期一封
+        周期内尚未发送邮件的通知按目标分组渲染为一封摘要，邮件写入发件箱，
+        通知在同一事务中标记为已发送，重复运行不会重复发送
+        :param frequency: 摘要频率（hourly / daily），由定时任务按对应周期调用
+        :param batch_size: 每批处理的用户数
+        :return: 加入发件箱的摘要邮件数量
+        """
+        from collections import OrderedDict
+        from app.services.mail_service import MailService
+
+        if frequency not in (User.DIGEST_HOURLY, User.DIGEST_DAILY):
+            raise ValueError(f'Invalid digest frequency: {frequency}')
+
+        cutoff = datetime.utcnow()
+        user_ids = [
+            user_id for (user_id,) in db.session.query(WatchNotification.user_id).join(
+                User, User.id == WatchNotification.user_id
+            ).filter(
+                User.notification_digest == frequency,
+                WatchNotification.is_sent == False,
+                WatchNotification.created_at <= cutoff
+            ).distinct()
+        ]
+
+        queued = 0
+        for chunk in _chunks(user_ids, batch_size):
+            users = {user.id: user for user in User.query.filter(User.id.in_(chunk))}
+            notifications = WatchNotification.query.filter(
+                WatchNotification.user_id.in_(chunk),
+                WatchNotification.is_sent == False,
+                WatchNotification.created_at <= cutoff
+            ).order_by(WatchNotification.created_at).all()
+
+            by_user = OrderedDict()
+            for notification in notifications:
+                by_user.setdefault(notification.user_id, []).append(notification)
+
+            rows = []
+            for user_id, user_notifications in by_user.items():
+                user = users.get(user_id)
+                if user and user.email and user.should_receive_notification('watch'):
+                    rows.append(WatchService._build_digest_email(user, user_notifications, frequency))
+
+            # 无论是否发送邮件都标记为已处理，避免通知在下个周期重复进入摘要
+            notification_ids = [notification.id for notification in notifications]
+            for id_chunk in _chunks(notification_ids):
+                WatchNotification.query.filter(WatchNotification.id.in_(id_chunk)).update(
+                    {WatchNotification.is_sent: True}, synchronize_session=False
+                )
+            queued += MailService.enqueue_many(rows)
+            db.session.commit()
+
+        return queued
 
     @staticmethod
-    def trigger_event(event_type, target_type, target_id, actor_id=None):
+    def _build_digest_email(user, notifications, frequency):
+        """构建通知摘要邮件的发件箱行数据，同一目标的通知合并为一条"""
+        from html import escape
+        from flask import current_app
+        from app.services.mail_service import MailService
+
+        site_url = current_app.config.get('SITE_URL', 'http://localhost:5001')
+        period = '每小时' if frequency == User.DIGEST_HOURLY else '每日'
+
+        groups = {}
+        for notification in notifications:
+            key = (notification.target_type, notification.target_id)
+            group = groups.setdefault(key, {'count': 0, 'latest': notification})
+            group['count'] += 1
+            group['latest'] = notification
+
+        items_html = []
+        items_text = []
+        for group in sorted(groups.values(), key=lambda g: g['latest'].created_at, reverse=True):
+            latest = group['latest']
+            more = f'（共 {group["count"]} 条更新）' if group['count'] > 1 else ''
+            link = f'{site_url}{latest.url}' if latest.url else None
+            title = escape(latest.title or '')
+            if link:
+                title = f'<a href="{link}">{title}</a>'
+            items_html.append(
+                f'<li style="margin-bottom: 10px;">{title} {more}'
+                f'<br><span style="color: #6c757d;">{escape(latest.message or "")}</span></li>'
+            )
+            items_text.append(f'- {latest.title} {more}'.rstrip())
+            if link:
+                items_text.append(f'  {link}')
+
+        email_html = f'''
+        <h2>Enterprise Wiki {period}通知摘要</h2>
+        <p>你好 {user.name or user.username},</p>
+        <p>你关注的内容有 {len(notifications)} 条新动态：</p>
+        <ul>{''.join(items_html)}</ul>
+        <p style="color: #6c757d; font-size: 14px;">
+            此邮件由 Enterprise Wiki 系统自动发送。<br>
+            如需调整摘要频率，请访问<a href="{site_url}/profile/notifications">通知设置</a>。
+        </p>
+        '''
+
+        email_text = '\n'.join([
+            f'Enterprise Wiki {period}通知摘要',
+            '',
+            f'你好 {user.name or user.username},',
+            '',
+            f'你关注的内容有 {len(notifications)} 条新动态：',
+            *items_text,
+            '',
+            f'如需调整摘要频率，请访问 {site_url}/profile/notifications',
+        ])
+
+        return MailService.build_row(
+            recipient=user.email,
+            subject=f'Enterprise Wiki: {period}通知摘要（{len(notifications)} 条新动态）',
+            html=email_html,
+            body=email_text
+        )
+
+    @staticmethod
+    def trigger_event(event_type, target_type, target_id, actor_id=None, event_key=None):
         """
         触发事件，创建相关通知
         :param event_type: 事件类型
         :param target_type: 目标类型
         :param target_id: 目标ID
         :param actor_id: 触发事件的用户ID
+        :param event_key: 事件幂等键（来自发件箱），用于生成通知幂等键
         :return: 创建的通知数量
         """
         try:
-            notifications_created = 0
-            watches = []  # 初始化watches列表
-
-            if target_type == WatchTargetType.PAGE:
-                # 页面相关事件
-                watches = Watch.find_watches_for_event(target_type, target_id, event_type)
-
-                # 如果是页面创建事件，还要检查页面所在分类的watch
-                if event_type == WatchEventType.PAGE_CREATED:
-                    page = Page.query.get(target_id)
-                    if page and page.category_id:
-                        category_watches = Watch.find_watches_for_category_event(
-                            page.category_id, event_type
-                        )
-                        watches.extend(category_watches)
-
-            elif target_type == WatchTargetType.CATEGORY:
-                # 分类相关事件
-                watches = Watch.find_watches_for_category_event(target_id, event_type)
-
-            # 为每个watch创建通知
-            for watch in watches:
-                # 不给触发事件的人自己发通知
-                if watch.user_id != actor_id:
-                    notification = WatchService.create_notification(
-                        watch, event_type, target_type, target_id, actor_id
-                    )
-                    if notification:
-                        notifications_created += 1
-
-            return notifications_created
+            return WatchService.deliver_event(event_type, target_type, target_id, actor_id, event_key)
 
         except Exception as e:
             print(f"Error triggering event: {e}")
             return 0
 
+    @staticmethod
+    def find_watches(event_type, target_type, target_id):
+        """
+        查找需要接收此事件的watch记录
+        :param event_type: 事件类型
+        :param target_type: 目标类型
+        :param target_id: 目标ID
+        :return: Watch列表
+        """
+        if target_type == WatchTargetType.PAGE:
+            # 页面创建事件还要匹配页面所在分类及其父分类的watch，
+            # 分类ID作为子查询传入，整个查找只有一条SQL
+            category_id = None
+            if event_type == WatchEventType.PAGE_CREATED:
+                category_id = db.select(Page.category_id).where(Page.id == target_id).scalar_subquery()
+            return Watch.find_watches_for_event(target_type, target_id, event_type, category_id=category_id)
+
+        elif target_type == WatchTargetType.CATEGORY:
+            # 分类相关事件
+            return Watch.find_watches_for_category_event(target_id, event_type)
+
+        return []
+
+    @staticmethod
+    def deliver_event(event_type, target_type, target_id, actor_id=None, event_key=None):
+        """
+        投递事件：为所有关注者批量创建通知
+        标题和消息每个事件只渲染一次，通知行和邮件发件箱行批量插入并只提交一次。
+        与trigger_event不同，失败时抛出异常，供发件箱worker重试；
+        通知按 "事件幂等键:用户ID" 去重，重复投递是安全的
+        :return: 创建的通知数量
+        """
+        import time
+        import uuid
+        from flask import current_app
+
+        if event_type == WatchEventType.COMMENT_MENTION:
+            return WatchService.deliver_mention_event(target_id, actor_id)
+
+        started = time.perf_counter()
+        event_key = event_key or uuid.uuid4().hex
+
+        watches = WatchService.find_watches(event_type, target_type, target_id)
+
+        # 每个用户只通知一次（同时关注页面和所在分类时），不给触发事件的人自己发通知
+        watch_by_key = {}
+        for watch in watches:
+            if watch.user_id != actor_id:
+                watch_by_key.setdefault(f'{event_key}:{watch.user_id}', watch)
+
+        # 排除上一次投递中途失败前已创建的通知
+        for chunk in _chunks(list(watch_by_key)):
+            delivered = db.session.query(WatchNotification.idempotency_key).filter(
+                WatchNotification.idempotency_key.in_(chunk)
+            )
+            for (key,) in delivered:
+                watch_by_key.pop(key, None)
+
+        if not watch_by_key:
+            return 0
+
+        # 标题和消息与接收者无关，每个事件只渲染一次
+        actor = User.query.get(actor_id) if actor_id else None
+        rendered = WatchNotification.render_event(
+            event_type, target_type, target_id, actor.username if actor else None
+        )
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                'user_id': watch.user_id,
+                'watch_id': watch.id,
+                'event_type': event_type,
+                'target_type': target_type,
+                'target_id': target_id,
+                'actor_id': actor_id,
+                'title': rendered['title'],
+                'message': rendered['message'],
+                'url': rendered['url'],
+                'idempotency_key': key,
+                'is_read': False,
+                'is_sent': False,
+                'created_at': now,
+            }
+            for key, watch in watch_by_key.items()
+        ]
+        db.session.execute(WatchNotification.__table__.insert(), rows)
+
+        # 邮件与通知在同一事务中写入发件箱
+        notification_ids = []
+        for chunk in _chunks(list(watch_by_key)):
+            notification_ids.extend(
+                notification_id for (notification_id,) in db.session.query(WatchNotification.id).filter(
+                    WatchNotification.idempotency_key.in_(chunk)
+                )
+            )
+        emails = WatchService.enqueue_notification_emails(notification_ids)
+        db.session.commit()
+        recipient_ids = [watch.user_id for watch in watch_by_key.values()]
+        unread_counter.adjust_many({user_id: 1 for user_id in recipient_ids})
+        notification_hub.publish(recipient_ids)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        current_app.logger.info(
+            f'Watch fan-out: event={event_type.value} target={target_type.value}:{target_id} '
+            f'key={event_key} recipients={len(rows)} emails={emails} latency_ms={elapsed_ms:.1f}'
+        )
+
+        return len(rows)
+
+    @staticmethod
+    def deliver_mention_event(comment_id, actor_id=None):
+        """
+        投递@提及事件：为评论中尚未通知过的被提及用户批量创建站内通知，并写入提及邮件
+        通知按 "mention:评论ID:用户ID" 去重，编辑评论时只通知新提及的用户，重复投递也是安全的
+        :param comment_id: 评论ID
+        :param actor_id: 评论作者ID
+        :return: 创建的通知数量
+        """
+        from sqlalchemy.orm import selectinload
+        from app.models.comment import Comment, CommentMention
+        from app.services.comment_service import CommentService
+        from app.services.mail_service import MailService
+
+        comment = Comment.query.options(
+            selectinload(Comment.author),
+            selectinload(Comment.mention_list).selectinload(CommentMention.mentioned_user)
+        ).get(comment_id)
+        if not comment or comment.is_deleted:
+            return 0
+
+        mention_by_key = {
+            f'mention:{comment.id}:{mention.mentioned_user_id}': mention
+            for mention in comment.mention_list
+            if mention.mentioned_user
+        }
+        if mention_by_key:
+            delivered = db.session.query(WatchNotification.idempotency_key).filter(
+                WatchNotification.idempotency_key.in_(list(mention_by_key))
+            )
+            for (key,) in delivered:
+                mention_by_key.pop(key, None)
+
+        if not mention_by_key:
+            return 0
+
+        rendered = WatchNotification.render_event(
+            WatchEventType.COMMENT_MENTION, WatchTargetType.PAGE, comment.id,
+            comment.author.username if comment.author else None
+        )
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                'user_id': mention.mentioned_user_id,
+                'watch_id': None,  # 提及通知没有关联的watch记录
+                'event_type': WatchEventType.COMMENT_MENTION,
+                'target_type': WatchTargetType.PAGE,
+                'target_id': comment.id,
+                'actor_id': actor_id,
+                'title': rendered['title'],
+                'message': rendered['message'],
+                'url': rendered['url'],
+                'idempotency_key': key,
+                'is_read': False,
+                'is_sent': False,
+                'created_at': now,
+            }
+            for key, mention in mention_by_key.items()
+        ]
+        db.session.execute(WatchNotification.__table__.insert(), rows)
+
+        # 提及邮件与通知在同一事务中写入发件箱
+        target = CommentService.get_target(comment.target_type, comment.target_id)
+        MailService.enqueue_many([
+            CommentService.build_mention_email(comment, mention, target)
+            for mention in mention_by_key.values()
+            if mention.mentioned_user.email and mention.mentioned_user.should_receive_notification('mention')
+        ])
+        db.session.commit()
+
+        recipient_ids = [mention.mentioned_user_id for mention in mention_by_key.values()]
+        unread_counter.adjust_many({user_id: 1 for user_id in recipient_ids})
+        notification_hub.publish(recipient_ids)
+
+        return len(rows)
+
+    @staticmethod
+    def get_notifications_since(user_id, last_id, limit=50):
+        """
+        获取ID大于last_id的新通知（通知推送和断线重连补发使用）
+        :param user_id: 用户ID
+        :param last_id: 客户端已收到的最后一条通知ID
+        :param limit: 最多返回数量
+        :return: WatchNotification列表，按ID升序
+        """
+        return WatchNotification.query.filter(
+            WatchNotification.user_id == user_id,
+            WatchNotification.id > last_id
+        ).order_by(WatchNotification.id).limit(limit).all()
+
+    @staticmethod
+    def get_latest_notification_id(user_id):
+        """获取用户最新一条通知的ID，没有通知时返回0"""
+        return db.session.query(db.func.max(WatchNotification.id)).filter(
+            WatchNotification.user_id == user_id
+        ).scalar() or 0
+
     @staticmethod
     def get_unread_count(user_id):
         """
-        获取用户未读通知数量
+        获取用户未读通知数量（优先读取缓存计数）
         :param user_id: 用户ID
         :return: 未读通知数量
         """
-        return WatchNotification.query.filter_by(
-            user_id=user_id,
-            is_read=False
-        ).count()
+        return unread_counter.get(user_id)
 
     @staticmethod
-    def cleanup_old_notifications(days_old=30):
+    def cleanup_old_notifications(days_old=30, batch_size=1000):
         """
-        清理旧通知
+        清理旧通知（分批集合式DELETE，不加载通知行）
         :param days_old: 保留天数
+        :param batch_size: 每批行数
         :return: 清理的通知数量
         """
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-            old_notifications = WatchNotification.query.filter(
-                WatchNotification.created_at < cutoff_date
-            ).all()
-
-            count = len(old_notifications)
-            for notification in old_notifications:
-                db.session.delete(notification)
+            unread_user_ids = set()
+
+            def collect_unread_users(ids):
+                # 删除未读通知会改变未读数，记录受影响的用户
+                unread_user_ids.update(user_id for (user_id,) in db.session.query(
+                    WatchNotification.user_id
+                ).filter(
+                    WatchNotification.id.in_(ids),
+                    WatchNotification.is_read == False
+                ).distinct())
+
+            count = batched_delete(
+                WatchNotification,
+                [WatchNotification.created_at < cutoff_date],
+                batch_size=batch_size,
+                on_batch=collect_unread_users
+            )
 
-            db.session.commit()
+            unread_counter.invalidate(*unread_user_ids)
             return count
 
         except Exception as e:
@@ -426,6 +806,22 @@ class WatchService:
             print(f"Error cleaning up old notifications: {e}")
             return 0
 
+    @staticmethod
+    def cleanup_processed_events(days_old=7, batch_size=1000):
+        """
+        清理已投递的watch事件发件箱行（失败的行保留以便排查）
+        :param days_old: 保留天数
+        :param batch_size: 每批行数
+        :return: 清理的事件数量
+        """
+        cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+        return batched_delete(
+            WatchEventOutbox,
+            [WatchEventOutbox.status == WatchEventOutbox.STATUS_DONE,
+             WatchEventOutbox.processed_at < cutoff_date],
+            batch_size=batch_size
+        )
+
 # 便捷函数
 def watch_page(user_id, page_id, events=None):
     """关注页面"""
@@ -447,31 +843,62 @@ def unwatch_category(user_id, category_id):
     """取消关注分类"""
     return WatchService.remove_watch(user_id, WatchTargetType.CATEGORY, category_id)
 
-def process_pending_watch_events():
+def enqueue_watch_event(event_type, target_type, target_id, actor_id=None):
     """
-    处理待处理的watch事件
-    这个函数应该在请求处理完成后调用，避免数据库会话冲突
+    将watch事件加入发件箱（随当前会话一起提交）
+    mapper事件之外的调用方（如评论）使用此函数，与业务数据在同一次commit中落库
     """
-    try:
-        from flask import current_app
-        if not hasattr(current_app, '_pending_watch_events'):
-            return 0
+    event = WatchEventOutbox(**WatchEventOutbox.build_row(event_type, target_type, target_id, actor_id))
+    db.session.add(event)
+    return event
 
-        pending_events = current_app._pending_watch_events.copy()
-        current_app._pending_watch_events = []
 
-        total_notifications = 0
-        for event in pending_events:
-            notifications_created = WatchService.trigger_event(
-                event_type=event['event_type'],
-                target_type=event['target_type'],
-                target_id=event['target_id'],
-                actor_id=event.get('actor_id')
+class WatchEventWorker(OutboxWorker):
+    """
+    Watch事件发件箱worker
+    领取待投递事件并生成通知；通知幂等键保证事件重复投递时不会重复通知
+    """
+
+    model = WatchEventOutbox
+
+    def process_event(self, event):
+        """
+        投递单个事件，成功标记为done，失败按指数退避重新排队
+        :return: 创建的通知数量
+        """
+        try:
+            count = WatchService.deliver_event(
+                event.event_type,
+                event.target_type,
+                event.target_id,
+                event.actor_id,
+                event_key=event.idempotency_key
             )
-            total_notifications += notifications_created
+            event.status = WatchEventOutbox.STATUS_DONE
+            event.processed_at = datetime.utcnow()
+            event.last_error = None
+            self.release(event)
+            db.session.commit()
+            return count
 
-        return total_notifications
+        except Exception as e:
+            db.session.rollback()
+            self.retry_later(event, e)
+            db.session.commit()
+            print(f"Error processing watch event {event.id} (attempt {event.attempts}): {e}")
+            return 0
 
-    except Exception as e:
-        print(f"Error processing pending watch events: {e}")
-        return 0
\ No newline at end of file
+    def run_batch(self):
+        """
+        领取并处理一批事件
+        :return: (处理的事件数, 创建的通知数)
+        """
+        events = self.claim_batch()
+        notifications = 0
+        for event in events:
+            notifications += self.process_event(event)
+        return len(events), notifications
+
+    def run_once(self):
+        processed, _ = self.run_batch()
+        return processed
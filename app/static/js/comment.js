@@ -15,7 +15,7 @@ class CommentSystem {
         };
 
         
-        this.currentPage = 1;
+        this.nextCursor = null;
         this.hasMoreComments = true;
         this.isLoading = false;
         this.mentionCache = new Map();
@@ -198,7 +198,7 @@ class CommentSystem {
         // 分页点击
         $(document).on('click', '.comments-pagination a', (e) => {
             e.preventDefault();
-            this.loadPage($(e.currentTarget).data('page'));
+            this.loadMoreComments();
         });
 
         // 全局点击事件（关闭弹出层）
@@ -225,14 +225,19 @@ class CommentSystem {
     /**
      * 加载评论列表
      */
-    async loadComments(page = 1) {
+    async loadComments(cursor = null) {
         if (this.isLoading) return;
 
         this.isLoading = true;
         this.showLoading();
 
         try {
-            const response = await fetch(`${this.options.apiBaseUrl}/api/comments?target_type=${this.options.targetType}&target_id=${this.options.targetId}&page=${page}&include_replies=true`);
+            // 游标分页：cursor为空时加载第一页
+            let url = `${this.options.apiBaseUrl}/api/comments?target_type=${this.options.targetType}&target_id=${this.options.targetId}&include_replies=true`;
+            if (cursor) {
+                url += `&cursor=${encodeURIComponent(cursor)}`;
+            }
+            const response = await fetch(url);
 
             if (!response.ok) {
                 throw new Error('Failed to load comments');
@@ -240,15 +245,15 @@ class CommentSystem {
 
             const data = await response.json();
 
-            if (page === 1) {
+            if (!cursor) {
                 this.renderComments(data.comments);
             } else {
                 this.appendComments(data.comments);
             }
 
-            this.updatePagination(data);
-            this.currentPage = page;
+            this.nextCursor = data.next_cursor;
             this.hasMoreComments = data.has_next;
+            this.updatePagination(data);
 
         } catch (error) {
             console.error('Error loading comments:', error);
@@ -1229,64 +1234,25 @@ class CommentSystem {
     updatePagination(data) {
         const $pagination = $('.comments-pagination');
 
-        if (data.pages <= 1) {
+        if (!data.has_next) {
             $pagination.empty();
             return;
         }
 
-        let paginationHtml = '<nav><ul class="pagination pagination-comments">';
-
-        // 上一页
-        if (data.has_prev) {
-            paginationHtml += `<li class="page-item">
-                <a class="page-link" href="#" data-page="${data.current_page - 1}">Previous</a>
-            </li>`;
-        }
-
-        // 页码
-        const startPage = Math.max(1, data.current_page - 2);
-        const endPage = Math.min(data.pages, data.current_page + 2);
-
-        if (startPage > 1) {
-            paginationHtml += `<li class="page-item">
-                <a class="page-link" href="#" data-page="1">1</a>
-            </li>`;
-            if (startPage > 2) {
-                paginationHtml += '<li class="page-item disabled"><span class="page-link">...</span></li>';
-            }
-        }
-
-        for (let i = startPage; i <= endPage; i++) {
-            paginationHtml += `<li class="page-item ${i === data.current_page ? 'active' : ''}">
-                <a class="page-link" href="#" data-page="${i}">${i}</a>
-            </li>`;
-        }
-
-        if (endPage < data.pages) {
-            if (endPage < data.pages - 1) {
-                paginationHtml += '<li class="page-item disabled"><span class="page-link">...</span></li>';
-            }
-            paginationHtml += `<li class="page-item">
-                <a class="page-link" href="#" data-page="${data.pages}">${data.pages}</a>
-            </li>`;
-        }
-
-        // 下一页
-        if (data.has_next) {
-            paginationHtml += `<li class="page-item">
-                <a class="page-link" href="#" data-page="${data.current_page + 1}">Next</a>
-            </li>`;
-        }
-
-        paginationHtml += '</ul></nav>';
-        $pagination.html(paginationHtml);
+        $pagination.html(`
+            <div class="text-center">
+                <a class="btn btn-outline-secondary btn-sm load-more-comments" href="#">Load more comments</a>
+            </div>
+        `);
     }
 
     /**
-     * 加载指定页面
+     * 加载下一页
      */
-    loadPage(page) {
-        this.loadComments(page);
+    loadMoreComments() {
+        if (this.hasMoreComments && this.nextCursor) {
+            this.loadComments(this.nextCursor);
+        }
     }
 
     /**
@@ -1350,7 +1316,7 @@ class CommentSystem {
         if (this.isLoading) return;
 
         try {
-            const response = await fetch(`${this.options.apiBaseUrl}/api/comments?target_type=${this.options.targetType}&target_id=${this.options.targetId}&page=1&per_page=1`);
+            const response = await fetch(`${this.options.apiBaseUrl}/api/comments?target_type=${this.options.targetType}&target_id=${this.options.targetId}&per_page=1&include_replies=false`);
 
             if (!response.ok) return;
 
@@ -1387,7 +1353,7 @@ class CommentSystem {
         $('body').append(notification);
 
         notification.on('click', () => {
-            this.loadComments(1);
+            this.loadComments();
             notification.alert('close');
         });
 
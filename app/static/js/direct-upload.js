@@ -0,0 +1,82 @@
+/**
+ * 浏览器直传S3
+ * 先向服务器申请预签名PUT，把文件直接PUT到S3，再调用完成接口创建记录；
+ * 服务器未开启直传（申请返回404）时返回null，调用方改用普通表单上传
+ */
+
+function getCsrfToken() {
+    const meta = document.querySelector('meta[name="csrf-token"]');
+    return meta ? meta.getAttribute('content') : '';
+}
+
+function postJson(url, data) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCsrfToken()
+        },
+        body: JSON.stringify(data)
+    });
+}
+
+function putToStorage(upload, file, onProgress) {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open(upload.method || 'PUT', upload.url);
+        Object.entries(upload.headers || {}).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+
+        if (onProgress) {
+            xhr.upload.addEventListener('progress', (e) => {
+                if (e.lengthComputable) {
+                    onProgress((e.loaded / e.total) * 100);
+                }
+            });
+        }
+        xhr.addEventListener('load', () => {
+            if (xhr.status >= 200 && xhr.status < 300) {
+                resolve();
+            } else {
+                reject(new Error(`上传失败，状态码: ${xhr.status}`));
+            }
+        });
+        xhr.addEventListener('error', () => reject(new Error('网络错误，上传失败')));
+        xhr.addEventListener('timeout', () => reject(new Error('上传超时')));
+        xhr.send(file);
+    });
+}
+
+/**
+ * 直传文件
+ * @param {File} file 文件
+ * @param {Object} options {presignUrl, finalizeUrl, data: 申请和完成时附带的字段, onProgress(percent)}
+ * @returns {Promise<Object|null>} 完成接口的JSON响应；直传不可用时为null
+ */
+async function directUpload(file, options) {
+    const data = options.data || {};
+    const presignResponse = await postJson(options.presignUrl, {
+        ...data,
+        filename: file.name,
+        content_type: file.type || 'application/octet-stream',
+        size: file.size
+    });
+
+    if (presignResponse.status === 404) {
+        return null;
+    }
+    const presign = await presignResponse.json();
+    if (!presignResponse.ok) {
+        throw new Error(presign.message || presign.error || '上传申请失败');
+    }
+
+    await putToStorage(presign.upload, file, options.onProgress);
+
+    const finalizeResponse = await postJson(options.finalizeUrl, { ...data, token: presign.token });
+    const result = await finalizeResponse.json();
+    if (!finalizeResponse.ok || result.success === false) {
+        throw new Error(result.message || result.error || '上传失败');
+    }
+    return result;
+}
+
+window.directUpload = directUpload;
@@ -15,8 +15,44 @@ class WatchManager {
         this.updateUnreadCount();
         this.setupEventListeners();
 
+        // 优先使用服务器推送，不支持或连接持续失败时退回轮询
+        if (window.EventSource) {
+            this.connectStream();
+        } else {
+            this.startPolling();
+        }
+    }
+
+    connectStream() {
+        this.stream = new EventSource('/api/notifications/stream');
+        this.streamErrors = 0;
+
+        this.stream.addEventListener('unread', (e) => {
+            this.streamErrors = 0;
+            this.setUnreadCount(JSON.parse(e.data).unread_count);
+        });
+
+        this.stream.addEventListener('notification', (e) => {
+            this.streamErrors = 0;
+            const notification = JSON.parse(e.data);
+            this.notifications.unshift(notification);
+            document.dispatchEvent(new CustomEvent('wiki:notification', { detail: notification }));
+        });
+
+        // EventSource会自动重连并带上Last-Event-ID
+        this.stream.addEventListener('error', () => {
+            this.streamErrors += 1;
+            if (this.streamErrors >= 5) {
+                this.stream.close();
+                this.startPolling();
+            }
+        });
+    }
+
+    startPolling() {
+        if (this.pollTimer) return;
         // 每30秒检查一次新通知
-        setInterval(() => {
+        this.pollTimer = setInterval(() => {
             this.updateUnreadCount();
         }, 30000);
     }
@@ -2,25 +2,16 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash,
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from app import db, mail
-from app.models import User, Role, Page, Category, Attachment, UserSession, Permission
+from app.models import User, Role, Page, Category, Attachment, UserSession, Permission, DatabaseBackup
 import os
-import zipfile
-import tempfile
 from flask import send_file, jsonify
 from werkzeug.utils import secure_filename
 from app.decorators import admin_required
 from app.forms.admin import UserForm, RoleForm, CategoryForm
+from app.pagination import cached_count
+from app.services.backup_service import BackupService
 from sqlalchemy import func, text
 
-# 简单的备份记录类（临时解决方案）
-class BackupRecord:
-    def __init__(self, id, created_at, creator, file_size=None):
-        self.id = id
-        self.created_at = created_at
-        self.creator = creator
-        self.file_size = file_size
-        self.file_path = None
-
 admin = Blueprint('admin', __name__)
 
 @admin.before_request
@@ -203,8 +194,10 @@ def users():
     elif status_filter == 'unconfirmed':
         query = query.filter(User.confirmed == False)
 
-    users = query.order_by(User.member_since.desc())\
-                 .paginate(page=page, per_page=20, error_out=False)
+    # 总数缓存一分钟，翻页时不再每次COUNT(*)
+    users = query.order_by(User.member_since.desc(), User.id.desc())\
+                 .paginate(page=page, per_page=20, error_out=False, count=False)
+    users.total = cached_count(query, f'admin_users:{role_filter}:{status_filter}')
 
     roles = Role.query.all()
 
@@ -522,8 +515,9 @@ def pages():
     if author_filter:
         query = query.filter_by(author_id=author_filter)
 
-    pages = query.order_by(Page.updated_at.desc())\
-                 .paginate(page=page, per_page=20, error_out=False)
+    pages = query.order_by(Page.updated_at.desc(), Page.id.desc())\
+                 .paginate(page=page, per_page=20, error_out=False, count=False)
+    pages.total = cached_count(query, f'admin_pages:{status_filter}:{author_filter}')
 
     authors = db.session.query(User.id, User.username).join(Page, User.id == Page.author_id).distinct().all()
 
@@ -569,9 +563,6 @@ def settings():
     """System settings"""
     return render_template('admin/settings_standalone.html', config=current_app.config)
 
-# 全局备份记录存储（临时解决方案）
-backup_records = []
-
 @admin.route('/backup')
 @login_required
 @admin_required
@@ -582,9 +573,11 @@ def backup():
     page_count = Page.query.count()
     category_count = Category.query.count()
     session_count = UserSession.query.filter_by(is_active=True).count()
+    backup_history = DatabaseBackup.query.order_by(DatabaseBackup.created_at.desc(), DatabaseBackup.id.desc())\
+                                         .limit(20).all()
 
     return render_template('admin/backup_standalone.html',
-                         backup_history=backup_records,
+                         backup_history=backup_history,
                          user_count=user_count,
                          page_count=page_count,
                          category_count=category_count,
@@ -594,145 +587,41 @@ def backup():
 @login_required
 @admin_required
 def create_backup():
-    """Create database backup"""
-    try:
-        # 创建备份记录
-        backup_record = BackupRecord(
-            id=len(backup_records) + 1,
-            created_at=datetime.utcnow(),
-            creator=current_user
-        )
-
-        # 创建临时ZIP文件
-        temp_dir = tempfile.mkdtemp()
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'enterprise_backup_{timestamp}.zip'
-        backup_path = os.path.join(temp_dir, backup_filename)
-
-        # 创建ZIP文件
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # 获取数据库路径
-            database_path = current_app.config.get('DATABASE_PATH', 'instance/wiki.db')
-
-            if os.path.exists(database_path):
-                # 添加数据库文件到ZIP
-                zipf.write(database_path, os.path.basename(database_path))
-
-            # 创建数据库导出SQL文件
-            sql_filename = f'database_export_{timestamp}.sql'
-            sql_path = os.path.join(temp_dir, sql_filename)
-
-            # 导出数据库为SQL语句
-            with open(sql_path, 'w', encoding='utf-8') as sql_file:
-                sql_file.write('-- Enterprise Wiki Database Backup\n')
-                sql_file.write(f'-- Generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n')
-                sql_file.write(f'-- Backup ID: {backup_record.id}\n\n')
-
-                # 获取所有表并生成SQL
-                inspector = db.inspect(db.engine)
-                for table_name in inspector.get_table_names():
-                    sql_file.write(f'-- Table: {table_name}\n')
-
-                    # 获取表结构
-                    columns = inspector.get_columns(table_name)
-                    create_sql = f'CREATE TABLE IF NOT EXISTS {table_name} (\n'
-                    column_defs = []
-                    for col in columns:
-                        col_def = f'    {col["name"]} {col["type"]}'
-                        if not col.get("nullable", True):
-                            col_def += " NOT NULL"
-                        if col.get("default") is not None:
-                            col_def += f" DEFAULT {col['default']}"
-                        column_defs.append(col_def)
-                    create_sql += ',\n'.join(column_defs) + '\n);'
-                    sql_file.write(create_sql + '\n\n')
-
-                    # 获取表数据
-                    result = db.session.execute(text(f'SELECT * FROM {table_name}'))
-                    rows = result.fetchall()
-
-                    if rows:
-                        columns_list = [col["name"] for col in columns]
-                        sql_file.write(f'-- Data for {table_name}\n')
-                        for row in rows:
-                            values = []
-                            for value in row:
-                                if value is None:
-                                    values.append('NULL')
-                                elif isinstance(value, str):
-                                    escaped_value = value.replace("'", "''")
-                                    values.append(f"'{escaped_value}'")
-                                else:
-                                    values.append(str(value))
-                            insert_sql = f'INSERT INTO {table_name} ({", ".join(columns_list)}) VALUES ({", ".join(values)});'
-                            sql_file.write(insert_sql + '\n')
-                        sql_file.write('\n')
-
-                sql_file.write('-- End of backup\n')
-
-            # 添加SQL文件到ZIP
-            zipf.write(sql_path, sql_filename)
-
-            # 添加备份信息文件
-            info_filename = f'backup_info_{timestamp}.txt'
-            info_path = os.path.join(temp_dir, info_filename)
-            with open(info_path, 'w', encoding='utf-8') as info_file:
-                info_file.write(f'Enterprise Wiki Backup Information\n')
-                info_file.write(f'Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n')
-                info_file.write(f'Backup ID: {backup_record.id}\n')
-                info_file.write(f'Created by: {current_user.username}\n\n')
-                info_file.write(f'Statistics:\n')
-                info_file.write(f'- Users: {User.query.count()}\n')
-                info_file.write(f'- Pages: {Page.query.count()}\n')
-                info_file.write(f'- Categories: {Category.query.count()}\n')
-                info_file.write(f'- Active Sessions: {UserSession.query.filter_by(is_active=True).count()}\n')
-
-            zipf.write(info_path, info_filename)
-
-        # 获取文件大小
-        file_size = os.path.getsize(backup_path)
-        backup_record.file_size = f"{file_size // 1024} KB"
-        backup_record.file_path = backup_path
-
-        # 添加到备份记录
-        backup_records.append(backup_record)
-
-        flash('Backup created successfully! Download will start automatically.', 'success')
-        return send_file(backup_path,
-                        as_attachment=True,
-                        download_name=backup_filename,
-                        mimetype='application/zip')
-
-    except Exception as e:
-        flash(f'Error creating backup: {str(e)}', 'danger')
-        return redirect(url_for('admin.backup'))
+    """Queue a database backup for the backup worker"""
+    backup_record, error = BackupService.create(current_user)
+    if request.is_json:
+        if backup_record is None:
+            return jsonify({'success': False, 'message': error}), 409
+        return jsonify({'success': True, 'backup': backup_record.to_dict()}), 202
+
+    if backup_record is None:
+        flash(error, 'warning')
+    else:
+        flash('Backup queued. The download link will appear when the backup worker completes it.', 'success')
+    return redirect(url_for('admin.backup'))
+
+@admin.route('/backup/<int:backup_id>/status')
+@login_required
+@admin_required
+def backup_status(backup_id):
+    """Backup progress"""
+    backup_record = DatabaseBackup.query.get_or_404(backup_id)
+    return jsonify(backup_record.to_dict())
 
 @admin.route('/backup/download/<int:backup_id>')
 @login_required
 @admin_required
 def download_backup(backup_id):
     """Download existing backup"""
-    try:
-        # 查找备份记录
-        backup_record = None
-        for record in backup_records:
-            if record.id == backup_id:
-                backup_record = record
-                break
-
-        if not backup_record or not backup_record.file_path or not os.path.exists(backup_record.file_path):
-            flash('Backup file not found.', 'danger')
-            return redirect(url_for('admin.backup'))
-
-        # 生成下载文件名
-        timestamp = backup_record.created_at.strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'enterprise_backup_{timestamp}.zip'
-
-        return send_file(backup_record.file_path,
-                        as_attachment=True,
-                        download_name=backup_filename,
-                        mimetype='application/zip')
+    backup_record = DatabaseBackup.query.get_or_404(backup_id)
+    file_path = BackupService.file_path(backup_record)
+    if backup_record.status != DatabaseBackup.STATUS_COMPLETED or not file_path or not os.path.exists(file_path):
+        flash('Backup file not found.', 'danger')
+        return redirect(url_for('admin.backup'))
 
-    except Exception as e:
-        flash(f'Error downloading backup: {str(e)}', 'danger')
-        return redirect(url_for('admin.backup'))
\ No newline at end of file
+    # send_file逐块发送文件，配置了USE_X_SENDFILE时交给前端服务器
+    return send_file(file_path,
+                    as_attachment=True,
+                    download_name=backup_record.filename,
+                    mimetype='application/zip',
+                    conditional=True)
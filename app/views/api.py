@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from app import db
 from app.models import User, Page, Category, Attachment, Permission
 from app.decorators import permission_required
+from app.services.image_service import ImageDerivativeService
 import markdown
 
 api = Blueprint('api', __name__)
@@ -651,11 +652,13 @@ def api_upload():
 
         # Use storage service for upload
         try:
-            from app.services.storage_service import create_storage_service
-            storage_service = create_storage_service(current_app.config['STORAGE_CONFIG'])
+            from app.services.storage_service import get_storage_service
+            from app.services.blob_service import BlobService
+            storage_service = get_storage_service()
 
-            # Upload file to storage (local or S3)
-            upload_result = storage_service.upload_file(
+            # Upload file to storage (local or S3), deduplicated when STORAGE_DEDUP is on
+            upload_result = BlobService.store(
+                storage_service,
                 file_data=file.stream,
                 filename=original_filename,
                 content_type=file.mimetype,
@@ -670,19 +673,13 @@ def api_upload():
             attachment.filename = upload_result.get('filename')
             attachment.file_path = upload_result.get('relative_path')
             attachment.file_size = upload_result.get('file_size', 0)
+            attachment.blob_id = upload_result.get('blob_id')
 
             db.session.commit()
 
-            # Generate URLs using Attachment model
-            return jsonify({
-                'id': attachment.id,
-                'filename': upload_result.get('filename'),
-                'original_filename': upload_result.get('original_filename'),
-                'url': attachment.get_url(),
-                'download_url': f"{attachment.get_url()}?download=1",
-                'size': attachment.get_size_display(),
-                'mime_type': attachment.mime_type
-            }), 201
+            ImageDerivativeService.pregenerate(upload_result['relative_path'])
+
+            return _attachment_response(attachment, upload_result), 201
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f"Upload error: {str(e)}")
@@ -690,51 +687,154 @@ def api_upload():
 
     return api_error('File type not allowed', 400)
 
+def _attachment_response(attachment, upload_result):
+    """Upload response for a stored attachment"""
+    # Generate URLs using Attachment model
+    return jsonify({
+        'id': attachment.id,
+        'filename': upload_result.get('filename'),
+        'original_filename': upload_result.get('original_filename'),
+        'url': attachment.get_url(),
+        'download_url': f"{attachment.get_url()}?download=1",
+        'size': attachment.get_size_display(),
+        'mime_type': attachment.mime_type
+    })
+
+@api.route('/upload/presign', methods=['POST'])
+@login_required
+@permission_required(Permission.WRITE)
+def presign_upload():
+    """
+    Request a presigned PUT so the browser uploads an attachment straight to S3.
+    JSON body: {filename, content_type, size, page_id?, description?}
+    Returns 404 when direct uploads are unavailable; clients fall back to POST /api/upload.
+    """
+    from app.services.direct_upload_service import DirectUploadService, DirectUploadError
+
+    if not DirectUploadService.enabled():
+        return api_error('Direct uploads are not enabled', 404)
+
+    data = request.get_json() or {}
+    if not data.get('filename') or not allowed_file(data['filename']):
+        return api_error('File type not allowed', 400)
+
+    page_id = data.get('page_id')
+    try:
+        result = DirectUploadService.issue(
+            'attachment', data['filename'], data.get('content_type'), data.get('size'), current_user.id,
+            original_filename=data['filename'],
+            page_id=int(page_id) if page_id else None,
+            description=data.get('description', '')
+        )
+    except (DirectUploadError, ValueError) as e:
+        return api_error(str(e), 400)
+
+    return jsonify(result)
+
+@api.route('/upload/finalize', methods=['POST'])
+@login_required
+@permission_required(Permission.WRITE)
+def finalize_upload():
+    """Create the attachment for a finished direct upload. JSON body: {token}"""
+    from app.services.direct_upload_service import DirectUploadService, DirectUploadError
+
+    data = request.get_json() or {}
+    try:
+        intent, upload_result = DirectUploadService.finalize(data.get('token'), 'attachment', current_user.id)
+    except DirectUploadError as e:
+        return api_error(str(e), 400)
+
+    # A token creates at most one attachment
+    if Attachment.query.filter_by(file_path=intent['key']).first():
+        return api_error('Upload already finalized', 409)
+
+    try:
+        upload_result['original_filename'] = intent['extra']['original_filename']
+        attachment = Attachment(
+            filename=upload_result['filename'],
+            original_filename=intent['extra']['original_filename'],
+            file_path=upload_result['relative_path'],
+            file_size=upload_result['file_size'],
+            mime_type=intent['content_type'],
+            page_id=intent['extra']['page_id'],
+            uploaded_by=current_user.id,
+            description=intent['extra']['description']
+        )
+        db.session.add(attachment)
+        db.session.commit()
+
+        ImageDerivativeService.pregenerate(upload_result['relative_path'])
+
+        return _attachment_response(attachment, upload_result), 201
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Upload finalize error: {str(e)}")
+        return api_error(f'Upload failed: {str(e)}', 500)
+
 @api.route('/download/<int:attachment_id>')
 def download_attachment(attachment_id):
-    """Download attachment file"""
+    """Download attachment file
+
+    The permission check happens here; the bytes are served by S3 (short-lived presigned
+    redirect), by the front proxy (X-Accel-Redirect / X-Sendfile, see DOWNLOAD_OFFLOAD),
+    or by send_file with Range and ETag/If-None-Match support.
+    """
     attachment = Attachment.query.get_or_404(attachment_id)
 
     # Check permissions
     if not attachment.can_view(current_user):
         return api_error('Permission denied', 403)
 
-    from flask import redirect, request
+    from flask import redirect, request, send_file
+    from urllib.parse import quote
     import os
+    from app.services.storage_service import get_storage_service, content_disposition
 
     # Get download parameter
     force_download = request.args.get('download', '0') == '1'
 
     try:
+        backend = get_storage_service().backend
+
         # Check if this is S3 storage
         if current_app.config['STORAGE_CONFIG'].get('type') == 's3':
-            # For S3, redirect to the file URL
-            file_url = attachment.get_url()
-            if force_download:
-                file_url += f"?download=1"
-            return redirect(file_url)
-        else:
-            # For local storage, use send_file
-            import os
-            from flask import send_file
-
-            # Convert relative path to absolute path
-            file_path = attachment.file_path
-            if not os.path.isabs(file_path):
-                # Remove leading 'app/' if present to avoid double path issue
-                if file_path.startswith('app/'):
-                    file_path = file_path[4:]
-                file_path = os.path.join(current_app.root_path, file_path)
-
-            if not os.path.exists(file_path):
-                return api_error('File not found', 404)
-
-            return send_file(
-                file_path,
-                as_attachment=force_download,
-                download_name=attachment.original_filename,
-                mimetype=attachment.mime_type
+            # For S3, redirect to a presigned URL that expires shortly
+            file_url = backend.generate_presigned_get(
+                attachment.file_path,
+                expires_in=current_app.config.get('DOWNLOAD_URL_EXPIRES', 300),
+                download_name=attachment.original_filename if force_download else None
             )
+            response = redirect(file_url)
+            response.headers['Cache-Control'] = 'private, no-store'
+            return response
+
+        file_path = backend.get_local_path(attachment.file_path)
+        if not os.path.exists(file_path):
+            return api_error('File not found', 404)
+
+        # Let nginx serve the file from an internal location mapped to the upload folder
+        relative_path = backend.get_relative_path(attachment.file_path)
+        if current_app.config.get('DOWNLOAD_OFFLOAD') == 'x-accel' and relative_path:
+            prefix = current_app.config.get('DOWNLOAD_ACCEL_PREFIX', '/protected-uploads/')
+            response = current_app.response_class(mimetype=attachment.mime_type or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = quote(f"{prefix.rstrip('/')}/{relative_path}")
+            response.headers['Content-Disposition'] = content_disposition(
+                attachment.original_filename, as_attachment=force_download)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        # USE_X_SENDFILE (DOWNLOAD_OFFLOAD=x-sendfile) makes send_file hand off to the proxy
+        response = send_file(
+            file_path,
+            as_attachment=force_download,
+            download_name=attachment.original_filename,
+            mimetype=attachment.mime_type,
+            conditional=True,
+            etag=True
+        )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
 
     except Exception as e:
         current_app.logger.error(f"Download error: {str(e)}")
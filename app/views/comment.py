@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Comment, CommentMention, CommentTargetType
 from app.services.comment_service import CommentService
+from app.pagination import InvalidCursor
 
 comment = Blueprint('comment', __name__)
 
@@ -98,8 +99,11 @@ def get_comments():
         # 获取查询参数
         target_type = request.args.get('target_type')
         target_id = request.args.get('target_id', type=int)
-        page = request.args.get('page', 1, type=int)
+        # 默认游标分页（cursor），传page时使用旧的页码分页
+        page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
         include_replies = request.args.get('include_replies', 'true').lower() == 'true'
 
         if not target_type or not target_id:
@@ -117,11 +121,15 @@ def get_comments():
             target_id=target_id,
             include_replies=include_replies,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            with_total=with_total
         )
 
         return jsonify(result)
 
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting comments: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -134,25 +142,8 @@ def search_users():
         query = request.args.get('q', '').strip()
         limit = request.args.get('limit', 10, type=int)
 
-        # 对于空查询，返回最近活跃的用户
-        if not query:
-            from app.models.user import User
-            users = User.query.order_by(User.last_seen.desc()).limit(limit).all()
-            user_list = []
-            for user in users:
-                user_list.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'name': user.name or user.username,
-                    'email': user.email,
-                    'avatar': user.gravatar(size=40)
-                })
-            return jsonify({'users': user_list})
-
-        # 对于非空查询，需要至少1个字符
-        if len(query) < 1:
-            return jsonify({'users': []})
-
+        # 空查询返回最近活跃的用户
+        limit = max(1, min(limit, 50))
         users = CommentService.search_users(query, limit)
         return jsonify({'users': users})
 
@@ -165,19 +156,25 @@ def search_users():
 def get_mentions():
     """获取当前用户的@提及"""
     try:
-        page = request.args.get('page', 1, type=int)
+        page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
 
         result = CommentService.get_user_mentions(
             user_id=current_user.id,
             unread_only=unread_only,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            with_total=with_total
         )
 
         return jsonify(result)
 
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting mentions: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -203,18 +200,7 @@ def mark_mention_as_read(mention_id):
 def mark_all_mentions_as_read():
     """标记所有@提及为已读"""
     try:
-        # 获取所有未读提及
-        unread_mentions = CommentMention.query.filter_by(
-            mentioned_user_id=current_user.id,
-            is_read=False
-        ).all()
-
-        count = 0
-        for mention in unread_mentions:
-            mention.mark_as_read()
-            count += 1
-
-        db.session.commit()
+        count = CommentService.mark_all_mentions_as_read(current_user.id)
 
         return jsonify({'success': True, 'count': count})
 
@@ -227,17 +213,23 @@ def mark_all_mentions_as_read():
 def get_user_comments(user_id):
     """获取用户的评论列表"""
     try:
-        page = request.args.get('page', 1, type=int)
+        page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
 
         result = CommentService.get_user_comments(
             user_id=user_id,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            with_total=with_total
         )
 
         return jsonify(result)
 
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting user comments: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -6,7 +6,10 @@ from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 from app import db
 from app.models import S3Share
-from app.services.storage_service import create_storage_service
+from app.services.storage_service import get_storage_service
+from app.services.blob_service import BlobService
+from app.services.direct_upload_service import DirectUploadService, DirectUploadError
+from app.services.image_service import ImageDerivativeService
 import os
 import json
 
@@ -50,15 +53,15 @@ def upload_file():
         if not storage_config or storage_config.get('type', '').lower() != 's3':
             return jsonify({'success': False, 'message': 'S3存储未配置'})
 
-        storage_service = create_storage_service(storage_config)
+        storage_service = get_storage_service()
 
         # 获取文件信息
         original_filename = secure_filename(file.filename)
-        file_extension = os.path.splitext(original_filename)[1].lower().lstrip('.')
         file_type = file.content_type or 'application/octet-stream'
 
         # 上传到S3（使用shares文件夹）
-        upload_result = storage_service.upload_file(
+        upload_result = BlobService.store(
+            storage_service,
             file_data=file,
             filename=original_filename,
             content_type=file_type,
@@ -68,43 +71,50 @@ def upload_file():
         if not upload_result['success']:
             return jsonify({'success': False, 'message': upload_result.get('message', '上传失败')})
 
-        # 创建分享记录
-        s3_share = S3Share(
-            original_filename=original_filename,
-            file_path=upload_result['file_path'],
-            file_size=upload_result['file_size'],
-            file_type=file_type,
-            file_extension=file_extension,
-            s3_url=upload_result['url'],
-            public_url=upload_result['url'],  # S3直接URL作为公开URL
-            uploader_id=current_user.id,
-            is_public=True,
-            expires_at=datetime.utcnow() + timedelta(days=30)  # 默认30天过期
-        )
+        return _create_share(original_filename, file_type, upload_result)
 
-        # 生成分享代码和令牌
-        s3_share.generate_share_codes()
+    except Exception as e:
+        current_app.logger.error(f"S3 Share upload error: {str(e)}")
+        return jsonify({'success': False, 'message': f'上传失败: {str(e)}'})
 
-        db.session.add(s3_share)
-        db.session.commit()
 
-        current_app.logger.info(f"S3 Share: User {current_user.id} uploaded file {original_filename}")
+def _create_share(original_filename, file_type, upload_result):
+    """为已上传的文件创建分享记录"""
+    file_extension = os.path.splitext(original_filename)[1].lower().lstrip('.')
 
-        return jsonify({
-            'success': True,
-            'share_id': s3_share.id,
-            'share_code': s3_share.share_code,
-            'share_url': s3_share.get_share_url(),
-            's3_url': s3_share.s3_url,
-            'original_filename': s3_share.original_filename,
-            'file_size': s3_share.file_size,
-            'file_type': s3_share.file_type,
-            'message': '文件上传成功'
-        })
+    s3_share = S3Share(
+        original_filename=original_filename,
+        file_path=upload_result['file_path'],
+        file_size=upload_result['file_size'],
+        file_type=file_type,
+        file_extension=file_extension,
+        s3_url=upload_result['url'],
+        public_url=upload_result['url'],  # S3直接URL作为公开URL
+        blob_id=upload_result.get('blob_id'),
+        uploader_id=current_user.id,
+        is_public=True,
+        expires_at=datetime.utcnow() + timedelta(days=30)  # 默认30天过期
+    )
 
-    except Exception as e:
-        current_app.logger.error(f"S3 Share upload error: {str(e)}")
-        return jsonify({'success': False, 'message': f'上传失败: {str(e)}'})
+    # 生成分享代码和令牌
+    s3_share.generate_share_codes()
+
+    db.session.add(s3_share)
+    db.session.commit()
+
+    current_app.logger.info(f"S3 Share: User {current_user.id} uploaded file {original_filename}")
+
+    return jsonify({
+        'success': True,
+        'share_id': s3_share.id,
+        'share_code': s3_share.share_code,
+        'share_url': s3_share.get_share_url(),
+        's3_url': s3_share.s3_url,
+        'original_filename': s3_share.original_filename,
+        'file_size': s3_share.file_size,
+        'file_type': s3_share.file_type,
+        'message': '文件上传成功'
+    })
 
 
 @share.route('/<share_code>')
@@ -192,10 +202,10 @@ def delete_share(share_id):
         return jsonify({'success': False, 'message': '分享不存在'}), 404
 
     try:
-        # 从S3删除文件
+        # 从S3删除文件（去重存储的文件可能被其他记录共用，由 `flask storage gc` 回收）
         storage_config = current_app.config.get('STORAGE_CONFIG')
-        if storage_config and storage_config.get('type', '').lower() == 's3':
-            storage_service = create_storage_service(storage_config)
+        if not share.blob_id and storage_config and storage_config.get('type', '').lower() == 's3':
+            storage_service = get_storage_service()
             storage_service.delete_file(share.file_path)
 
         # 删除数据库记录
@@ -243,7 +253,7 @@ def api_upload_image():
         if not storage_config or storage_config.get('type', '').lower() != 's3':
             return jsonify({'success': False, 'message': 'S3存储未配置'})
 
-        storage_service = create_storage_service(storage_config)
+        storage_service = get_storage_service()
 
         # 获取文件信息
         original_filename = secure_filename(file.filename)
@@ -251,7 +261,9 @@ def api_upload_image():
         file_type = file.content_type
 
         # 上传到S3（使用images文件夹）
-        upload_result = storage_service.upload_file(
+        # 编辑器图片没有对应的记录，去重时持有一个永久引用
+        upload_result = BlobService.store(
+            storage_service,
             file_data=file,
             filename=original_filename,
             content_type=file_type,
@@ -260,6 +272,9 @@ def api_upload_image():
 
         if not upload_result['success']:
             return jsonify({'success': False, 'message': upload_result.get('message', '上传失败')})
+        db.session.commit()
+
+        ImageDerivativeService.pregenerate(upload_result['relative_path'])
 
         current_app.logger.info(f"S3 Image Upload: User {current_user.id} uploaded image {original_filename}")
 
@@ -277,6 +292,72 @@ def api_upload_image():
         return jsonify({'success': False, 'message': f'上传失败: {str(e)}'})
 
 
+@share.route('/api/s3/presign', methods=['POST'])
+@login_required
+def api_presign_upload():
+    """
+    申请浏览器直传S3（分享文件或编辑器图片）
+    请求JSON: {filename, content_type, size, kind: 'share'|'image'}
+    直传不可用时返回404，前端改用普通上传
+    """
+    if not DirectUploadService.enabled():
+        return jsonify({'success': False, 'direct': False, 'message': '未开启直传'}), 404
+
+    data = request.get_json() or {}
+    kind = data.get('kind', 'share')
+    if kind not in ('share', 'image'):
+        return jsonify({'success': False, 'message': '不支持的上传类型'}), 400
+
+    try:
+        result = DirectUploadService.issue(kind, data.get('filename'), data.get('content_type'),
+                                           data.get('size'), current_user.id)
+    except DirectUploadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'direct': True, **result})
+
+
+@share.route('/api/s3/finalize', methods=['POST'])
+@login_required
+def api_finalize_upload():
+    """
+    完成浏览器直传：确认S3上的对象后创建分享记录（图片直接返回URL）
+    请求JSON: {token, kind: 'share'|'image'}
+    """
+    data = request.get_json() or {}
+    kind = data.get('kind', 'share')
+    if kind not in ('share', 'image'):
+        return jsonify({'success': False, 'message': '不支持的上传类型'}), 400
+
+    try:
+        intent, upload_result = DirectUploadService.finalize(data.get('token'), kind, current_user.id)
+    except DirectUploadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if kind == 'image':
+        ImageDerivativeService.pregenerate(upload_result['relative_path'])
+        current_app.logger.info(f"S3 Image Upload: User {current_user.id} uploaded image {intent['filename']}")
+        return jsonify({
+            'success': True,
+            'url': upload_result['url'],
+            'filename': upload_result['filename'],
+            'original_filename': intent['filename'],
+            'file_size': upload_result['file_size'],
+            'message': '图片上传成功'
+        })
+
+    # 同一个令牌只能创建一次分享
+    if S3Share.query.filter_by(file_path=intent['key']).first():
+        return jsonify({'success': False, 'message': '该文件已创建分享'}), 409
+
+    try:
+        return _create_share(intent['filename'], intent['content_type'], upload_result)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"S3 Share finalize error: {str(e)}")
+        return jsonify({'success': False, 'message': f'上传失败: {str(e)}'})
+
+
 @share.route('/my-shares')
 @login_required
 def my_shares():
@@ -3,7 +3,9 @@ import json
 from flask_login import login_required, current_user
 from app import db
 from app.models import User, Comment, CommentTargetType
+from app.services.avatar_service import AvatarService
 from app.services.comment_service import CommentService
+from app.pagination import InvalidCursor
 
 user = Blueprint('user', __name__)
 
@@ -96,16 +98,21 @@ def user_comments(username):
             current_app.logger.warning(f"User not found for comments API: {username}")
             return jsonify({'error': 'User not found'}), 404
 
-        page = request.args.get('page', 1, type=int)
+        # 默认游标分页（cursor），传page时使用旧的页码分页
+        page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', 10, type=int)
 
         result = CommentService.get_user_comments(
             user_id=user.id,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=request.args.get('cursor'),
+            with_total=request.args.get('with_total', 'false').lower() == 'true'
         )
 
         return jsonify(result)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting user comments: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -121,7 +128,7 @@ def user_mentions(username):
         if current_user.id != user.id and not current_user.is_administrator():
             return jsonify({'error': 'Access denied'}), 403
 
-        page = request.args.get('page', 1, type=int)
+        page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', 20, type=int)
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
 
@@ -129,10 +136,14 @@ def user_mentions(username):
             user_id=user.id,
             unread_only=unread_only,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=request.args.get('cursor'),
+            with_total=request.args.get('with_total', 'false').lower() == 'true'
         )
 
         return jsonify(result)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting user mentions: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -243,7 +254,7 @@ def notification_settings():
                 'watch_notifications': form.watch_notifications.data,
                 'mention_notifications': form.mention_notifications.data,
                 'comment_notifications': form.comment_notifications.data,
-                'daily_digest': form.daily_digest.data
+                'digest_frequency': form.digest_frequency.data
             }
 
             current_user.set_notification_settings(notification_settings)
@@ -534,7 +545,8 @@ def upload_avatar_file(username):
             return jsonify({'error': 'File too large. Maximum size is 2MB'}), 400
 
         # 创建附件记录
-        from app.services.storage_service import create_storage_service
+        from app.models.wiki import Attachment
+        from app.services.storage_service import get_storage_service
 
         attachment = Attachment(
             filename='',
@@ -551,9 +563,11 @@ def upload_avatar_file(username):
 
         try:
             # 使用存储服务上传文件
-            storage_service = create_storage_service(current_app.config['STORAGE_CONFIG'])
+            from app.services.blob_service import BlobService
+            storage_service = get_storage_service()
 
-            upload_result = storage_service.upload_file(
+            upload_result = BlobService.store(
+                storage_service,
                 file_data=file.stream,
                 filename=f"avatar_{user.id}_{file.filename}",
                 content_type=file.mimetype,
@@ -569,9 +583,11 @@ def upload_avatar_file(username):
             attachment.filename = upload_result.get('filename')
             attachment.file_path = upload_result.get('relative_path')
             attachment.file_size = upload_result.get('file_size', 0)
+            attachment.blob_id = upload_result.get('blob_id')
 
-            # 更新用户头像URL
+            # 更新用户头像URL（缩放图必须在设置avatar之后赋值，修改avatar会清空avatar_thumbs）
             user.avatar = upload_result.get('url')
+            user.avatar_thumbs = AvatarService.generate_sizes(upload_result.get('relative_path'), storage_service)
             db.session.commit()
 
             current_app.logger.info(f"Avatar uploaded successfully: {user.avatar}")
@@ -590,6 +606,74 @@ def upload_avatar_file(username):
         current_app.logger.error(f"Error uploading avatar: {str(e)}")
         return jsonify({'error': 'Failed to upload avatar'}), 500
 
+@user.route('/<username>/avatar/presign', methods=['POST'])
+@login_required
+def presign_avatar_upload(username):
+    """申请浏览器直传头像到S3，请求JSON: {filename, content_type, size}"""
+    from app.services.direct_upload_service import DirectUploadService, DirectUploadError
+
+    user = User.query.filter_by(username=username).first_or_404()
+    if current_user.id != user.id and not current_user.is_administrator():
+        return jsonify({'error': 'Access denied'}), 403
+
+    if not DirectUploadService.enabled():
+        return jsonify({'error': 'Direct uploads are not enabled', 'direct': False}), 404
+
+    data = request.get_json() or {}
+    try:
+        result = DirectUploadService.issue(
+            'avatar', f"avatar_{user.id}_{data.get('filename', '')}", data.get('content_type'),
+            data.get('size'), current_user.id, target_user_id=user.id, original_filename=data.get('filename', '')
+        )
+    except DirectUploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'success': True, 'direct': True, **result})
+
+@user.route('/<username>/avatar/finalize', methods=['POST'])
+@login_required
+def finalize_avatar_upload(username):
+    """完成头像直传：确认S3上的文件后创建附件记录并更新头像，请求JSON: {token}"""
+    from app.models.wiki import Attachment
+    from app.services.direct_upload_service import DirectUploadService, DirectUploadError
+
+    user = User.query.filter_by(username=username).first_or_404()
+    data = request.get_json() or {}
+    try:
+        intent, upload_result = DirectUploadService.finalize(data.get('token'), 'avatar', current_user.id)
+    except DirectUploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if intent['extra']['target_user_id'] != user.id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    try:
+        attachment = Attachment(
+            filename=upload_result['filename'],
+            original_filename=intent['extra']['original_filename'],
+            file_path=upload_result['relative_path'],
+            file_size=upload_result['file_size'],
+            mime_type=intent['content_type'],
+            uploaded_by=current_user.id,
+            description=f'Avatar for {user.username}'
+        )
+        db.session.add(attachment)
+        user.avatar = upload_result['url']
+        user.avatar_thumbs = AvatarService.generate_sizes(upload_result['relative_path'])
+        db.session.commit()
+
+        current_app.logger.info(f"Avatar uploaded successfully: {user.avatar}")
+
+        return jsonify({
+            'success': True,
+            'avatar_url': user.avatar
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error finalizing avatar upload: {str(e)}")
+        return jsonify({'error': 'Failed to upload avatar'}), 500
+
 @user.route('/<username>/remove-avatar', methods=['POST'])
 @login_required
 def remove_avatar(username):
@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_login import login_required, current_user
 from app import db
 from app.models import Watch, WatchNotification, WatchTargetType, WatchEventType
 from app.services.watch_service import WatchService
+from app.pagination import InvalidCursor
 from datetime import datetime
+import json
+import queue
+import time
 
 watch = Blueprint('watch', __name__)
 
@@ -219,10 +223,20 @@ def get_notifications():
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         limit = int(request.args.get('limit', 50))
 
-        notifications = WatchService.get_user_notifications(
+        # group=target 时同一页面/分类的通知合并为一组返回
+        if request.args.get('group') == 'target':
+            return jsonify({
+                'success': True,
+                'groups': WatchService.get_grouped_notifications(current_user.id, unread_only, limit),
+                'unread_count': WatchService.get_unread_count(current_user.id)
+            })
+
+        notifications, meta = WatchService.get_notifications_page(
             current_user.id,
             unread_only,
-            limit
+            limit,
+            cursor=request.args.get('cursor'),
+            with_total=request.args.get('with_total', 'false').lower() == 'true'
         )
 
         result = [notification.to_dict() for notification in notifications]
@@ -230,9 +244,12 @@ def get_notifications():
         return jsonify({
             'success': True,
             'notifications': result,
-            'unread_count': WatchService.get_unread_count(current_user.id)
+            'unread_count': WatchService.get_unread_count(current_user.id),
+            **meta
         })
 
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting notifications: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -287,4 +304,75 @@ def get_unread_count():
 
     except Exception as e:
         current_app.logger.error(f"Error getting unread count: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@watch.route('/api/notifications/stream', methods=['GET'])
+@login_required
+def notification_stream():
+    """
+    通知推送（Server-Sent Events）
+    推送新通知（event: notification，id为通知ID）和未读数变化（event: unread），
+    空闲时发送心跳；断线重连时浏览器带上Last-Event-ID，补发期间错过的通知
+    """
+    from app.services.notification_stream import notification_hub
+
+    app = current_app._get_current_object()
+    user_id = current_user.id
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    heartbeat = app.config.get('NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_seconds = app.config.get('NOTIFICATION_STREAM_MAX_SECONDS', 600)
+
+    def format_event(event, data, event_id):
+        return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+    def generate():
+        nonlocal last_id
+        subscription = notification_hub.subscribe(user_id)
+        try:
+            with app.app_context():
+                yield 'retry: 5000\n\n'
+
+                pending = {notification_hub.KIND_UNREAD}
+                if last_id is None:
+                    # 新连接不补发历史通知，从当前最新通知开始推送
+                    last_id = WatchService.get_latest_notification_id(user_id)
+                else:
+                    pending.add(notification_hub.KIND_NOTIFICATION)
+
+                deadline = time.monotonic() + max_seconds
+                while True:
+                    if notification_hub.KIND_NOTIFICATION in pending:
+                        for notification in WatchService.get_notifications_since(user_id, last_id):
+                            last_id = notification.id
+                            yield format_event('notification', notification.to_dict(), last_id)
+                    if pending:
+                        yield format_event('unread', {
+                            'unread_count': WatchService.get_unread_count(user_id)
+                        }, last_id)
+                    # 空闲期间不占用数据库连接
+                    db.session.remove()
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        pending = {subscription.get(timeout=min(heartbeat, remaining))}
+                    except queue.Empty:
+                        pending = set()
+                        yield ': heartbeat\n\n'
+                        continue
+
+                    # 合并短时间内到达的多条消息
+                    while True:
+                        try:
+                            pending.add(subscription.get_nowait())
+                        except queue.Empty:
+                            break
+        finally:
+            notification_hub.unsubscribe(user_id, subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
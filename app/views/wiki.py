@@ -1,11 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, jsonify, current_app, \
+    stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime
 from app import db
 from app.models import Page, Category, Attachment, PageVersion, Permission, User
 from app.decorators import permission_required
 from app.forms.wiki import PageForm, CategoryForm, SearchForm
-from app.services.storage_service import create_storage_service
+from app.services.storage_service import get_storage_service, content_disposition
+from app.services.export_service import ExportService
+from app.services.blob_service import BlobService
+from app.services.image_service import ImageDerivativeService
 from werkzeug.utils import secure_filename
 import os
 import markdown
@@ -175,9 +179,13 @@ def category_view(category_id):
     # Get child categories
     child_categories = Category.query.filter_by(parent_id=category_id, is_public=True).all()
 
-    # Get pages in this category
-    pages = Page.query.filter_by(category_id=category_id, is_published=True)\
-                     .order_by(Page.title).all()
+    # Get pages in this category (?sort=discussed orders by the denormalized comment counts)
+    pages = Page.query.filter_by(category_id=category_id, is_published=True)
+    if request.args.get('sort') == 'discussed':
+        pages = pages.order_by(Page.comment_count.desc(), Page.last_comment_at.desc(), Page.title)
+    else:
+        pages = pages.order_by(Page.title)
+    pages = pages.all()
 
     # Filter pages based on permissions
     accessible_pages = [page for page in pages if page.can_view(current_user)]
@@ -670,11 +678,12 @@ def upload_file():
 
     if file and allowed_file(file.filename):
         # 初始化存储服务
-        storage_service = create_storage_service(current_app.config['STORAGE_CONFIG'])
+        storage_service = get_storage_service()
 
         # 使用存储服务上传文件
         folder = request.form.get('folder', 'attachments')  # 默认文件夹
-        upload_result = storage_service.upload_file(
+        upload_result = BlobService.store(
+            storage_service,
             file_data=file,
             filename=file.filename,
             content_type=file.mimetype,
@@ -694,12 +703,15 @@ def upload_file():
             mime_type=file.mimetype,
             page_id=page_id,
             uploaded_by=current_user.id,
-            description=request.form.get('description', '')
+            description=request.form.get('description', ''),
+            blob_id=upload_result.get('blob_id')
         )
 
         db.session.add(attachment)
         db.session.commit()
 
+        ImageDerivativeService.pregenerate(upload_result['relative_path'])
+
         return jsonify({
             'success': True,
             'attachment': {
@@ -713,6 +725,60 @@ def upload_file():
 
     return jsonify({'error': 'File type not allowed'}), 400
 
+@wiki.route('/media/image/<int:width>/<path:file_path>')
+def image_variant(width, file_path):
+    """Redirect to a resized variant of a stored image, generating it on first request"""
+    if width not in ImageDerivativeService.widths() \
+            or not ImageDerivativeService.is_safe_path(file_path) \
+            or not ImageDerivativeService.is_resizable(file_path):
+        abort(404)
+
+    storage_service = get_storage_service()
+    if not storage_service.file_exists(file_path):
+        abort(404)
+
+    try:
+        variant_path = ImageDerivativeService.generate(file_path, widths=(width,)).get(width)
+    except Exception as e:
+        current_app.logger.error(f"Error generating image variant {width}w for {file_path}: {e}")
+        variant_path = None
+
+    # 原图比该档位窄或生成失败时使用原图
+    response = redirect(storage_service.get_file_url(variant_path or file_path))
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+@wiki.route('/export/page/<int:page_id>.zip')
+def export_page(page_id):
+    """Download a page (HTML and markdown) with its attachments as a streamed ZIP"""
+    page = Page.query.get_or_404(page_id)
+    if not page.can_view(current_user):
+        if current_user.is_authenticated:
+            abort(403)
+        return redirect(url_for('auth.login', next=request.url))
+
+    entries = ExportService.page_entries(page, current_user._get_current_object())
+    return _zip_response(entries, page.title or page.slug)
+
+@wiki.route('/export/category/<int:category_id>.zip')
+def export_category(category_id):
+    """Download every visible page in a category and its subcategories as a streamed ZIP"""
+    category = Category.query.get_or_404(category_id)
+    if not category.is_public and not current_user.is_authenticated:
+        abort(403)
+
+    entries = ExportService.category_entries(category, current_user._get_current_object())
+    return _zip_response(entries, category.name)
+
+def _zip_response(entries, name):
+    """Stream the archive as it is built; the length is unknown, so no Content-Length"""
+    stream = ExportService.stream_zip(entries, get_storage_service())
+    response = current_app.response_class(stream_with_context(stream), mimetype='application/zip')
+    response.headers['Content-Disposition'] = content_disposition(f"{name}.zip")
+    response.headers['Cache-Control'] = 'private, no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass chunks through instead of buffering
+    return response
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     # If ALLOWED_EXTENSIONS is None or empty, allow all file types
@@ -28,6 +28,12 @@ class Config:
     MAIL_SUBJECT_PREFIX = os.environ.get('MAIL_SUBJECT_PREFIX', '[Enterprise Wiki]')
     MAIL_SENDER = os.environ.get('MAIL_SENDER', 'Enterprise Wiki <noreply@company.com>')
 
+    # Mail outbox worker (flask mail worker)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE') or 50)
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS') or 6)
+    MAIL_RATE_LIMIT_PER_RECIPIENT = int(os.environ.get('MAIL_RATE_LIMIT_PER_RECIPIENT') or 20)
+    MAIL_RATE_LIMIT_WINDOW = int(os.environ.get('MAIL_RATE_LIMIT_WINDOW') or 3600)  # seconds
+
     # Pagination
     POSTS_PER_PAGE = 20
     SEARCH_RESULTS_PER_PAGE = 10
@@ -35,6 +41,25 @@ class Config:
     # Rate limiting
     RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+    # Unread notification counters: 'redis' (shared by all processes) or 'memory' (single process only)
+    NOTIFICATION_COUNTER_BACKEND = os.environ.get('NOTIFICATION_COUNTER_BACKEND', 'redis')
+    NOTIFICATION_COUNTER_TTL = int(os.environ.get('NOTIFICATION_COUNTER_TTL') or 300)  # seconds between reconciliations
+
+    # Live notification stream (/api/notifications/stream): 'redis' pub/sub across processes or 'memory'
+    NOTIFICATION_STREAM_BACKEND = os.environ.get('NOTIFICATION_STREAM_BACKEND', 'redis')
+    NOTIFICATION_STREAM_HEARTBEAT = 15  # seconds
+    NOTIFICATION_STREAM_MAX_SECONDS = 600  # clients reconnect with Last-Event-ID afterwards
+
+    # Serialized comment threads per (target, page): 'redis' or 'memory'; a target's entries are dropped when its comments change
+    COMMENT_CACHE_BACKEND = os.environ.get('COMMENT_CACHE_BACKEND', 'redis')
+    COMMENT_CACHE_TTL = int(os.environ.get('COMMENT_CACHE_TTL') or 300)
+
+    # In-memory @mention user directory; rebuilt from the database after this many seconds
+    USER_DIRECTORY_TTL = int(os.environ.get('USER_DIRECTORY_TTL') or 600)
+
+    # Retention for `flask watch cleanup`
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS') or 90)
+
     # Wiki settings
     WIKI_HOME_PAGE = 'Home'
     WIKI_PUBLIC_ACCESS = False  # Require authentication for all pages
@@ -68,6 +93,34 @@ class Config:
         return os.environ.get('SERVER_NAME', '127.0.0.1')
 
     # Storage settings
+    # Content-addressed uploads: identical files are stored once under blobs/ (see `flask storage`)
+    STORAGE_DEDUP = os.environ.get('STORAGE_DEDUP', 'false').lower() in ['true', 'on', '1']
+    # Browser uploads go straight to S3 via presigned PUT URLs (S3 storage only)
+    DIRECT_UPLOADS = os.environ.get('DIRECT_UPLOADS', 'true').lower() in ['true', 'on', '1']
+    DIRECT_UPLOAD_EXPIRES = int(os.environ.get('DIRECT_UPLOAD_EXPIRES', 900))  # presigned URL lifetime, seconds
+    # Attachment downloads: '' serves files from Flask, 'x-accel' hands off to nginx via X-Accel-Redirect,
+    # 'x-sendfile' to Apache/lighttpd via X-Sendfile. S3 downloads redirect to presigned GET URLs.
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '').lower()
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-uploads/')  # nginx internal location
+    USE_X_SENDFILE = DOWNLOAD_OFFLOAD == 'x-sendfile'
+    DOWNLOAD_URL_EXPIRES = int(os.environ.get('DOWNLOAD_URL_EXPIRES', 300))  # presigned GET lifetime, seconds
+    # Resized WebP variants of uploaded images, referenced from page HTML via srcset
+    IMAGE_VARIANT_WIDTHS = (320, 640, 1024, 1600)
+    IMAGE_VARIANTS_ON_UPLOAD = os.environ.get('IMAGE_VARIANTS_ON_UPLOAD', 'true').lower() in ['true', 'on', '1']
+    # Per-process avatar URL cache lifetime, seconds (local avatar changes invalidate immediately)
+    AVATAR_CACHE_TTL = int(os.environ.get('AVATAR_CACHE_TTL', 300))
+    # ZIP export (/export/page/<id>.zip, /export/category/<id>.zip): S3 attachment prefetch threads
+    EXPORT_S3_WORKERS = int(os.environ.get('EXPORT_S3_WORKERS', 4))
+    EXPORT_URL_ROOT = os.environ.get('EXPORT_URL_ROOT')  # absolute links in exported HTML; defaults to request root
+    # Database backups queued from the admin backup page are run by `flask backup worker` (never in the
+    # web process) and written to BACKUP_FOLDER (default <instance>/backups), outside the public upload storage
+    BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER')
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 10))  # completed backups kept, 0 keeps all
+    BACKUP_SQLITE_PAGES = int(os.environ.get('BACKUP_SQLITE_PAGES', 1024))  # pages copied per online backup step
+    BACKUP_SQLITE_SLEEP = float(os.environ.get('BACKUP_SQLITE_SLEEP', 0.05))  # pause between steps, seconds
+    BACKUP_PG_DUMP = os.environ.get('BACKUP_PG_DUMP', 'pg_dump')  # pg_dump executable for PostgreSQL
+    BACKUP_STALE_MINUTES = int(os.environ.get('BACKUP_STALE_MINUTES', 30))  # running backups without progress fail
+
     @staticmethod
     def get_storage_config():
         storage_type = os.environ.get('STORAGE_TYPE', 'local')
@@ -78,7 +131,9 @@ class Config:
         if storage_type == 'local':
             storage_config.update({
                 'upload_folder': os.environ.get('UPLOAD_FOLDER', 'app/static/uploads'),
-                'base_url': os.environ.get('BASE_URL', '/static/uploads')
+                'base_url': os.environ.get('BASE_URL', '/static/uploads'),
+                # sharded: <folder>/ab/cd/<file>；flat: <folder>/<file>（旧布局）
+                'layout': os.environ.get('LOCAL_STORAGE_LAYOUT', 'sharded')
             })
         elif storage_type == 's3':
             # 检查必需的S3配置
@@ -94,7 +149,12 @@ class Config:
                 'secret_key': os.environ.get('S3_SECRET_KEY'),
                 'bucket_name': os.environ.get('S3_BUCKET_NAME'),
                 'region': os.environ.get('S3_REGION', 'auto'),  # auto, us-east-1, etc.
-                'cdn_url': os.environ.get('S3_CDN_URL')  # 可选的CDN URL
+                'cdn_url': os.environ.get('S3_CDN_URL'),  # 可选的CDN URL
+                'max_pool_connections': int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 50)),  # 客户端连接池大小
+                # 分片上传：超过阈值（MB）的文件按分片大小（MB）切分，并发上传
+                'multipart_threshold': int(os.environ.get('S3_MULTIPART_THRESHOLD_MB', 8)) * 1024 * 1024,
+                'multipart_chunksize': int(os.environ.get('S3_MULTIPART_CHUNKSIZE_MB', 8)) * 1024 * 1024,
+                'max_concurrency': int(os.environ.get('S3_MAX_CONCURRENCY', 10))
             })
 
         return storage_config
@@ -127,6 +187,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    NOTIFICATION_COUNTER_BACKEND = 'memory'
+    NOTIFICATION_STREAM_BACKEND = 'memory'
+    COMMENT_CACHE_BACKEND = 'memory'
 
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///enterprise_wiki.db'
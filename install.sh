@@ -126,6 +126,34 @@ set_permissions() {
     print_status "Permissions set"
 }
 
+# Create a systemd unit for a background worker (flask <group> worker)
+create_worker_service() {
+    local NAME=$1
+    local DESCRIPTION=$2
+    local CURRENT_DIR=$(pwd)
+    local WORKER_FILE="/etc/systemd/system/enterprise-wiki-$NAME.service"
+
+    sudo tee $WORKER_FILE > /dev/null <<EOF
+[Unit]
+Description=Enterprise Wiki $DESCRIPTION
+After=network.target
+
+[Service]
+User=www-data
+Group=www-data
+WorkingDirectory=$CURRENT_DIR
+Environment="PATH=$CURRENT_DIR/venv/bin"
+Environment="FLASK_APP=run.py"
+ExecStart=$CURRENT_DIR/venv/bin/flask $NAME worker
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    print_status "Systemd service file created at $WORKER_FILE"
+}
+
 # Create systemd service file (optional)
 create_systemd_service() {
     if command -v systemctl &> /dev/null; then
@@ -145,15 +173,23 @@ User=www-data
 Group=www-data
 WorkingDirectory=$CURRENT_DIR
 Environment="PATH=$CURRENT_DIR/venv/bin"
-ExecStart=$CURRENT_DIR/venv/bin/gunicorn -w 4 -b 0.0.0.0:5000 run:app
+ExecStart=$CURRENT_DIR/venv/bin/gunicorn -k gevent --worker-connections 1000 -w 4 -b 0.0.0.0:5000 run:app
 Restart=always
 
 [Install]
 WantedBy=multi-user.target
 EOF
 
-            sudo systemctl daemon-reload
             print_status "Systemd service file created at $SERVICE_FILE"
+
+            # Watch notifications are only delivered by the watch worker
+            create_worker_service watch "watch event worker"
+            # Mention, watch and digest emails are only sent by the mail worker
+            create_worker_service mail "mail outbox worker"
+            # Backups queued from the admin page are only run by the backup worker
+            create_worker_service backup "database backup worker"
+
+            sudo systemctl daemon-reload
             print_warning "Remember to update the User and Group fields if needed"
         fi
     fi
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+内容寻址（去重）存储测试
+测试 BlobService 的引用计数：重复上传、删除附件/分享时释放引用、垃圾回收
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.share import S3Share
+from app.models.storage import StorageBlob
+from app.models.user import User, Role
+from app.models.wiki import Attachment
+from app.services.blob_service import BlobService
+from app.services.storage_service import create_storage_service
+
+
+class BlobServiceTestCase(unittest.TestCase):
+    """BlobService 引用计数"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['STORAGE_DEDUP'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+        # 文件写入临时目录
+        self.upload_folder = tempfile.mkdtemp()
+        self.storage = create_storage_service({
+            'type': 'local',
+            'upload_folder': self.upload_folder,
+            'base_url': '/static/uploads'
+        })
+        self.app.extensions['storage_service'] = self.storage
+
+        self.user = User(username='uploader', email='uploader@test.com', name='uploader', password='test123456')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_folder, ignore_errors=True)
+
+    def _store(self, content=b'same content', filename='report.pdf'):
+        result = BlobService.store(self.storage, io.BytesIO(content), filename, 'application/pdf')
+        db.session.commit()
+        self.assertTrue(result['success'])
+        return result
+
+    def _ref_count(self, blob_id):
+        return db.session.query(StorageBlob.ref_count).filter_by(id=blob_id).scalar()
+
+    def _attachment(self, result):
+        attachment = Attachment(
+            filename=result['filename'],
+            original_filename=result['original_filename'],
+            file_path=result['file_path'],
+            file_size=result['file_size'],
+            mime_type='application/pdf',
+            uploaded_by=self.user.id,
+            blob_id=result['blob_id']
+        )
+        db.session.add(attachment)
+        db.session.commit()
+        return attachment
+
+    def _share(self, result):
+        share = S3Share(
+            share_code='code0001',
+            share_token='token0001',
+            original_filename=result['original_filename'],
+            file_path=result['file_path'],
+            file_size=result['file_size'],
+            file_type='application/pdf',
+            file_extension='pdf',
+            s3_url=result['url'],
+            uploader_id=self.user.id,
+            blob_id=result['blob_id']
+        )
+        db.session.add(share)
+        db.session.commit()
+        return share
+
+    def _make_collectable(self, blob_id):
+        """引用数降为0的时间早于GC的保留期"""
+        db.session.query(StorageBlob).filter_by(id=blob_id).update(
+            {StorageBlob.updated_at: datetime.utcnow() - timedelta(days=1)}, synchronize_session=False)
+        db.session.commit()
+
+    def test_duplicate_upload_increments_ref_count(self):
+        first = self._store()
+        second = self._store(filename='copy-of-report.pdf')
+
+        self.assertFalse(first['deduplicated'])
+        self.assertTrue(second['deduplicated'])
+        self.assertEqual(first['blob_id'], second['blob_id'])
+        self.assertEqual(first['file_path'], second['file_path'])
+        self.assertEqual(self._ref_count(first['blob_id']), 2)
+        self.assertEqual(StorageBlob.query.count(), 1)
+
+        different = self._store(content=b'other content')
+        self.assertNotEqual(different['blob_id'], first['blob_id'])
+        self.assertEqual(self._ref_count(different['blob_id']), 1)
+
+    def test_deleting_attachment_and_share_releases_references(self):
+        result = self._store()
+        self._store()
+        blob_id = result['blob_id']
+        attachment = self._attachment(result)
+        share = self._share(result)
+        self.assertEqual(self._ref_count(blob_id), 2)
+
+        db.session.delete(attachment)
+        db.session.commit()
+        self.assertEqual(self._ref_count(blob_id), 1)
+
+        db.session.delete(share)
+        db.session.commit()
+        self.assertEqual(self._ref_count(blob_id), 0)
+
+    def test_collect_garbage_deletes_only_unreferenced_blobs(self):
+        unreferenced = self._store(content=b'unreferenced')
+        referenced = self._store(content=b'referenced')
+        recently_released = self._store(content=b'recently released')
+        for result in (unreferenced, recently_released):
+            BlobService.release(result['blob_id'])
+        db.session.commit()
+        self._make_collectable(unreferenced['blob_id'])
+        self._make_collectable(referenced['blob_id'])
+
+        removed = BlobService.collect_garbage(self.storage, grace_seconds=3600)
+
+        self.assertEqual(removed, 1)
+        self.assertIsNone(StorageBlob.query.get(unreferenced['blob_id']))
+        self.assertFalse(self.storage.file_exists(unreferenced['file_path']))
+        self.assertEqual(self._ref_count(referenced['blob_id']), 1)
+        self.assertTrue(self.storage.file_exists(referenced['file_path']))
+        # 引用数刚降为0的文件在保留期内不删除
+        self.assertEqual(self._ref_count(recently_released['blob_id']), 0)
+        self.assertTrue(self.storage.file_exists(recently_released['file_path']))
+
+
+if __name__ == '__main__':
+    unittest.main()
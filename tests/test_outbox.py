@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+发件箱worker测试
+测试SQLite下的租约领取（两个worker同时领取时每行只被领取一次）和重复投递的幂等性
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import event
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.user import User, Role
+from app.models.wiki import Page
+from app.models.watch import Watch, WatchEventOutbox, WatchEventType, WatchNotification, WatchTargetType
+from app.services.watch_service import WatchEventWorker, enqueue_watch_event
+from config.config import config, TestingConfig
+
+
+class WatchEventWorkerTestCase(unittest.TestCase):
+    """Watch事件发件箱worker"""
+
+    def setUp(self):
+        # 每个worker线程使用自己的连接，:memory: 数据库在每个连接中是独立的，这里使用临时文件
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        config['outbox_testing'] = type('OutboxTestingConfig', (TestingConfig,), {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}'
+        })
+        try:
+            self.app = create_app('outbox_testing')
+        finally:
+            del config['outbox_testing']
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+        self.watcher = self._create_user('watcher')
+        self.actor = self._create_user('actor')
+        self.page = Page(title='Outbox Test Page', slug='outbox-test-page', author_id=self.actor.id)
+        db.session.add(self.page)
+        db.session.commit()
+        db.session.add(Watch(user_id=self.watcher.id, target_type=WatchTargetType.PAGE, target_id=self.page.id))
+        db.session.commit()
+        # 只保留测试中显式加入的事件
+        WatchEventOutbox.query.delete()
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        os.remove(self.db_path)
+
+    def _create_user(self, username):
+        user = User(username=username, email=f'{username}@test.com', name=username, password='test123456')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def _enqueue(self, count):
+        events = [enqueue_watch_event(WatchEventType.PAGE_UPDATED, WatchTargetType.PAGE, self.page.id, self.actor.id)
+                  for _ in range(count)]
+        db.session.commit()
+        return [outbox_event.id for outbox_event in events]
+
+    def _notification_count(self):
+        return WatchNotification.query.filter_by(user_id=self.watcher.id).count()
+
+    def test_concurrent_claims_do_not_overlap(self):
+        """两个worker同时领取同一批候选行时，每行只归其中一个worker"""
+        event_ids = self._enqueue(20)
+        db.session.remove()
+
+        # 两个worker都查出候选行之后才执行条件UPDATE，重现同时领取的竞争
+        barrier = threading.Barrier(2)
+
+        def wait_for_other_worker(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE watch_event_outbox'):
+                barrier.wait(timeout=10)
+
+        claimed = {}
+        errors = []
+
+        def claim(worker_id):
+            try:
+                with self.app.app_context():
+                    worker = WatchEventWorker(worker_id=worker_id, batch_size=len(event_ids))
+                    claimed[worker_id] = [row.id for row in worker.claim_batch()]
+            except Exception as e:
+                errors.append(e)
+
+        event.listen(db.engine, 'before_cursor_execute', wait_for_other_worker)
+        try:
+            threads = [threading.Thread(target=claim, args=(worker_id,)) for worker_id in ('worker-a', 'worker-b')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', wait_for_other_worker)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(set(claimed['worker-a']) & set(claimed['worker-b']), set())
+        self.assertEqual(sorted(claimed['worker-a'] + claimed['worker-b']), sorted(event_ids))
+
+        # 租约未过期前不会被再次领取
+        self.assertEqual(WatchEventWorker(worker_id='worker-c').claim_batch(), [])
+
+    def test_redelivery_creates_no_duplicate_notifications(self):
+        """事件投递后worker未能标记完成（租约过期后重新领取），重复投递不会再创建通知"""
+        event_id = self._enqueue(1)[0]
+        worker = WatchEventWorker(worker_id='worker-a')
+
+        self.assertEqual(worker.run_batch(), (1, 1))
+        self.assertEqual(self._notification_count(), 1)
+
+        # 模拟通知已提交、事件状态未更新时worker崩溃
+        outbox_event = WatchEventOutbox.query.get(event_id)
+        outbox_event.status = WatchEventOutbox.STATUS_PENDING
+        outbox_event.processed_at = None
+        worker.release(outbox_event)
+        db.session.commit()
+
+        self.assertEqual(WatchEventWorker(worker_id='worker-b').run_batch(), (1, 0))
+        self.assertEqual(self._notification_count(), 1)
+        self.assertEqual(WatchEventOutbox.query.get(event_id).status, WatchEventOutbox.STATUS_DONE)
+
+
+if __name__ == '__main__':
+    unittest.main()
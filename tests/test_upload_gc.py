@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+孤立上传清理测试
+测试 UploadGC.collect 的时间界限、当前头像排除、共享文件保护和去重文件的引用释放
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.storage import StorageBlob
+from app.models.user import User, Role
+from app.models.wiki import Attachment, Page
+from app.services.avatar_service import AvatarService
+from app.services.storage_service import create_storage_service
+from app.services.upload_gc import UploadGC, AVATAR_DESCRIPTION_PREFIX
+
+
+class UploadGCTestCase(unittest.TestCase):
+    """UploadGC.collect / _delete_batch"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+        # 文件写入临时目录
+        self.upload_folder = tempfile.mkdtemp()
+        self.storage = create_storage_service({
+            'type': 'local',
+            'upload_folder': self.upload_folder,
+            'base_url': '/static/uploads'
+        })
+        self.app.extensions['storage_service'] = self.storage
+
+        self.user = User(username='uploader', email='uploader@test.com', name='uploader', password='test123456')
+        db.session.add(self.user)
+        db.session.commit()
+        self.page = Page(title='GC Test Page', slug='gc-test-page', author_id=self.user.id)
+        db.session.add(self.page)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_folder, ignore_errors=True)
+
+    def _put(self, path, content=b'data'):
+        result = self.storage.put_file(io.BytesIO(content), path, 'application/octet-stream')
+        self.assertTrue(result['success'])
+        return path
+
+    def _attachment(self, path, hours_ago=48, page_id=None, description=None, blob_id=None):
+        attachment = Attachment(
+            filename=os.path.basename(path),
+            original_filename=os.path.basename(path),
+            file_path=path,
+            file_size=4,
+            mime_type='application/octet-stream',
+            page_id=page_id,
+            uploaded_by=self.user.id,
+            uploaded_at=datetime.utcnow() - timedelta(hours=hours_ago),
+            description=description,
+            blob_id=blob_id
+        )
+        db.session.add(attachment)
+        db.session.commit()
+        return attachment.id
+
+    def _exists(self, path):
+        return self.storage.file_exists(path)
+
+    def test_only_orphans_older_than_cutoff_are_deleted(self):
+        old_id = self._attachment(self._put('gc/old.bin'), hours_ago=48)
+        recent_id = self._attachment(self._put('gc/recent.bin'), hours_ago=1)
+        attached_id = self._attachment(self._put('gc/attached.bin'), hours_ago=48, page_id=self.page.id)
+
+        report = UploadGC.collect(self.storage, older_than_hours=24)
+
+        self.assertEqual(report['attachments'], 1)
+        self.assertEqual(report['files'], 1)
+        self.assertEqual(report['bytes'], 4)
+        self.assertIsNone(Attachment.query.get(old_id))
+        self.assertFalse(self._exists('gc/old.bin'))
+        self.assertIsNotNone(Attachment.query.get(recent_id))
+        self.assertTrue(self._exists('gc/recent.bin'))
+        self.assertIsNotNone(Attachment.query.get(attached_id))
+        self.assertTrue(self._exists('gc/attached.bin'))
+
+    def test_dry_run_deletes_nothing(self):
+        old_id = self._attachment(self._put('gc/old.bin'), hours_ago=48)
+
+        report = UploadGC.collect(self.storage, older_than_hours=24, dry_run=True)
+
+        self.assertEqual((report['attachments'], report['files']), (1, 1))
+        self.assertIsNotNone(Attachment.query.get(old_id))
+        self.assertTrue(self._exists('gc/old.bin'))
+
+    def test_current_avatar_is_kept(self):
+        current = self._put('avatars/current.png')
+        previous = self._put('avatars/previous.png')
+        previous_thumb = self._put(AvatarService.size_path(previous, 40))
+        current_id = self._attachment(current, description=f'{AVATAR_DESCRIPTION_PREFIX}uploader')
+        previous_id = self._attachment(previous, description=f'{AVATAR_DESCRIPTION_PREFIX}uploader')
+        self.user.avatar = self.storage.get_file_url(current)
+        db.session.commit()
+
+        report = UploadGC.collect(self.storage, older_than_hours=24)
+
+        self.assertEqual(report['attachments'], 1)
+        self.assertIsNotNone(Attachment.query.get(current_id))
+        self.assertTrue(self._exists(current))
+        # 不再使用的头像连同缩放图一起删除
+        self.assertIsNone(Attachment.query.get(previous_id))
+        self.assertFalse(self._exists(previous))
+        self.assertFalse(self._exists(previous_thumb))
+
+    def test_file_shared_with_live_attachment_is_kept(self):
+        path = self._put('gc/shared.bin')
+        orphan_id = self._attachment(path, hours_ago=48)
+        live_id = self._attachment(path, hours_ago=48, page_id=self.page.id)
+
+        report = UploadGC.collect(self.storage, older_than_hours=24)
+
+        self.assertEqual(report['attachments'], 1)
+        self.assertEqual(report['files'], 0)
+        self.assertIsNone(Attachment.query.get(orphan_id))
+        self.assertIsNotNone(Attachment.query.get(live_id))
+        self.assertTrue(self._exists(path))
+
+    def test_blob_reference_is_released_without_deleting_file(self):
+        path = self._put('blobs/ab/abcdef.bin')
+        blob = StorageBlob(sha256='ab' * 32, file_path=path, file_size=4, ref_count=1)
+        db.session.add(blob)
+        db.session.commit()
+        blob_id = blob.id
+        orphan_id = self._attachment(path, hours_ago=48, blob_id=blob_id)
+
+        report = UploadGC.collect(self.storage, older_than_hours=24)
+
+        self.assertEqual(report['attachments'], 1)
+        self.assertEqual(report['released_blobs'], 1)
+        self.assertEqual(report['files'], 0)
+        self.assertIsNone(Attachment.query.get(orphan_id))
+        # 文件由 `flask storage gc` 在引用数为0后删除
+        self.assertTrue(self._exists(path))
+        self.assertEqual(StorageBlob.query.get(blob_id).ref_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
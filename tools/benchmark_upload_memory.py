@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+本地存储上传内存占用基准测试
+分别用一次性读取（旧实现）和分块流式拷贝（LocalStorageBackend）保存同一个上传文件，
+每种方式在独立的子进程中运行，比较进程的峰值RSS
+
+用法:
+    python3 tools/benchmark_upload_memory.py [--size-mb 100]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb():
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run(mode, source_path, target_dir):
+    from werkzeug.datastructures import FileStorage
+    from app.services.storage_service import LocalStorageBackend
+
+    baseline = peak_rss_mb()
+    with open(source_path, 'rb') as stream:
+        upload = FileStorage(stream=stream, filename='benchmark.bin', content_type='application/octet-stream')
+        if mode == 'read':
+            with open(os.path.join(target_dir, 'read.bin'), 'wb') as f:
+                f.write(upload.read())
+        else:
+            result = LocalStorageBackend(target_dir).upload_file(upload, 'benchmark.bin', 'application/octet-stream')
+            assert result['success'], result
+    print(f'{mode:8s} peak RSS {peak_rss_mb():8.1f} MB  (+{peak_rss_mb() - baseline:.1f} MB for the upload)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare peak RSS of whole-file and streamed uploads')
+    parser.add_argument('--size-mb', type=int, default=100)
+    parser.add_argument('--mode', choices=['read', 'stream'])
+    parser.add_argument('--source')
+    parser.add_argument('--target')
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.source, args.target)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'source.bin')
+        with open(source, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f'Upload size: {args.size_mb} MB')
+        for mode in ('read', 'stream'):
+            subprocess.run([sys.executable, __file__, '--mode', mode, '--source', source, '--target', workdir],
+                           check=True)
+
+
+if __name__ == '__main__':
+    main()